@@ -1,4 +1,5 @@
 NEURON	{
+	THREADSAFE
 	SUFFIX Im
 	USEION k READ ek WRITE ik
 	RANGE gbar, g, ik
@@ -12,6 +13,8 @@ UNITS	{
 
 PARAMETER	{
 	gbar = 0.00001 (S/cm2) 
+	vmin_table = -100 (mV) : rate table range, 2000 intervals (0.1 mV by default)
+	vmax_table = 100 (mV)
 }
 
 ASSIGNED	{
@@ -22,8 +25,6 @@ ASSIGNED	{
 	celsius (degC)
 	mInf
 	mTau
-	mAlpha
-	mBeta
 }
 
 STATE	{ 
@@ -37,17 +38,20 @@ BREAKPOINT	{
 }
 
 DERIVATIVE states	{
-	rates()
+	rates(v)
 	m' = (mInf-m)/mTau
 }
 
 INITIAL{
-	rates()
+	rates(v)
 	m = mInf
 }
 
-PROCEDURE rates(){
-  LOCAL qt
+: with usetable_Im = 1 mInf and mTau are looked up in a table over v, rebuilt when celsius or the range changes
+PROCEDURE rates(v (mV)){
+  LOCAL qt, mAlpha, mBeta
+  TABLE mInf, mTau DEPEND celsius, vmin_table, vmax_table FROM vmin_table TO vmax_table WITH 2000
+
   qt = 2.3^((celsius-21)/10)
 
 	UNITSOFF
@@ -1,4 +1,5 @@
 NEURON	{
+	THREADSAFE
 	SUFFIX Kv3_1
 	USEION k READ ek WRITE ik
 	RANGE gbar, g, ik 
@@ -13,6 +14,8 @@ UNITS	{
 PARAMETER	{
 	gbar = 0.00001 (S/cm2)
 	vshift = 0 (mV)
+	vmin_table = -100 (mV) : rate table range, 2000 intervals (0.1 mV by default)
+	vmax_table = 100 (mV)
 }
 
 ASSIGNED	{
@@ -35,16 +38,19 @@ BREAKPOINT	{
 }
 
 DERIVATIVE states	{
-	rates()
+	rates(v)
 	m' = (mInf-m)/mTau
 }
 
 INITIAL{
-	rates()
+	rates(v)
 	m = mInf
 }
 
-PROCEDURE rates(){
+: with usetable_Kv3_1 = 1 mInf and mTau are looked up in a table over v, rebuilt when vshift or the range changes
+PROCEDURE rates(v (mV)){
+	TABLE mInf, mTau DEPEND vshift, vmin_table, vmax_table FROM vmin_table TO vmax_table WITH 2000
+
 	UNITSOFF
 		mInf =  1/(1+exp(((v -(18.700 + vshift))/(-9.700))))
 		mTau =  0.2*20.000/(1+exp(((v -(-46.560 + vshift))/(-44.140))))
@@ -0,0 +1,129 @@
+###                      ###
+###~~~BACKGROUND DRIVE~~~###
+###                      ###
+"""Pre-generated Poisson background drive played through VecStim.
+
+All spike trains of a run are drawn in one vectorised NumPy call and stored
+CSR-style (indptr, times). Each train is one input fiber, played by one of
+NEURON's built-in VecStims, and a fiber can fan out to any number of target
+synapses. With one private fiber per cell this replaces the one
+NetStim(noise=1) per cell of cell_network.py; with fewer fibers than cells
+the cells share input.
+Time-varying rates are drawn by thinning a homogeneous process at max_rate.
+With a RandomStreams instead of a Generator every fiber has its own keyed
+stream, so a rank can draw just the fibers of its own cells.
+"""
+import numpy as np
+from neuron import h
+
+from mechanisms import require_mechanisms
+from random_streams import RandomStreams
+
+
+class SpikeTrains:
+    """CSR spike trains: train i is times[indptr[i]:indptr[i+1]], sorted."""
+    def __init__(self, indptr, times):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.times = np.asarray(times, dtype=np.float64)
+
+    @property
+    def n_trains(self):
+        return int(self.indptr.size - 1)
+
+    @property
+    def n_spikes(self):
+        return int(self.times.size)
+
+    def train(self, i):
+        return self.times[self.indptr[i]:self.indptr[i + 1]]
+
+
+def generate_poisson_trains(n_trains, rate, t_start, t_stop, rng, rate_fn=None, fibers=None):
+    """n_trains Poisson trains on [t_start, t_stop) ms in one vectorised draw.
+
+    rate: Hz. With rate_fn (vectorised f(t_ms) -> Hz, bounded by rate) the trains
+    are inhomogeneous: candidates are drawn at `rate` and each is kept with
+    probability rate_fn(t) / rate.
+    rng: a np.random.Generator, or a RandomStreams to draw train f from its own
+    (seed, f, "drive") stream; then fibers=[...] draws only those trains (the
+    others stay empty) and every train is the same whoever draws it.
+    """
+    duration = max(t_stop - t_start, 0.0)
+    if isinstance(rng, RandomStreams):
+        train_ids, times = _keyed_trains(n_trains, rate, t_start, duration, rng, rate_fn, fibers)
+    else:
+        counts = rng.poisson(rate * duration / 1000.0, size=n_trains)
+        train_ids = np.repeat(np.arange(n_trains, dtype=np.int64), counts)
+        times = t_start + rng.random(train_ids.size) * duration
+        if rate_fn is not None:
+            keep = rng.random(times.size) * rate < rate_fn(times)
+            train_ids, times = train_ids[keep], times[keep]
+    order = np.lexsort((times, train_ids))
+    indptr = np.zeros(n_trains + 1, dtype=np.int64)
+    np.cumsum(np.bincount(train_ids, minlength=n_trains), out=indptr[1:])
+    return SpikeTrains(indptr, times[order])
+
+
+def _keyed_trains(n_trains, rate, t_start, duration, streams, rate_fn, fibers):
+    """(train ids, times) with one stream per train, same thinning as the vectorised draw."""
+    id_parts, time_parts = [], []
+    for f in (range(n_trains) if fibers is None else fibers):
+        rng = streams.generator(f, "drive")
+        times = t_start + rng.random(rng.poisson(rate * duration / 1000.0)) * duration
+        if rate_fn is not None:
+            times = times[rng.random(times.size) * rate < rate_fn(times)]
+        id_parts.append(np.full(times.size, f, dtype=np.int64))
+        time_parts.append(times)
+    if not id_parts:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    return np.concatenate(id_parts), np.concatenate(time_parts)
+
+
+def private_fibers(n_cells):
+    """fiber -> target cells map with one fiber per cell (fiber i drives cell i)."""
+    return [[i] for i in range(n_cells)]
+
+
+def shared_fibers(n_fibers, n_cells, fibers_per_cell, rng, rows_per_chunk=1024):
+    """fiber -> target cells map where every cell samples fibers_per_cell distinct fibers.
+
+    rng: a np.random.Generator, or a RandomStreams (one (seed, cell, "drive_fibers") stream per cell).
+    """
+    chosen = []
+    if isinstance(rng, RandomStreams):
+        for cell in range(n_cells):
+            chosen.append(rng.generator(cell, "drive_fibers").choice(n_fibers, fibers_per_cell, replace=False)[None, :])
+    else:
+        for start in range(0, n_cells, rows_per_chunk):
+            keys = rng.random((min(rows_per_chunk, n_cells - start), n_fibers))
+            chosen.append(np.argpartition(keys, fibers_per_cell - 1, axis=1)[:, :fibers_per_cell])
+    cells = np.repeat(np.arange(n_cells), fibers_per_cell)
+    fibers = np.concatenate(chosen).ravel()
+    order = np.argsort(fibers, kind="stable")
+    bounds = np.searchsorted(fibers[order], np.arange(n_fibers + 1))
+    cells = cells[order].tolist()
+    return [cells[bounds[f]:bounds[f + 1]] for f in range(n_fibers)]
+
+
+class VecStimDrive:
+    """One VecStim per fiber, connected to the target synapse of every cell it fans out to."""
+    def __init__(self, trains, fiber_targets, target_synapses, weight, delay=0.1):
+        """fiber_targets[f]: cell indices fiber f drives; target_synapses[j]: synapse of cell j."""
+        require_mechanisms(("VecStim",)) #built into NEURON, with CoreNEURON support
+        self.trains = trains
+        self.vecstims = []
+        self.vectors = [] #VecStim reads these during the run, keep them alive
+        self.netcons = []
+        for f, targets in enumerate(fiber_targets):
+            if not targets:
+                continue
+            vec = h.Vector(trains.train(f))
+            stim = h.VecStim()
+            stim.play(vec)
+            self.vectors.append(vec)
+            self.vecstims.append(stim)
+            for j in targets:
+                nc = h.NetCon(stim, target_synapses[j])
+                nc.delay = delay
+                nc.weight[0] = weight
+                self.netcons.append(nc)
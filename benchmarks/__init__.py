@@ -0,0 +1 @@
+"""Re-runnable timing scripts. Run from the repo root, e.g. `python -m benchmarks.connectivity`."""
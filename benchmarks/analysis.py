@@ -0,0 +1,47 @@
+"""Timing of the spike_analysis metrics on a synthetic 10^7-spike raster.
+
+    python -m benchmarks.analysis [n_spikes] [n_cells]
+"""
+import sys
+import time
+
+import numpy as np
+
+import spike_analysis
+
+
+def synthetic_raster(n_spikes, n_cells, t_stop, seed=0):
+    """Unsorted Poisson-like raster with heterogeneous rates, like a gathered network run."""
+    rng = np.random.default_rng(seed)
+    rates = rng.gamma(2.0, 1.0, size=n_cells)
+    ids = rng.choice(n_cells, size=n_spikes, p=rates / rates.sum())
+    times = rng.random(n_spikes) * t_stop
+    return times, ids
+
+
+def main(n_spikes, n_cells):
+    t_stop = 10000.0
+    times, ids = synthetic_raster(n_spikes, n_cells, t_stop)
+    print(f"{n_spikes:.0e} spikes, {n_cells} cells, {t_stop:.0f} ms")
+
+    def timed(label, fn):
+        t0 = time.perf_counter()
+        out = fn()
+        print(f"  {label:<28} {time.perf_counter() - t0:8.3f} s")
+        return out
+
+    timed("firing_rates", lambda: spike_analysis.firing_rates(times, ids, n_cells, 0, t_stop))
+    timed("isis", lambda: spike_analysis.isis(times, ids))
+    timed("isi_cv", lambda: spike_analysis.isi_cv(times, ids, n_cells))
+    timed("adaptation_ratios", lambda: spike_analysis.adaptation_ratios(times, ids, n_cells))
+    timed("psth (1 ms)", lambda: spike_analysis.psth(times, 0, t_stop, 1.0, n_cells))
+    counts = timed("binned_counts (50 ms)", lambda: spike_analysis.binned_counts(times, ids, n_cells, 0, t_stop, 50.0))
+    timed("fano_factor", lambda: spike_analysis.fano_factor(counts))
+    timed("spike_count_correlations", lambda: spike_analysis.spike_count_correlations(counts))
+    timed("synchrony", lambda: spike_analysis.synchrony(counts))
+
+
+if __name__ == "__main__":
+    n_spikes = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10 ** 7
+    n_cells = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    main(n_spikes, n_cells)
@@ -0,0 +1,84 @@
+"""Biophysics assignment time: the old per-section loop vs the bulk spec.
+
+    python -m benchmarks.biophysics [repeats]
+
+Each morphology is built once to fill the morphology cache; every
+measurement then starts from fresh, mechanism-free sections instantiated
+from that cache so both methods see identical input.
+"""
+import sys
+import time
+
+from neuron import h
+
+from biophysics import apply_biophysics, region_section_lists
+from morphology_cache import get_cached_morphology, morphology_key
+from realistic_neuron_models import L23BasketCell, L23PyramidalCell
+
+MORPHOLOGIES = [
+    ("Pyramidal", L23PyramidalCell, "H17.06.006.11.09.04_591274508_m (1).swc"),
+    ("Basket", L23BasketCell, "Fig2b_cell1_0904091kg.CNG.swc"),
+]
+
+
+def legacy_assign(cell, sections, soma, dendrites):
+    """The pre-spec _assign_biophysics loop plus the subclass hasattr/setattr chain."""
+    for sec in sections:
+        if h.name_declared('pas'):
+            sec.insert('pas')
+            sec.g_pas = cell.g_pas
+            sec.e_pas = cell.e_pas
+        if h.name_declared('hh'):
+            sec.insert('hh')
+            sec.gnabar_hh = cell.gnabar_hh
+            sec.gkbar_hh = cell.gkbar_hh
+            sec.gl_hh = cell.gl_hh
+            sec.ena = cell.ena
+            sec.ek = cell.ek
+    if isinstance(cell, L23PyramidalCell):
+        mech, param, value, targets = 'Im', 'gbar_Im', cell.gbar_im_initial_guess, [soma] + dendrites[:10]
+    else:
+        mech, param, value, targets = 'Kv3_1', 'gbar_Kv3_1', cell.gbar_kv3_initial_guess, [soma]
+    if h.name_declared(mech):
+        for sec in targets:
+            if not hasattr(sec, param):
+                sec.insert(mech)
+            try:
+                setattr(sec, param, value)
+            except AttributeError:
+                pass
+
+
+def main(repeats):
+    for label, CellClass, swc_file in MORPHOLOGIES:
+        cell = CellClass(0, swc_file)
+        morph = get_cached_morphology(morphology_key(swc_file, cell.Ra, cell.cm, 'lambda_f', 100))
+        spec = cell.biophysics_spec
+
+        t_legacy = t_bulk = 0.0
+        for _ in range(repeats):
+            sections = morph.instantiate()
+            soma = sections[morph.soma_index]
+            dendrites = [sections[k] for k in morph.dendrite_indices]
+            t0 = time.perf_counter()
+            legacy_assign(cell, sections, soma, dendrites)
+            t_legacy += time.perf_counter() - t0
+            del sections, soma, dendrites
+
+            sections = morph.instantiate()
+            cell.all_sections = sections
+            cell.soma = sections[morph.soma_index]
+            cell.dendrites = [sections[k] for k in morph.dendrite_indices]
+            cell.axon = [sections[k] for k in morph.axon_indices]
+            t0 = time.perf_counter()
+            apply_biophysics(spec, region_section_lists(cell._region_sections()), origin=cell.soma)
+            t_bulk += time.perf_counter() - t0
+            del sections
+
+        print(f"{label}: {morph.n_sections} sections, {morph.n_segments} segments")
+        print(f"  per-section loop {t_legacy / repeats * 1000:9.2f} ms")
+        print(f"  bulk spec        {t_bulk / repeats * 1000:9.2f} ms  ({t_legacy / t_bulk:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,52 @@
+"""Cold-start time of a fresh worker process: old script imports vs the headless model modules.
+
+    python -m benchmarks.cold_start [repeats]
+
+Each startup is a new interpreter that only imports, so the numbers are what
+every batch worker pays before it can build anything. "before" is what
+cell_network.py used to load at the top of the script (NEURON gui and
+matplotlib) before it ran the whole simulation on import; "after" imports the
+model modules as batch workers do now.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUPS = [
+    ("python only", "pass"),
+    ("neuron (h only)", "from neuron import h"),
+    ("before: neuron gui + matplotlib", "from neuron import h, gui; import matplotlib.pyplot"),
+    ("after: import cell_network", "import cell_network"),
+    ("after: import test_realistic_cell", "import test_realistic_cell"),
+    ("after: import parallel_network", "import parallel_network"),
+    ("plot step: import plot_results", "import plot_results"),
+]
+
+
+def time_startup(code, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True)
+        times.append(time.perf_counter() - t0)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+    return times, None
+
+
+def main(repeats):
+    print(f"{'startup':<36} {'median (s)':>11} {'min (s)':>9}")
+    for label, code in STARTUPS:
+        times, error = time_startup(code, repeats)
+        if times is None:
+            print(f"{label:<36} failed: {error}")
+            continue
+        print(f"{label:<36} {statistics.median(times):11.3f} {min(times):9.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
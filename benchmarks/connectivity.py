@@ -0,0 +1,65 @@
+"""Build time of the bulk connectivity builder vs the original all-pairs loop.
+
+    python -m benchmarks.connectivity [N ...]
+
+The all-pairs loop is timed on the adjacency draw only (no NEURON objects),
+which is the O(N^2) part. Above LOOP_MAX_CELLS it is extrapolated
+quadratically from the largest measured size.
+"""
+import random
+import sys
+import time
+
+from connectivity import build_connectivity
+
+LOOP_MAX_CELLS = 10000
+WEIGHTS = {"EE": 0.003, "EI": 0.001, "IE": 0.01, "II": 0.01}
+
+
+def all_pairs_loop(num_E, num_I, connection_probability):
+    """Adjacency draw as done by the original cell_network.py loop."""
+    total_cells = num_E + num_I
+    pairs = []
+    for i in range(total_cells):
+        for j in range(total_cells):
+            if i == j:
+                continue
+            if random.random() < connection_probability:
+                pairs.append((i, j))
+    return pairs
+
+
+def main(sizes):
+    p = 0.1
+    print(f"{'N':>8} {'conns':>12} {'bulk (s)':>10} {'loop (s)':>12} {'speed-up':>10}")
+    last_loop = None #(N, seconds) of the largest measured loop run
+    for n in sizes:
+        num_E = int(n * 0.8)
+        num_I = n - num_E
+        #p*N^2 connections is ~1e9 at 100k cells, so hold the mean out-degree fixed there
+        p_n = p if n <= 10000 else p * 10000 / n
+
+        t0 = time.perf_counter()
+        conn = build_connectivity(num_E, num_I, p_n, WEIGHTS, delay=1.5, seed=1)
+        t_bulk = time.perf_counter() - t0
+
+        if n <= LOOP_MAX_CELLS:
+            t0 = time.perf_counter()
+            all_pairs_loop(num_E, num_I, p_n)
+            t_loop = time.perf_counter() - t0
+            last_loop = (n, t_loop)
+            loop_label = f"{t_loop:12.3f}"
+        elif last_loop:
+            t_loop = last_loop[1] * (n / last_loop[0]) ** 2
+            loop_label = f"{t_loop:11.1f}*"
+        else:
+            t_loop = float("nan")
+            loop_label = f"{'n/a':>12}"
+        print(f"{n:>8} {conn.n_connections:>12} {t_bulk:10.3f} {loop_label} {t_loop / t_bulk:10.1f}")
+    print("* extrapolated as O(N^2) from the largest measured loop run")
+    print(f"  (p = {p} up to N=10000, then p scaled as 1/N to keep k ~ {int(p * 10000)})")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 1000, 10000, 30000, 100000]
+    main(sizes)
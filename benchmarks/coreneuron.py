@@ -0,0 +1,99 @@
+"""Classic NEURON against CoreNEURON (CPU) on both networks at several sizes: wall time and memory.
+
+    python -m benchmarks.coreneuron [--cells 1000 10000 100000] [--realistic-cells 100 1000]
+                                    [--tstop 200] [--modes memory file]
+
+Every (network, size, backend) case runs in a fresh interpreter: peak RSS is
+only meaningful per process, and the mechanism library (with or without
+CoreNEURON support) can not be swapped once loaded. The simple HH network is
+parallel_network.ParallelNetwork; the realistic network is the
+benchmarks/suite.py network of Pyramidal clones. Run time is initialisation
+plus the solve, which for CoreNEURON includes the model transfer. The raster
+column says whether the spikes are identical to the classic NEURON run.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker(network, n_cells, backend, mode, tstop):
+    """Build and run one case in this process; prints one JSON line."""
+    import time
+
+    from neuron import h
+
+    from instrumentation import peak_rss_mb
+    from parallel_network import ParallelNetwork, spike_digest
+
+    h.nrnmpi_init()
+    pc = h.ParallelContext()
+    if network == "hh":
+        num_E = int(0.8 * n_cells)
+        t0 = time.time()
+        net = ParallelNetwork({"num_E": num_E, "num_I": n_cells - num_E, "sim_duration": tstop,
+                               "connection_probability": min(0.1, 100 / n_cells), "connectivity_seed": 1,
+                               "drive_seed": 1, "backend": backend, "coreneuron_mode": mode}, pc=pc)
+        build_s = time.time() - t0
+        run_s = net.run()
+        times, ids = net.gather_spikes()
+        result = {"build_s": build_s, "run_s": run_s, "spikes": int(times.size), "digest": spike_digest(times, ids)}
+    else:
+        from benchmarks.suite import run_case
+        record = run_case(pc, n_cells, "Pyramidal", 1, tstop, backend, mode)
+        phases = record["phases"]
+        result = {"build_s": sum(phases[name] for name in ("morphology_load", "biophysics", "synapses",
+                                                          "connectivity")),
+                  "run_s": phases["init"] + phases["solve"], "spikes": record["spikes"], "digest": None}
+    result["peak_rss_mb"] = pc.allreduce(peak_rss_mb(), 2)
+    if int(pc.id()) == 0:
+        print("RESULT " + json.dumps(result))
+    pc.barrier()
+    pc.done()
+
+
+def run_case(network, n_cells, backend, mode, tstop):
+    code = (f"from benchmarks.coreneuron import worker; "
+            f"worker({network!r}, {n_cells}, {backend!r}, {mode!r}, {tstop})")
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True)
+    for line in out.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):]), None
+    lines = (out.stderr or out.stdout).strip().splitlines()
+    return None, lines[-1] if lines else f"exit status {out.returncode}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, nargs="+", default=[1000, 10000], help="simple HH network sizes")
+    parser.add_argument("--realistic-cells", type=int, nargs="+", default=[100], help="Pyramidal network sizes")
+    parser.add_argument("--tstop", type=float, default=200.0)
+    parser.add_argument("--modes", nargs="+", choices=("memory", "file"), default=["memory"])
+    args = parser.parse_args(argv)
+
+    cases = [("hh", n) for n in args.cells] + [("realistic", n) for n in args.realistic_cells]
+    print(f"{'network':<10} {'cells':>7} {'backend':<18} {'build s':>8} {'run s':>8} {'speed-up':>9} "
+          f"{'peak MB':>8} {'spikes':>8} {'raster':>7}")
+    for network, n_cells in cases:
+        reference, error = run_case(network, n_cells, "neuron", "memory", args.tstop)
+        rows = [("neuron", reference, error)]
+        for mode in args.modes:
+            rows.append((f"coreneuron/{mode}",) + run_case(network, n_cells, "coreneuron", mode, args.tstop))
+        for label, result, error in rows:
+            if result is None:
+                print(f"{network:<10} {n_cells:>7} {label:<18} failed: {error}")
+                continue
+            speed_up = f"{reference['run_s'] / result['run_s']:9.2f}" if reference else f"{'-':>9}"
+            if reference is None or result["digest"] is None:
+                same = "-"
+            else:
+                same = "same" if result["digest"] == reference["digest"] else "differs"
+            print(f"{network:<10} {n_cells:>7} {label:<18} {result['build_s']:8.2f} {result['run_s']:8.2f} "
+                  f"{speed_up} {result['peak_rss_mb']:8.0f} {result['spikes']:>8} {same:>7}")
+
+
+if __name__ == "__main__":
+    main()
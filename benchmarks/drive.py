@@ -0,0 +1,95 @@
+"""Background drive at network scale: one NetStim per cell vs pre-generated VecStim trains.
+
+    python -m benchmarks.drive [n_cells] [sim_duration_ms]
+
+Cells are bare HH somata with one Exp2Syn each, so the numbers isolate the
+drive. Event-queue load is the number of events NEURON delivers to the
+synapses, counted with NetCon.record on the generators, plus the generator
+objects themselves.
+"""
+import sys
+import time
+
+from neuron import h
+
+from background_drive import VecStimDrive, generate_poisson_trains, private_fibers
+from random_streams import RandomStreams
+
+h.load_file("stdrun.hoc")
+
+DRIVE_RATE = 15 #Hz
+DRIVE_WEIGHT = 0.01 #uS
+DRIVE_START = 50 #ms
+
+
+def make_cells(n_cells):
+    somata, synapses = [], []
+    for i in range(n_cells):
+        soma = h.Section(name=f"soma_{i}")
+        soma.L = soma.diam = 20
+        soma.insert("hh")
+        syn = h.Exp2Syn(soma(0.5))
+        syn.tau1, syn.tau2, syn.e = 0.2, 2.0, 0
+        somata.append(soma)
+        synapses.append(syn)
+    return somata, synapses
+
+
+def netstim_drive(synapses, sim_duration):
+    stims, netcons = [], []
+    streams = RandomStreams(1)
+    for gid, syn in enumerate(synapses):
+        stim = h.NetStim()
+        stim.interval = 1000.0 / DRIVE_RATE
+        stim.number = 1e9
+        stim.noise = 1.0
+        streams.netstim_noise(stim, gid) #Random123 stream per cell instead of the shared generator
+        stim.start = DRIVE_START
+        nc = h.NetCon(stim, syn)
+        nc.delay = 0.1
+        nc.weight[0] = DRIVE_WEIGHT
+        stims.append(stim)
+        netcons.append(nc)
+    return stims, netcons
+
+
+def vecstim_drive(synapses, sim_duration):
+    trains = generate_poisson_trains(len(synapses), DRIVE_RATE, DRIVE_START, sim_duration,
+                                     RandomStreams(1))
+    drive = VecStimDrive(trains, private_fibers(len(synapses)), synapses, DRIVE_WEIGHT)
+    return drive.vecstims, drive
+
+
+def run(label, build, n_cells, sim_duration):
+    somata, synapses = make_cells(n_cells)
+    t0 = time.perf_counter()
+    stims, keep = build(synapses, sim_duration)
+    t_build = time.perf_counter() - t0
+
+    events = h.Vector()
+    counters = []
+    for stim in stims:
+        nc = h.NetCon(stim, None)
+        nc.record(events)
+        counters.append(nc)
+
+    h.dt = 0.025
+    h.tstop = sim_duration
+    h.stdinit()
+    t0 = time.perf_counter()
+    h.run()
+    t_run = time.perf_counter() - t0
+    print(f"{label:<9} {n_cells:>7} {len(stims):>9} {t_build:10.3f} {t_run:10.3f} {int(events.size()):>12}")
+    del counters, events, stims, keep, synapses, somata
+
+
+def main(n_cells, sim_duration):
+    print(f"{'drive':<9} {'cells':>7} {'objects':>9} {'build (s)':>10} {'run (s)':>10} {'events':>12}")
+    run("NetStim", netstim_drive, n_cells, sim_duration)
+    run("VecStim", vecstim_drive, n_cells, sim_duration)
+
+
+if __name__ == "__main__":
+    n_cells = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    sim_duration = float(sys.argv[2]) if len(sys.argv) > 2 else 500
+    main(n_cells, sim_duration)
@@ -0,0 +1,101 @@
+"""Wall time and spike-time error of the variable-step run modes against fixed step.
+
+    python -m benchmarks.integrators [budget_ms]
+
+Runs the test_realistic_cell.py protocol (Pyramidal cell, 1 s, IClamp from
+100 ms) and the parallel_network.py network (500 ms, drive from 50 ms) once
+with the fixed-step reference (dt = 0.025 ms), then with global CVODE and
+local_dt over a ladder of tolerances. Each row gives the wall time, the
+speed-up and how far the spike times moved from the reference. The last line
+names the fastest setting whose largest spike-time deviation is within the
+budget and that neither gains nor loses spikes.
+"""
+import sys
+import time
+
+import numpy as np
+from neuron import h
+
+from parallel_network import ParallelNetwork
+from realistic_neuron_models import L23PyramidalCell
+from run_modes import configure_run_mode
+from spike_analysis import spike_time_deviation
+
+h.load_file("stdrun.hoc")
+
+FIXED_DT = 0.025 #ms, reference
+VARIABLE_STEP = [(mode, atol) for mode in ("cvode", "local_dt") for atol in (1e-2, 1e-3, 1e-4, 1e-5)]
+DEFAULT_BUDGET = 0.1 #ms, max spike-time deviation
+
+
+def cell_model():
+    """Single realistic cell as in test_realistic_cell.py."""
+    h.celsius = 34
+    cell = L23PyramidalCell(0, "H17.06.006.11.09.04_591274508_m (1).swc", v_init=-65)
+    iclamp = h.IClamp(cell.soma(0.5))
+    iclamp.delay, iclamp.dur, iclamp.amp = 100, 800, 0.5
+    spikes = h.Vector()
+    nc = h.NetCon(cell.soma(0.5)._ref_v, None, sec=cell.soma)
+    nc.threshold = -10
+    nc.record(spikes)
+
+    def run(mode, atol):
+        configure_run_mode(mode, atol=atol)
+        h.dt = FIXED_DT #CVODE leaves h.dt at its last step
+        h.tstop = 1000
+        h.v_init = -65
+        h.stdinit()
+        t0 = time.perf_counter()
+        h.run()
+        wall = time.perf_counter() - t0
+        times = spikes.as_numpy().copy()
+        return wall, times, np.zeros(times.size, dtype=np.int64)
+
+    run.keep = (cell, iclamp, nc, spikes)
+    return run, 1
+
+
+def network_model():
+    """The parallel_network.py network on a single rank."""
+    net = ParallelNetwork({"dt": FIXED_DT})
+
+    def run(mode, atol):
+        net.params.update(run_mode=mode, atol=atol)
+        wall = net.run()
+        times, ids = net.gather_spikes()
+        return wall, times, ids
+
+    run.keep = net
+    return run, net.n_cells
+
+
+def report(label, run, n_cells, budget):
+    print(f"\n{label}")
+    print(f"{'mode':<9} {'atol':>7} {'wall (s)':>9} {'speed-up':>9} {'spikes':>7} "
+          f"{'max |dt|':>9} {'mean |dt|':>10} {'unpaired':>9}")
+    ref_wall, ref_times, ref_ids = run("fixed", None)
+    print(f"{'fixed':<9} {'-':>7} {ref_wall:9.3f} {1.0:9.2f} {ref_times.size:>7} "
+          f"{0.0:9.4f} {0.0:10.4f} {0:>9}")
+
+    best = ("fixed", None, ref_wall)
+    for mode, atol in VARIABLE_STEP:
+        wall, times, ids = run(mode, atol)
+        max_dev, mean_dev, unpaired = spike_time_deviation(ref_times, ref_ids, times, ids, n_cells)
+        print(f"{mode:<9} {atol:7.0e} {wall:9.3f} {ref_wall / wall:9.2f} {times.size:>7} "
+              f"{max_dev:9.4f} {mean_dev:10.4f} {unpaired:>9}")
+        if max_dev <= budget and unpaired == 0 and wall < best[2]:
+            best = (mode, atol, wall)
+    configure_run_mode("fixed")
+
+    mode, atol, wall = best
+    setting = mode if atol is None else f"{mode} atol={atol:.0e}"
+    print(f"-> fastest within {budget} ms: {setting} ({ref_wall / wall:.2f}x fixed step)")
+
+
+def main(budget):
+    report("L2/3 Pyramidal cell, 1000 ms", *cell_model(), budget)
+    report("E/I network, 500 ms", *network_model(), budget)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET)
@@ -0,0 +1,102 @@
+"""Cost of streaming the LFP of a realistic population onto a multi-contact probe.
+
+    python -m benchmarks.lfp [n_cells ...]
+
+Clones of the bundled pyramidal morphology are scattered in a 200 um radius
+column around a 32-contact linear probe and driven by Poisson input. Each
+size is run twice for the same tstop, without and with an LFPRecorder
+attached to the StreamingRecorder, and reports:
+
+    transfer cold/warm  building all transfer matrices, then again from the .npy cache
+    transfer MB         contacts x segments matrix of the whole population
+    buffer MB           i_membrane_ buffer of one recorder chunk
+    all-currents MB     what storing every segment current of the run would take
+    ms/s                simulated ms per wall second, without and with LFP
+    project s           time spent in the per-chunk matrix multiplies
+"""
+import sys
+import tempfile
+import time
+
+import numpy as np
+from neuron import h
+
+from background_drive import VecStimDrive, generate_poisson_trains, private_fibers
+from instrumentation import rss_mb
+from lfp import LFPRecorder, linear_probe, transfer_matrix
+from population import PopulationFactory
+from realistic_neuron_models import L23PyramidalCell
+from recorder import StreamingRecorder
+
+h.load_file("stdrun.hoc")
+
+SWC_FILE = "H17.06.006.11.09.04_591274508_m (1).swc"
+TSTOP = 200 #ms
+CHUNK = 50 #ms
+SAMPLE_DT = 0.1 #ms, 10 kHz
+COLUMN_RADIUS = 200 #um
+DRIVE_RATE = 50 #Hz
+DRIVE_WEIGHT = 0.01 #uS
+SEED = 1
+
+
+def placements(n, rng):
+    """Uniform in a vertical column around the probe, random rotation about the apical (y) axis."""
+    r = COLUMN_RADIUS * np.sqrt(rng.random(n))
+    phi = 2 * np.pi * rng.random(n)
+    positions = np.column_stack([r * np.cos(phi), rng.uniform(200, 400, n), r * np.sin(phi)])
+    rotations = np.column_stack([np.zeros(n), 2 * np.pi * rng.random(n), np.zeros(n)])
+    return list(zip(positions.tolist(), rotations.tolist()))
+
+
+def timed_run(recorder):
+    t0 = time.perf_counter()
+    recorder.run(TSTOP)
+    return time.perf_counter() - t0
+
+
+def main(sizes):
+    h.dt = 0.025
+    h.celsius = 34
+    h.v_init = -65
+    probe = linear_probe(32, spacing=20.0)
+    prototype = L23PyramidalCell(-1, SWC_FILE, synapse_seed=SEED)
+    factory = PopulationFactory(prototype)
+    del prototype
+    print(f"{'cells':>6} {'segments':>9} {'cold s':>7} {'warm s':>7} {'transfer MB':>12} {'buffer MB':>10} "
+          f"{'all-currents MB':>16} {'ms/s':>7} {'ms/s LFP':>9} {'project s':>10} {'RSS +MB':>8}")
+    for n in sizes:
+        rng = np.random.default_rng(SEED)
+        cells = factory.build(n, seed=SEED)
+        places = placements(n, rng)
+        trains = generate_poisson_trains(n, DRIVE_RATE, 0.0, TSTOP, rng)
+        drive = VecStimDrive(trains, private_fibers(n), [cell.syn_E_list[0] for cell in cells], DRIVE_WEIGHT)
+        n_segments = sum(sec.nseg for cell in cells for sec in cell.all_sections)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            recorder = StreamingRecorder(f"{tmp_dir}/spikes", chunk_duration=CHUNK)
+            recorder.record_spikes([cell.soma for cell in cells], -10)
+            wall_plain = timed_run(recorder)
+
+            rss0 = rss_mb()
+            t0 = time.perf_counter()
+            lfp = LFPRecorder(cells, probe, f"{tmp_dir}/lfp", places, sample_dt=SAMPLE_DT,
+                              cache_dir=f"{tmp_dir}/cache").attach(recorder)
+            cold = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            for cell, (position, rotation) in zip(cells, places):
+                transfer_matrix(cell, probe, position, rotation, cache_dir=f"{tmp_dir}/cache")
+            warm = time.perf_counter() - t0
+
+            wall_lfp = timed_run(recorder)
+            rss = rss_mb() - rss0
+            all_currents = n_segments * (TSTOP / SAMPLE_DT) * 8 / 1e6
+            print(f"{n:>6} {n_segments:>9} {cold:7.2f} {warm:7.2f} {lfp.transfer_mb:12.1f} {lfp.buffer_mb:10.1f} "
+                  f"{all_currents:16.1f} {TSTOP / wall_plain:7.1f} {TSTOP / wall_lfp:9.1f} "
+                  f"{lfp.project_time:10.3f} {rss:8.1f}")
+            lfp.detach()
+        del lfp, recorder, drive, cells
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [100, 1000])
@@ -0,0 +1,56 @@
+"""Build time and memory per cell: LFPy constructor vs cloning a prototype.
+
+    python -m benchmarks.population [n ...]
+
+Memory is the growth of the process RSS, so it includes NEURON's C-level
+allocations for sections, mechanisms and synapses.
+"""
+import gc
+import sys
+import time
+
+from neuron import h
+
+from population import PopulationFactory
+from realistic_neuron_models import L23BasketCell, L23PyramidalCell
+
+MORPHOLOGIES = [
+    ("Pyramidal", L23PyramidalCell, "H17.06.006.11.09.04_591274508_m (1).swc"),
+    ("Basket", L23BasketCell, "Fig2b_cell1_0904091kg.CNG.swc"),
+]
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux)."""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * 4096 / 1e6
+
+
+def measure(build):
+    gc.collect()
+    rss0 = rss_mb()
+    t0 = time.perf_counter()
+    cells = build()
+    elapsed = time.perf_counter() - t0
+    return cells, elapsed, rss_mb() - rss0
+
+
+def main(sizes):
+    for label, CellClass, swc_file in MORPHOLOGIES:
+        #first constructor call fills the morphology cache, the second is the warm per-cell cost
+        CellClass(0, swc_file)
+        prototype, t_ctor, mem_ctor = measure(lambda: CellClass(1, swc_file))
+        factory = PopulationFactory(prototype)
+        print(f"\n{label}: {len(prototype.all_sections)} sections")
+        print(f"{'cells':>7} {'ms/cell':>10} {'MB/cell':>10}")
+        print(f"{'ctor':>7} {t_ctor * 1000:10.2f} {mem_ctor:10.3f}")
+        for n in sizes:
+            clones, t_clone, mem_clone = measure(lambda: factory.build(n, first_id=2))
+            print(f"{n:>7} {t_clone / n * 1000:10.2f} {mem_clone / n:10.3f}")
+            del clones
+        print(f"  total sections alive: {sum(1 for _ in h.allsec())}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1, 100, 1000])
@@ -0,0 +1,138 @@
+"""Tabulated against analytic Im/Kv3_1 rates: speed and accuracy of the gating trajectories.
+
+    python -m benchmarks.rate_tables [n_segments] [--table-min -100] [--table-max 100]
+
+Speed: one long cable with n_segments segments carrying pas, Im and Kv3_1,
+run with usetable off and on (the rates are the only thing that changes), and
+the realistic Pyramidal cell under the test_realistic_cell.py IClamp.
+Accuracy: a single compartment is voltage clamped through a sequence of steps
+and a slow ramp over the whole table range; the m trajectories of both
+mechanisms are recorded with analytic and tabulated rates and compared, at
+two temperatures (the Im table is rebuilt when celsius changes).
+"""
+import argparse
+import time
+
+import numpy as np
+from neuron import h
+
+from mechanisms import TABLE_INTERVALS, TABLE_MECHANISMS, load_mechanisms, set_rate_tables
+from test_realistic_cell import build_cell, run_cell
+
+h.load_file("stdrun.hoc")
+
+DT = 0.025 #ms
+SPEED_TSTOP = 200 #ms
+CLAMP_STEPS = [(-65, 20), (-20, 50), (-80, 50), (10, 50), (-50, 50), (30, 30)] #(mV, ms)
+RAMP = (-100, 50, 400) #from mV, to mV, over ms
+TEMPERATURES = (21, 34) #degC
+
+
+def make_cable(n_segments):
+    cable = h.Section(name="cable")
+    cable.L, cable.diam, cable.nseg = n_segments * 10.0, 2.0, n_segments
+    for mech in ("pas",) + TABLE_MECHANISMS:
+        cable.insert(mech)
+    for seg in cable:
+        seg.g_pas, seg.e_pas = 3e-5, -65
+        seg.gbar_Im, seg.gbar_Kv3_1 = 1e-4, 1e-3
+    iclamp = h.IClamp(cable(0.0))
+    iclamp.delay, iclamp.dur, iclamp.amp = 20, SPEED_TSTOP, 0.5
+    return cable, iclamp
+
+
+def time_run(tstop):
+    h.dt = DT
+    h.tstop = tstop
+    h.finitialize(-65)
+    t0 = time.perf_counter()
+    h.continuerun(tstop)
+    return time.perf_counter() - t0
+
+
+def speed(n_segments, table_min, table_max):
+    cable, iclamp = make_cable(n_segments)
+    h.celsius = 34
+    times = {}
+    for enabled in (False, True):
+        set_rate_tables(enabled, table_min, table_max)
+        time_run(5) #builds the table outside the timed run
+        times[enabled] = time_run(SPEED_TSTOP)
+    print(f"cable, {n_segments} segments, {SPEED_TSTOP} ms: analytic {times[False]:.3f} s, "
+          f"tables {times[True]:.3f} s, speed-up {times[False] / times[True]:.2f}")
+    del iclamp, cable
+
+    cell_times = {}
+    for enabled in (False, True):
+        test = build_cell({"rate_tables": enabled, "profile": False, "sim_duration": SPEED_TSTOP})
+        set_rate_tables(enabled, table_min, table_max)
+        cell_times[enabled] = run_cell(test)
+        del test
+    print(f"Pyramidal cell, {SPEED_TSTOP} ms: analytic {cell_times[False]:.3f} s, tables {cell_times[True]:.3f} s, "
+          f"speed-up {cell_times[False] / cell_times[True]:.2f}")
+
+
+def clamp_protocol():
+    """(t, v) of the voltage clamp command: the steps, then the ramp."""
+    t, v = [0.0], [CLAMP_STEPS[0][0]]
+    for level, dur in CLAMP_STEPS:
+        t += [t[-1], t[-1] + dur]
+        v += [level, level]
+    v_from, v_to, dur = RAMP
+    t += [t[-1], t[-1] + dur]
+    v += [v_from, v_to]
+    return np.array(t[1:]), np.array(v[1:])
+
+
+def gating_trajectories(enabled, celsius, table_min, table_max):
+    """m of Im and Kv3_1 sampled every dt under the clamp protocol."""
+    soma = h.Section(name="clamped")
+    soma.L = soma.diam = 20
+    for mech in TABLE_MECHANISMS:
+        soma.insert(mech)
+    clamp = h.SEClamp(soma(0.5))
+    clamp.dur1, clamp.rs = 1e9, 1e-3
+    t_cmd, v_cmd = clamp_protocol()
+    t_vec, v_vec = h.Vector(t_cmd), h.Vector(v_cmd)
+    v_vec.play(clamp._ref_amp1, t_vec, 1) #continuous: the ramp is interpolated
+    records = {mech: h.Vector().record(getattr(soma(0.5), f"_ref_m_{mech}"), DT) for mech in TABLE_MECHANISMS}
+    v_rec = h.Vector().record(soma(0.5)._ref_v, DT)
+
+    h.celsius = celsius
+    set_rate_tables(enabled, table_min, table_max)
+    time_run(t_cmd[-1])
+    result = {mech: vec.as_numpy().copy() for mech, vec in records.items()}
+    result["v"] = v_rec.as_numpy().copy()
+    del clamp, soma
+    return result
+
+
+def accuracy(table_min, table_max):
+    resolution = (table_max - table_min) / TABLE_INTERVALS
+    print(f"\nTable range {table_min:g} to {table_max:g} mV, {resolution:g} mV per interval")
+    print(f"{'celsius':>8} {'mechanism':>10} {'max |dm|':>10} {'rms dm':>10} {'max |dm|/range':>15}")
+    for celsius in TEMPERATURES:
+        analytic = gating_trajectories(False, celsius, table_min, table_max)
+        tabulated = gating_trajectories(True, celsius, table_min, table_max)
+        for mech in TABLE_MECHANISMS:
+            dm = tabulated[mech] - analytic[mech]
+            span = max(analytic[mech].max() - analytic[mech].min(), 1e-12)
+            print(f"{celsius:>8} {mech:>10} {np.abs(dm).max():10.2e} {np.sqrt(np.mean(dm ** 2)):10.2e} "
+                  f"{np.abs(dm).max() / span:15.2e}")
+    set_rate_tables(False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tabulated against analytic Im/Kv3_1 rates.")
+    parser.add_argument("n_segments", type=int, nargs="?", default=5000)
+    parser.add_argument("--table-min", type=float, default=-100)
+    parser.add_argument("--table-max", type=float, default=100)
+    args = parser.parse_args(argv)
+    load_mechanisms()
+    accuracy(args.table_min, args.table_max)
+    print()
+    speed(args.n_segments, args.table_min, args.table_max)
+
+
+if __name__ == "__main__":
+    main()
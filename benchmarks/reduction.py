@@ -0,0 +1,91 @@
+"""Fidelity and speed of the reduced (equivalent-cylinder) cells against the full reconstructions.
+
+    python -m benchmarks.reduction [--cell Pyramidal Basket] [--sim-duration 1000]
+
+Both versions of each cell run the test_realistic_cell.py IClamp protocol
+(same delay, duration and amplitude). The report compares the reduced soma
+trace with the full one (RMSE over the whole run and during the step), the
+spike times (k-th spike against k-th spike) and the adaptation ratio, and
+gives the speed-up of the run and the compartment counts.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from reduction import delete_cell_sections
+from run_modes import compartment_count
+from spike_analysis import spike_time_deviation
+from test_realistic_cell import CELL_TYPES, analyze, build_cell, run_cell
+
+
+def run_version(params):
+    test = build_cell(params)
+    wall = run_cell(test)
+    stats = analyze(test)
+    result = {"wall_s": wall, "compartments": compartment_count(test.cell_object), "stats": stats,
+              "t": test.t_vec.as_numpy().copy(), "v": test.v_soma_vec.as_numpy().copy(),
+              "spikes": test.spike_times_vec.as_numpy().copy(),
+              "stim": (test.iclamp.delay, test.iclamp.delay + test.iclamp.dur)}
+    cell = test.cell_object
+    del test
+    delete_cell_sections(cell) #the next version is simulated alone
+    return result
+
+
+def fidelity_report(cell, sim_duration=None):
+    params = {"cell": cell, "profile": False}
+    if sim_duration is not None:
+        params["sim_duration"] = sim_duration
+    full = run_version(dict(params, reduce=False))
+    reduced = run_version(dict(params, reduce=True))
+
+    n = min(full["v"].size, reduced["v"].size)
+    diff = reduced["v"][:n] - full["v"][:n]
+    stim_start, stim_end = full["stim"]
+    during = (full["t"][:n] >= stim_start) & (full["t"][:n] < stim_end)
+    max_dt, mean_dt, n_unpaired = spike_time_deviation(
+        full["spikes"], np.zeros(full["spikes"].size, dtype=np.int64),
+        reduced["spikes"], np.zeros(reduced["spikes"].size, dtype=np.int64), 1)
+    return {
+        "cell": cell,
+        "compartments_full": full["compartments"],
+        "compartments_reduced": reduced["compartments"],
+        "rmse_mv": float(np.sqrt(np.mean(diff ** 2))),
+        "rmse_stim_mv": float(np.sqrt(np.mean(diff[during] ** 2))) if during.any() else float("nan"),
+        "spikes_full": full["stats"]["spike_count"],
+        "spikes_reduced": reduced["stats"]["spike_count"],
+        "spike_time_error_max_ms": max_dt,
+        "spike_time_error_mean_ms": mean_dt,
+        "unpaired_spikes": n_unpaired,
+        "adaptation_full": full["stats"]["adaptation_ratio"],
+        "adaptation_reduced": reduced["stats"]["adaptation_ratio"],
+        "wall_full_s": full["wall_s"],
+        "wall_reduced_s": reduced["wall_s"],
+        "speedup": full["wall_s"] / reduced["wall_s"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cell", nargs="+", choices=sorted(CELL_TYPES), default=sorted(CELL_TYPES, reverse=True))
+    parser.add_argument("--sim-duration", type=float)
+    parser.add_argument("--json", help="also write the reports to this file")
+    args = parser.parse_args(argv)
+
+    reports = [fidelity_report(cell, args.sim_duration) for cell in args.cell]
+    print(f"\n{'cell':<10} {'comps':>12} {'RMSE mV':>8} {'(stim)':>7} {'spikes':>9} {'dt max/mean ms':>15} "
+          f"{'unpaired':>8} {'adaptation':>13} {'speed-up':>9}")
+    for r in reports:
+        print(f"{r['cell']:<10} {r['compartments_full']:>6}->{r['compartments_reduced']:<5} {r['rmse_mv']:8.2f} "
+              f"{r['rmse_stim_mv']:7.2f} {r['spikes_full']:>4}/{r['spikes_reduced']:<4} "
+              f"{r['spike_time_error_max_ms']:7.2f}/{r['spike_time_error_mean_ms']:<7.2f} {r['unpaired_spikes']:>8} "
+              f"{r['adaptation_full']:6.3f}/{r['adaptation_reduced']:<6.3f} {r['speedup']:9.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=1)
+    return reports
+
+
+if __name__ == "__main__":
+    main()
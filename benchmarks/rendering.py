@@ -0,0 +1,89 @@
+"""Raster/voltage plotting: scatter and full traces vs density image and min/max decimation.
+
+    python -m benchmarks.rendering [n_spikes ...]
+
+Synthetic Poisson spikes of 10k cells over 10 s and four 10 s voltage traces
+at dt = 0.025 ms (400k samples each) are written as a recorder store (.npz
+chunks of 100 ms). Each method then reads that store and saves a PNG. Memory
+is the tracemalloc peak, which covers NumPy buffers and matplotlib's Python
+objects; the scatter raster is skipped above --max-scatter spikes.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from plot_results import plot_raster, plot_raster_density, plot_voltages, plot_voltages_decimated
+from recorder import _NPZStore, load_spikes, load_voltages
+
+N_CELLS = 10000
+DURATION = 10000.0 #ms
+CHUNK = 100.0 #ms
+DT = 0.025 #ms
+VOLTAGE_IDS = [0, 40, 80, 99]
+MAX_SCATTER = 2_000_000
+
+
+def write_store(path, n_spikes, rng):
+    """Recorder store with n_spikes uniformly spread over cells and time, plus synthetic voltages."""
+    store = _NPZStore(path, VOLTAGE_IDS)
+    n_chunks = int(DURATION / CHUNK)
+    per_chunk = rng.multinomial(n_spikes, np.full(n_chunks, 1.0 / n_chunks))
+    samples = int(CHUNK / DT)
+    phase = rng.random(len(VOLTAGE_IDS)) * 2 * np.pi
+    for k, n in enumerate(per_chunk.tolist()):
+        t0 = k * CHUNK
+        times = np.sort(t0 + rng.random(n) * CHUNK)
+        ids = rng.integers(0, N_CELLS, n)
+        t = t0 + np.arange(samples) * DT
+        v = (-65 + 10 * np.sin(t[:, None] / 20.0 + phase) + rng.normal(0, 1, (samples, len(VOLTAGE_IDS))))
+        store.append(times, ids, t, v.astype(np.float32))
+    store.close()
+
+
+def measure(render):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    render()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def main(spike_counts, max_scatter=MAX_SCATTER):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        png = os.path.join(tmp_dir, "out.png")
+        print(f"{'spikes':>10} {'method':<22} {'time (s)':>9} {'peak (MB)':>10}")
+        for n_spikes in spike_counts:
+            store = os.path.join(tmp_dir, f"store_{n_spikes}")
+            write_store(store, n_spikes, rng)
+            methods = [("density (imshow)", lambda: plot_raster_density(store, N_CELLS, DURATION, "bench", png))]
+            if n_spikes <= max_scatter:
+                methods.insert(0, ("scatter", lambda: plot_raster(*load_spikes(store), N_CELLS, DURATION,
+                                                                  "bench", png)))
+            for label, render in methods:
+                elapsed, peak = measure(render)
+                print(f"{n_spikes:>10} {label:<22} {elapsed:9.2f} {peak:10.1f}")
+
+        samples = int(DURATION / DT)
+        for label, render in [
+            ("full traces", lambda: plot_voltages(*load_voltages(store), 80, png)),
+            ("min/max decimated", lambda: plot_voltages_decimated(store, 80, DURATION, png)),
+        ]:
+            elapsed, peak = measure(render)
+            print(f"{'V ' + str(samples):>10} {label:<22} {elapsed:9.2f} {peak:10.1f}")
+        plt.close("all")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--max-scatter=")]
+    limit = [int(a.split("=", 1)[1]) for a in sys.argv[1:] if a.startswith("--max-scatter=")]
+    main([int(float(a)) for a in args] or [100_000, 1_000_000, 10_000_000], *limit)
@@ -0,0 +1,71 @@
+"""Build time of the KD-tree spatial connectivity against network size.
+
+    python -m benchmarks.spatial [N ...]
+
+Cells are placed in a column whose radius grows with sqrt(N), so the cell
+density and therefore the number of neighbours within the cutoff (k) stay
+fixed; an O(N * k) builder then shows a constant time per cell. Up to
+BRUTE_MAX_CELLS the same network is also drawn from the full N x N distance
+matrix (in row chunks, as an O(N^2) reference).
+"""
+import sys
+import time
+
+import numpy as np
+
+from connectivity import connectivity_from_edges
+from instrumentation import peak_rss_mb
+from spatial_network import build_spatial_connectivity, place_column
+
+BRUTE_MAX_CELLS = 20000
+DENSITY = 1e5 / 1e9 #cells per um^3 (100k per mm^3)
+DEPTH = 500 #um
+P_MAX = 0.2
+LENGTH_CONSTANT = 100 #um
+CUTOFF = 250 #um
+WEIGHTS = {"EE": 0.003, "EI": 0.001, "IE": 0.01, "II": 0.01}
+
+
+def brute_force(positions, num_E, num_I, rng, rows_per_chunk=256):
+    """Same distribution from every pair's distance (O(N^2) time, row-chunked memory)."""
+    n = len(positions)
+    src_parts, tgt_parts, dist_parts = [], [], []
+    for start in range(0, n, rows_per_chunk):
+        stop = min(start + rows_per_chunk, n)
+        d = np.linalg.norm(positions[start:stop, None, :] - positions[None, :, :], axis=2)
+        p = np.where(d < CUTOFF, P_MAX * np.exp(-d ** 2 / (2 * LENGTH_CONSTANT ** 2)), 0.0)
+        p[np.arange(stop - start), np.arange(start, stop)] = 0.0
+        src, tgt = np.nonzero(rng.random(p.shape) < p)
+        src_parts.append(src + start)
+        tgt_parts.append(tgt)
+        dist_parts.append(d[src, tgt])
+    return connectivity_from_edges(np.concatenate(src_parts), np.concatenate(tgt_parts),
+                                   0.5 + np.concatenate(dist_parts) / 500.0, num_E, num_I, WEIGHTS, positions)
+
+
+def main(sizes):
+    print(f"{'N':>8} {'radius um':>10} {'conns':>11} {'k out':>7} {'kd-tree s':>10} {'us/cell':>8} "
+          f"{'brute s':>9} {'peak MB':>8}")
+    for n in sizes:
+        rng = np.random.default_rng(1)
+        radius = np.sqrt(n / (DENSITY * DEPTH * np.pi))
+        positions = place_column(n, radius, DEPTH, rng)
+        num_E = int(0.8 * n)
+
+        t0 = time.perf_counter()
+        conn = build_spatial_connectivity(positions, num_E, n - num_E, P_MAX, LENGTH_CONSTANT, CUTOFF, WEIGHTS,
+                                          seed=1)
+        t_tree = time.perf_counter() - t0
+
+        if n <= BRUTE_MAX_CELLS:
+            t0 = time.perf_counter()
+            brute_force(positions, num_E, n - num_E, rng)
+            brute_label = f"{time.perf_counter() - t0:9.2f}"
+        else:
+            brute_label = f"{'n/a':>9}"
+        print(f"{n:>8} {radius:10.0f} {conn.n_connections:>11} {conn.n_connections / n:7.1f} {t_tree:10.2f} "
+              f"{t_tree / n * 1e6:8.1f} {brute_label} {peak_rss_mb():8.0f}")
+
+
+if __name__ == "__main__":
+    main([int(float(a)) for a in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,311 @@
+"""Re-runnable benchmark suite with every build and run phase timed separately.
+
+    python -m benchmarks.suite [--cells 100 1000 10000] [--morphology Pyramidal Basket]
+                               [--threads 1 4] [--tstop 200] [--save-baseline]
+                               [--backend coreneuron [--coreneuron-mode file]]
+    mpiexec -n 4 python -m benchmarks.suite ...    # rank count comes from MPI
+
+A case is one (cells, morphology, threads, ranks, tstop) combination: a
+network of clones of a bundled morphology with random E/I connectivity and
+Poisson drive. Phases, each reported as the max over ranks:
+
+    mechanism_load   load_mechanisms() (only the first case of a process loads)
+    morphology_load  prototype cell through LFPy/the morphology cache, then the clones
+    biophysics       apply_biophysics on every clone
+    synapses         synapse placement on every clone
+    connectivity     build_connectivity, gid registration, gid_connect and the drive
+    init             finitialize
+    solve            pc.psolve(tstop) (with --backend coreneuron: finitialize, transfer and CoreNEURON run)
+    spike_export     gather to rank 0 and write an .npz
+    analysis         rates, ISI CV and synchrony of the exported raster
+
+Every case is appended as one JSON line to benchmarks/results/history.jsonl.
+Cases with an entry in benchmarks/results/baseline.json (written with
+--save-baseline) are checked: a phase that is slower than the baseline by more
+than --tolerance (relative) and --min-seconds (absolute) is a regression, and
+the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from neuron import h
+
+from background_drive import VecStimDrive, generate_poisson_trains
+from connectivity import build_connectivity
+from coreneuron_backend import BACKENDS, TRANSFER_MODES, psolve as coreneuron_psolve
+from instrumentation import Profiler, peak_rss_mb
+from load_balance import round_robin_owners
+from mechanisms import load_mechanisms
+from population import PopulationFactory
+from random_streams import RandomStreams
+from realistic_neuron_models import L23BasketCell, L23PyramidalCell
+from run_modes import compartment_count, disable_multithreading, enable_fixed_step, enable_multithreading
+from spike_analysis import binned_counts, firing_rates, isi_cv, synchrony
+
+h.load_file("stdrun.hoc")
+
+MORPHOLOGIES = {
+    "Pyramidal": (L23PyramidalCell, "H17.06.006.11.09.04_591274508_m (1).swc"),
+    "Basket": (L23BasketCell, "Fig2b_cell1_0904091kg.CNG.swc"),
+}
+PHASES = ("mechanism_load", "morphology_load", "biophysics", "synapses", "connectivity",
+          "init", "solve", "spike_export", "analysis")
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+HISTORY_PATH = os.path.join(RESULTS_DIR, "history.jsonl")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+
+#~~~ MODEL (fixed so that cases stay comparable over time) ~~~#
+E_FRACTION = 0.8
+IN_DEGREE = 100 #expected inputs per cell; p = IN_DEGREE / n, capped at 0.1
+WEIGHTS = {"EE": 0.003, "EI": 0.001, "IE": 0.01, "II": 0.01}
+NETCON_DELAY = 1.5 #ms
+DRIVE_RATE = 15 #Hz
+DRIVE_WEIGHT = 0.01 #uS
+NUM_SYN_EACH_TYPE = 10
+SPIKE_THRESHOLD = -10 #mV
+SEED = 1
+
+
+def case_id(case):
+    backend = case.get("backend", "neuron")
+    suffix = "" if backend == "neuron" else f"_{backend}"
+    return f"{case['morphology']}_n{case['cells']}_t{case['threads']}_r{case['ranks']}_{case['tstop']:g}ms{suffix}"
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(RESULTS_DIR))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_case(pc, n_cells, morphology, nthread, tstop, backend="neuron", coreneuron_mode="memory"):
+    """Build, run and export one network; returns its history record (on every rank)."""
+    rank, nhost = int(pc.id()), int(pc.nhost())
+    prof = Profiler(count_objects=False)
+    CellClass, swc_file = MORPHOLOGIES[morphology]
+    owners = round_robin_owners(n_cells, nhost)
+    local_gids = np.flatnonzero(owners == rank).tolist()
+
+    with prof.phase("mechanism_load"):
+        load_mechanisms(coreneuron=backend == "coreneuron")
+
+    with prof.phase("morphology_load"):
+        prototype = CellClass(n_cells, swc_file, synapse_seed=SEED) #id outside the gid range
+        factory = PopulationFactory(prototype)
+        del prototype
+        cells = {gid: factory.clone(gid, SEED, staged=True) for gid in local_gids}
+        for cell in cells.values():
+            cell.instantiate()
+
+    with prof.phase("biophysics"):
+        for cell in cells.values():
+            cell.assign_biophysics()
+
+    with prof.phase("synapses"):
+        for cell in cells.values():
+            cell.add_synapses(NUM_SYN_EACH_TYPE)
+
+    with prof.phase("connectivity"):
+        num_E = int(E_FRACTION * n_cells)
+        conn = build_connectivity(num_E, n_cells - num_E, min(0.1, IN_DEGREE / n_cells), WEIGHTS,
+                                  NETCON_DELAY, seed=SEED, gids=local_gids) #local recievers only
+        detectors = []
+        for gid, cell in cells.items():
+            pc.set_gid2node(gid, rank)
+            nc = h.NetCon(cell.soma(0.5)._ref_v, None, sec=cell.soma)
+            nc.threshold = SPIKE_THRESHOLD
+            pc.cell(gid, nc)
+            detectors.append(nc)
+        no_synapses = [gid for gid, cell in cells.items() if not cell.syn_E_list or not cell.syn_I_list]
+        if no_synapses:
+            raise RuntimeError(f"{len(no_synapses)} {morphology} cells (e.g. gid {no_synapses[0]}) got no E or no I "
+                               f"synapses; connections and drive need both")
+        sources = conn.sources()
+        local = np.flatnonzero(owners[conn.indices] == rank)
+        netcons = []
+        for k, pre, post in zip(local.tolist(), sources[local].tolist(), conn.indices[local].tolist()):
+            syn_list = cells[post].syn_E_list if pre < num_E else cells[post].syn_I_list
+            nc = pc.gid_connect(pre, syn_list[pre % len(syn_list)])
+            nc.delay = float(conn.delays[k])
+            nc.weight[0] = float(conn.weights[k])
+            netcons.append(nc)
+        trains = generate_poisson_trains(n_cells, DRIVE_RATE, 0.0, tstop, RandomStreams(SEED), fibers=local_gids)
+        fiber_targets = [[] for _ in range(n_cells)]
+        for gid in local_gids:
+            fiber_targets[gid] = [gid]
+        drive = VecStimDrive(trains, fiber_targets, {gid: cell.syn_E_list[0] for gid, cell in cells.items()},
+                             DRIVE_WEIGHT)
+        spike_times_vec, spike_ids_vec = h.Vector(), h.Vector()
+        pc.spike_record(-1, spike_times_vec, spike_ids_vec)
+
+    if nthread > 1:
+        enable_multithreading(nthread, list(cells.values()))
+    else:
+        enable_fixed_step()
+
+    with prof.phase("init"):
+        h.dt = 0.025
+        pc.set_maxstep(10)
+        if backend == "neuron":
+            h.finitialize(-65)
+
+    with prof.phase("solve"):
+        if backend == "neuron":
+            pc.psolve(tstop)
+        else:
+            coreneuron_psolve(pc, tstop, -65, coreneuron_mode, spike_vecs=(spike_times_vec, spike_ids_vec))
+
+    with prof.phase("spike_export"):
+        gathered = pc.py_gather((spike_times_vec.as_numpy().copy(), spike_ids_vec.as_numpy().astype(np.int64)), 0)
+        if rank == 0:
+            times = np.concatenate([g[0] for g in gathered])
+            ids = np.concatenate([g[1] for g in gathered])
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                np.savez(os.path.join(tmp_dir, "spikes.npz"), times=times, ids=ids)
+
+    with prof.phase("analysis"):
+        if rank == 0:
+            firing_rates(times, ids, n_cells, 0.0, tstop)
+            isi_cv(times, ids, n_cells)
+            synchrony(binned_counts(times, ids, n_cells, 0.0, tstop, 5.0))
+
+    n_spikes = int(pc.allreduce(spike_times_vec.size(), 1))
+    compartments = int(pc.allreduce(sum(compartment_count(cell) for cell in cells.values()), 1))
+    local_times = prof.phase_times()
+    phases = {name: pc.allreduce(local_times.get(name, 0.0), 2) for name in PHASES} #max over ranks
+    peak_rss = pc.allreduce(peak_rss_mb(), 2)
+
+    if nthread > 1:
+        disable_multithreading()
+    pc.gid_clear()
+    del drive, netcons, detectors, cells
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "host": platform.node(),
+        "neuron": h.nrnversion(),
+        "case": dict({"cells": n_cells, "morphology": morphology, "threads": nthread, "ranks": nhost, "tstop": tstop},
+                     **({} if backend == "neuron" else {"backend": backend})),
+        "phases": phases,
+        "total": sum(phases.values()),
+        "compartments": compartments,
+        "connections": int(pc.allreduce(conn.n_connections, 1)),
+        "spikes": n_spikes,
+        "peak_rss_mb": peak_rss,
+    }
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(records, path=BASELINE_PATH):
+    """Merge records into the baseline, replacing earlier entries of the same case."""
+    baseline = load_baseline(path)
+    baseline.update({case_id(record["case"]): record for record in records})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+
+
+def append_history(records, path=HISTORY_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def find_regressions(records, baseline, tolerance=0.2, min_seconds=0.05):
+    """[(case id, phase, baseline s, current s)] for every phase slower than the baseline."""
+    regressions = []
+    for record in records:
+        reference = baseline.get(case_id(record["case"]))
+        if reference is None:
+            continue
+        for phase, t in record["phases"].items():
+            t_ref = reference["phases"].get(phase)
+            if t_ref is not None and t > t_ref * (1 + tolerance) and t - t_ref > min_seconds:
+                regressions.append((case_id(record["case"]), phase, t_ref, t))
+    return regressions
+
+
+def print_record(record, reference=None):
+    print(f"\n{case_id(record['case'])}: {record['compartments']} compartments, "
+          f"{record['connections']} connections, {record['spikes']} spikes")
+    print(f"{'phase':<16} {'time (s)':>10} {'baseline':>10} {'ratio':>7}")
+    for phase in PHASES:
+        t = record["phases"][phase]
+        t_ref = reference["phases"].get(phase) if reference else None
+        if t_ref:
+            print(f"{phase:<16} {t:10.3f} {t_ref:10.3f} {t / t_ref:7.2f}")
+        else:
+            print(f"{phase:<16} {t:10.3f} {'-':>10} {'-':>7}")
+    print(f"{'total':<16} {record['total']:10.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--morphology", nargs="+", choices=sorted(MORPHOLOGIES), default=sorted(MORPHOLOGIES))
+    parser.add_argument("--threads", type=int, nargs="+", default=[1])
+    parser.add_argument("--tstop", type=float, nargs="+", default=[200.0])
+    parser.add_argument("--backend", choices=BACKENDS, default="neuron")
+    parser.add_argument("--coreneuron-mode", choices=TRANSFER_MODES, default="memory")
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slow-down counted as regression")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="ignore slow-downs smaller than this")
+    args = parser.parse_args(argv)
+
+    h.nrnmpi_init() #no-op when not launched under mpiexec
+    pc = h.ParallelContext()
+    root = int(pc.id()) == 0
+    baseline = load_baseline(args.baseline)
+
+    records = []
+    for morphology in args.morphology:
+        for n_cells in args.cells:
+            for nthread in args.threads:
+                for tstop in args.tstop:
+                    record = run_case(pc, n_cells, morphology, nthread, tstop, args.backend, args.coreneuron_mode)
+                    records.append(record)
+                    if root:
+                        print_record(record, baseline.get(case_id(record["case"])))
+
+    status = 0
+    if root:
+        append_history(records, args.history)
+        print(f"\nAppended {len(records)} cases to {args.history}")
+        regressions = find_regressions(records, baseline, args.tolerance, args.min_seconds)
+        for case, phase, t_ref, t in regressions:
+            print(f"REGRESSION {case} {phase}: {t_ref:.3f} s -> {t:.3f} s ({t / t_ref:.2f}x)")
+        if regressions:
+            status = 1
+        elif baseline:
+            print("No regressions against the baseline")
+        if args.save_baseline:
+            save_baseline(records, args.baseline)
+            print(f"Baseline updated: {args.baseline}")
+    pc.barrier()
+    pc.done()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""Speed-up of the realistic single-cell run against thread count.
+
+    python -m benchmarks.threads [max_threads]
+
+Builds each bundled morphology once (Pyramidal and Basket, as in
+test_realistic_cell.py), then re-runs the same IClamp protocol with
+1, 2, 4, ... threads. Each cell is cut at the soma with multisplit.
+"""
+import os
+import sys
+import time
+
+from neuron import h
+
+from realistic_neuron_models import L23BasketCell, L23PyramidalCell
+from run_modes import compartment_count, disable_multithreading, enable_multithreading
+
+h.load_file("stdrun.hoc")
+
+MORPHOLOGIES = [
+    ("Pyramidal", L23PyramidalCell, "H17.06.006.11.09.04_591274508_m (1).swc", 0.5),
+    ("Basket", L23BasketCell, "Fig2b_cell1_0904091kg.CNG.swc", 0.8),
+]
+SIM_DURATION = 300 #ms
+
+
+def time_run(tstop):
+    h.tstop = tstop
+    h.stdinit()
+    t0 = time.perf_counter()
+    h.run()
+    return time.perf_counter() - t0
+
+
+def main(max_threads):
+    thread_counts = [n for n in (1, 2, 4, 8, 16, 32) if n <= max_threads]
+    h.dt = 0.025
+    h.celsius = 34
+    h.v_init = -65
+    for label, CellClass, swc_file, amp in MORPHOLOGIES:
+        cell = CellClass(0, swc_file, v_init=-65)
+        iclamp = h.IClamp(cell.soma(0.5))
+        iclamp.delay, iclamp.dur, iclamp.amp = 50, SIM_DURATION - 100, amp
+
+        print(f"\n{label}: {len(cell.all_sections)} sections, {compartment_count(cell)} compartments")
+        print(f"{'threads':>8} {'wall (s)':>10} {'speed-up':>10}")
+        t_single = None
+        for n in thread_counts:
+            enable_multithreading(n, [cell], multisplit=True)
+            t = time_run(SIM_DURATION)
+            t_single = t_single or t
+            print(f"{n:>8} {t:10.3f} {t_single / t:10.2f}")
+        disable_multithreading() #before the cell is freed: a new soma may get its address
+        del iclamp, cell
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count())
@@ -0,0 +1,110 @@
+###                ###
+###~~~BIOPHYSICS~~~###
+###                ###
+"""Declarative biophysics applied in bulk to region SectionLists.
+
+A spec maps mechanism -> region -> {parameter: value}, e.g.
+
+    {
+        'pas': {'all': {'g_pas': 1 / 30000.0, 'e_pas': -65.0}},
+        'Im': {'perisomatic': {'gbar_Im': 1e-4}},
+        'hh': {'dend': {'gkbar_hh': lambda d: 0.036 * np.exp(-d / 200.0)}},
+    }
+
+A value is either a number (set on every segment of the region) or a function
+of the path distance from the soma in um, evaluated on a NumPy array of all
+segment distances of the region at once. Insertion and assignment run as small
+generated hoc procedures looping over the SectionList, so each
+(mechanism, region) costs one call from Python instead of one per section.
+"""
+import numpy as np
+from neuron import h
+
+_defined_procs = set()
+
+
+def _hoc_proc(name, body, kind="proc"):
+    """Define hoc proc (or func) `name` once per process; returns the callable."""
+    if name not in _defined_procs:
+        h(f"{kind} {name}() {{\n{body}\n}}")
+        _defined_procs.add(name)
+    return getattr(h, name)
+
+
+def _count_proc():
+    return _hoc_proc("bulk_count_sections", "local n\n n = 0\n forsec $o1 n += 1\n return n", kind="func")
+
+
+def _insert_proc(mech):
+    return _hoc_proc(f"bulk_insert_{mech}", f"forsec $o1 insert {mech}")
+
+
+def _set_proc(param):
+    return _hoc_proc(f"bulk_set_{param}", f"forsec $o1 {{ {param} = $2 }}")
+
+
+def _set_vector_proc(param):
+    return _hoc_proc(f"bulk_setvec_{param}",
+                     "local i\n i = 0\n"
+                     f"forsec $o1 for (x, 0) {{\n {param}(x) = $o2.x[i]\n i += 1\n }}")
+
+
+def _distance_proc():
+    return _hoc_proc("bulk_seg_distance", "forsec $o1 for (x, 0) $o2.append(distance(x))")
+
+
+def region_section_lists(region_sections):
+    """{name: [sections]} -> {name: h.SectionList}."""
+    regions = {}
+    for name, sections in region_sections.items():
+        seclist = h.SectionList()
+        for sec in sections:
+            seclist.append(sec=sec)
+        regions[name] = seclist
+    return regions
+
+
+def segment_distances(seclist, origin):
+    """Path distance (um) from origin(0.5) of every segment in seclist, in forsec/for(x, 0) order."""
+    h.distance(0, 0.5, sec=origin)
+    distances = h.Vector()
+    _distance_proc()(seclist, distances)
+    return distances.as_numpy().copy()
+
+
+def set_section_params(seclist, params):
+    """Set section-wide values such as Ra and cm on every section of seclist."""
+    for param, value in params.items():
+        _set_proc(param)(seclist, float(value))
+
+
+def apply_biophysics(spec, regions, origin=None):
+    """Insert and parameterise every (mechanism, region) of spec.
+
+    regions: {name: h.SectionList}. origin: section whose midpoint is distance 0
+    for distance-dependent parameters (normally the soma).
+    Returns {mechanism: number of sections it was inserted into}.
+    """
+    counts = {}
+    distance_cache = {}
+    for mech, by_region in spec.items():
+        counts[mech] = 0
+        for region, params in by_region.items():
+            seclist = regions[region]
+            n_sections = int(_count_proc()(seclist))
+            if n_sections == 0:
+                continue
+            _insert_proc(mech)(seclist)
+            counts[mech] += n_sections
+            for param, value in params.items():
+                if callable(value):
+                    if origin is None:
+                        raise ValueError(f"{mech}.{param} on '{region}' is distance-dependent but no origin was given")
+                    if region not in distance_cache:
+                        distance_cache[region] = segment_distances(seclist, origin)
+                    values = np.broadcast_to(np.asarray(value(distance_cache[region]), dtype=np.float64),
+                                             distance_cache[region].shape)
+                    _set_vector_proc(param)(seclist, h.Vector(values))
+                else:
+                    _set_proc(param)(seclist, float(value))
+    return counts
@@ -1,225 +1,313 @@
 ###                  ###
 ###~~~CELL NETWORK~~~###
 ###                  ###
-from neuron import h, gui
-import matplotlib.pyplot as plt
-import random
-import numpy as np 
+"""E/I network of simple HH cells with random connectivity and Poisson background drive.
+
+    python cell_network.py                   # run, then plot (loads the NEURON gui)
+    python cell_network.py --headless        # run and save only; no gui, no matplotlib
+
+build_network() and run_network() can be imported by batch workers without
+running anything. Spikes, voltages, the run info and the profile are written
+next to results_path; plots are made afterwards from those files by
+plot_results.py.
+"""
+import argparse
+import json
+import os
 import time
+
+import numpy as np
+from neuron import h
+
 from neuron_models import create_simple_hh_cell
+from connectivity import Connectivity, build_connectivity, instantiate_netcons
+from spatial_network import build_spatial_connectivity, column_size, place_column, place_layers
+from background_drive import VecStimDrive, generate_poisson_trains, private_fibers, shared_fibers
+from random_streams import RandomStreams
+from recorder import StreamingRecorder, load_spikes
+from run_modes import configure_run_mode
+from checkpoint import model_hash, warm_start
+from instrumentation import Profiler
 
 h.load_file("stdrun.hoc")
 
-#~~~ NETWORK PARAMS ~~~#
-num_E = 80 #no. of excitatory
-num_I = 20 #no. of inhibitory
-total_cells = num_E + num_I
-
-#~~~ SIMULTATION PARAMS ~~~#
-sim_duration = 500 #ms
-h.dt = 0.025 #time step integration
-v_init_global = -65 #mV (initial voltage)
-
-#~~~ CONNECTIVITY PARAMS ~~~#
-connection_probability = 0.1 #chance of connection between 2 cells
-netcon_delay = 1.5 #synaptic delay
-
-#~~~ WEIGHT PARAMS ~~~# TO BE ADJUSTED!
-weight_EE = 0.003
-weight_EI = 0.001
-weight_IE = 0.01
-weight_II = 0.01
-
-#~~~ DRIVE PARAMS ~~~# TO BE ADJUSTED!
-drive_rate = 15 #Hz, approx firing rate of background input p/cell
-drive_weight = 0.01 #uS (strength of background input)
-
-
-#~~~ CREATE CELL POP ~~~#
-print("Creating cell pop")
-cells = []
-for i in range(total_cells):
-    cells.append(create_simple_hh_cell(i))
-
-E_cells = cells[:num_E] 
-I_cells = cells[num_E:]
-print(f"Created {len(E_cells)} E cells and {len(I_cells)} I cells")
-
-#~~~ Adding synapse objects to cells ~~~#
-print("Adding synapse objects to cells")
-synapses_E = []
-synapses_I = []
-"""Iterate through every soma and attach 2 objects at midpoint"""
-for cell_soma in cells:
-    #EXCITATORY SYNAPSE (AMPA model)
-    syn_E = h.Exp2Syn(cell_soma(0.5))
-    syn_E.tau1 = 0.2 #rise time
-    syn_E.tau2 = 2.0 #decay time
-    syn_E.e = 0 #reversal potential (excitatory)
-    synapses_E.append(syn_E)
-
-    #INHIBITORY SYNAPSE (GABAa model)
-    syn_I = h.Exp2Syn(cell_soma(0.5))
-    syn_I.tau1 = 0.5
-    syn_I.tau2 = 5.0
-    syn_I.e = -75 #reversal potential (inhibitory)
-    synapses_I.append(syn_I)
-
-print(f"DEBUG: Sample Synapse Params:")
-print(f" Synapse E[0]: tau1={synapses_E[0].tau1}, tau2={synapses_E[0].tau2}, e={synapses_E[0].e}")
-print(f" Synapse I[0]: tau1={synapses_I[0].tau1}, tau2={synapses_I[0].tau2}, e={synapses_I[0].e}")
-print(f" Synapse E[99]: tau1={synapses_E[99].tau1}, tau2={synapses_E[99].tau2}, e={synapses_E[99].e}")
-print(f" Synapse I[99]: tau1={synapses_I[99].tau1}, tau2={synapses_I[99].tau2}, e={synapses_I[99].e}")
-
-#~~~IMPLEMENTING NETWORK CONNECTIVITY~~~#
-netcons = [] #will store all connection objects
-spike_threshold = -20 #Threshold to count as a spike in mV (voltage)
-
-for i, pre_cell_soma in enumerate(cells):
-    is_presyn_E =  (i < num_E) #determines if presynaptic is excitatory or inhibitory
-    for j, post_cell_soma in enumerate(cells):
-        if i == j:
-            continue #Prevents neuron from connecting to itself
-        if random.random() < connection_probability:
-            #Decide if inhib/excitatory and strength/weight to use
-            if is_presyn_E: 
-                target_syn = synapses_E[j] #Activate E_synapse on reciever (j)
-                #check if reciever j is E or I to pick right weight
-                weight = weight_EE if (j < num_E) else weight_EI
-            else: #if sendor inhibitory
-                target_syn = synapses_I[j] #Active I_synapse on reciever (j)
-                weight = weight_IE if (j < num_I) else weight_II
-            #what voltage to watch on sender
-            source_v = pre_cell_soma(0.5)._ref_v #Monitor voltage in the middle of sender soma 
-            #create connection object, source_v & target_syn linked, sec tells NetCon which specific cell part to watch for threshold
-            nc = h.NetCon(source_v, target_syn, sec = pre_cell_soma)
-            #~~~ SET CONNECTION PROPERTIES ~~~#
-            nc.threshold = spike_threshold #Voltage needed for sender to trigger netcon
-            nc.delay = netcon_delay #time for signal to travel (ms)
-            nc.weight[0] = weight #how strong connection is
-
-            netcons.append(nc) # Keep track of connection
-print(f"Created {len(netcons)} random connections")
-
-print(f"DEBUG: Checking first 15 NetCon weights:")
-for k, nc in enumerate(netcons):
-    if k >= 15: break # Only print the first few
-    # We need to figure out source/target types to know expected weight
-    # This is tricky without storing more info, but let's just print the weight
-    print(f"  NetCon {k}: weight[0] = {nc.weight[0]:.4f}")
-
-#~~~SIMULATE BACKGROUND NOISE~~~#
-#give each neuron some random excitatory inputs
-
-netstims = [] #hold spike generator objects
-drive_netcons = [] #hold connections from generators to neurons
-
-drive_interval = 1000.0 / drive_rate #avg. time between drive spikes from rate
-
-for j, target_syn in enumerate(synapses_E):
-    stim = h.NetStim() #neurons spike generator
-    #configure generator
-    stim.interval = drive_interval #avg. time between spikes (control rate)
-    stim.number = 1e9 #generates spikes for whole sim
-    stim.noise = 1.0 #make timing somewhat random
-    stim.start = 50 #start generating spikes after 50ms
-    netstims.append(stim) # explicitly store the NetStim object
-
-    #~~~CONNECT THE GENERATOR TO THE CELL'S E SYNAPSE~~~#
-    nc_drive = h.NetCon(stim, target_syn)
-    nc_drive.delay = 0.1 #ms (short delay)
-    nc_drive.weight[0] = drive_weight #strength of each drive spike (TO BE ADJUSTED)
-
-    drive_netcons.append(nc_drive) #stores connections
-
-print(f"Added background noise to {len(drive_netcons)} cells.")
-
-print(f"DEBUG: Checking first 5 Drive NetCon weights:")
-for k, nc_drive in enumerate(drive_netcons):
-    if k >= 5: break
-    print(f"Drive NetCon {k}: weight[0] = {nc_drive.weight[0]:.4f}")
-
-#~~~SPIKE RECORDING SETUPS~~~#
-spike_times_vec = h.Vector() #for spike times
-spike_ids_vec = h.Vector() #ID of neuron that spiked
-
-spike_recorders = [] #maybe to be used to track netcons
-
-for i, cell_soma in enumerate(cells):
-    #create netcon to record cells spikes
-    nc_record = h.NetCon(cell_soma(0.5)._ref_v, None, sec = cell_soma)
-    nc_record.threshold = spike_threshold #same threshold as before
-    #when spike detected past threshold, add time to spike_times_vec
-    nc_record.record(spike_times_vec, spike_ids_vec, i)
-    spike_recorders.append(nc_record)
-
-
-record_voltage_indicies = [0, 40, 80, 99]
-v_recorders = {} #dictionary to store voltage vecs
-t_vec = h.Vector().record(h._ref_t)
-
-for i in record_voltage_indicies:
-    cell_soma = cells[i]
-    v_vec = h.Vector().record(cell_soma(0.5)._ref_v) #rec V
-    v_recorders[i] = v_vec
-
-#~~~RUN SIMULATION~~~#
-h.tstop = sim_duration #set simulation time
-h.v_init = v_init_global #set starting voltage for all neruons
-print(f"Setting starting voltage at {h.v_init} mV")
-
-h.stdinit() #initialise all states
-
-print(f"Running simulation for {sim_duration} ms")
-t_start = time.time() #record real world time finishing
-h.run() 
-t_end = time.time() #record real world time ending
-print(f"Simulation finished in {t_end - t_start:.2f} seconds")
-
-#~~~VISUALISE & SAVE RESULTS~~~#
-plt.figure(figsize=(12, 7)) #creates figure window for plot
-spike_times = np.array(spike_times_vec)
-py_spike_ids = [float(id_val) for id_val in spike_ids_vec]
-spike_ids = np.array(py_spike_ids)
-
-###debug length check
-print(f"DEBUG: Length of spike_times_vec (Hoc): {int(spike_times_vec.size())}")
-print(f"DEBUG: Length of spike_ids_vec (Hoc):   {int(spike_ids_vec.size())}")
-print(f"DEBUG: Length of spike_times (NumPy): {len(spike_times)}")
-print(f"DEBUG: Length of spike_ids (NumPy):   {len(spike_ids)}")
-if spike_ids.size > 0:
-    print(f"DEBUG: Unique Neuron IDs that spiked: {np.unique(spike_ids)}")
-###
-plt.scatter(spike_times, spike_ids, marker='.', s=5, c='black') #creates scatter plot
-#labels
-plt.xlabel("Time (ms)")
-plt.ylabel("Neuron ID")
-plt.title(f"Network activity (simple HH, N={total_cells})")
-#set limits of axes to match sim
-plt.xlim(0, sim_duration)
-plt.ylim(-1, total_cells)
-
-#save plot to PNG with unique timestamp as name
-timestamp = time.strftime("%Y%m%d-%H%M%S")
-output_filename = f"network_raster_simple_{timestamp}.png"
-plt.savefig(output_filename)
-print(f"RASTER PLOT SAVED TO: {output_filename}")
-
-#membrane potential plot testing
-print("Plotting voltage traces...")
-plt.figure(figsize=(12, 5))
-for i, v_vec in v_recorders.items():
-    cell_type = "E" if i < num_E else "I"
-    plt.plot(t_vec, v_vec, label=f'Cell {i} ({cell_type})')
-
-plt.xlabel("Time (ms)")
-plt.ylabel("Membrane Potential (mV)")
-plt.title("Sample Neuron Voltage Traces")
-plt.legend()
-plt.grid(True)
-
-# Save voltage plot
-timestamp = time.strftime("%Y%m%d-%H%M%S")
-voltage_filename = f'network_voltages_{timestamp}.png'
-plt.savefig(voltage_filename)
-print(f"--- VOLTAGE PLOT SAVED TO: {voltage_filename} ---")
\ No newline at end of file
+DEFAULT_PARAMS = {
+    #~~~ NETWORK PARAMS ~~~#
+    "num_E": 80, #no. of excitatory
+    "num_I": 20, #no. of inhibitory
+
+    #~~~ SIMULTATION PARAMS ~~~#
+    "sim_duration": 500, #ms
+    "dt": 0.025, #time step integration
+    "run_mode": "fixed", #"fixed", "cvode" or "local_dt" (see benchmarks/integrators.py)
+    "atol": 1e-3, #absolute tolerance of the variable-step modes
+    "v_init": -65, #mV (initial voltage)
+    "record_chunk_duration": 100, #ms, recordings are flushed to disk after each chunk
+    "record_voltage_ids": [0, 40, 80, 99],
+    "results_path": None, #None: network_results_<timestamp>; .h5 for HDF5, else a dir of .npz chunks
+    "profile": True, #phase timings, memory and object counts to <results_path>_profile.json/.csv
+    "checkpoint_dir": None, #e.g. ".checkpoints": restore the rest state at drive_start instead of integrating to it
+
+    #~~~ CONNECTIVITY PARAMS ~~~#
+    "connection_probability": 0.1, #chance of connection between 2 cells
+    "netcon_delay": 1.5, #synaptic delay
+    "spike_threshold": -20, #Threshold to count as a spike in mV (voltage)
+    "connectivity_seed": None, #int for a reproducible network
+    "connectivity_file": None, #e.g. "connectivity_N100.npz" to save/reuse the adjacency (and positions)
+
+    #~~~ SPATIAL PARAMS ~~~# (placement None keeps the flat connection_probability and netcon_delay)
+    "placement": None, #"column" or "layers": cells in 3D, connection_probability becomes p at distance 0
+    "cell_density": 1e5, #cells/mm^3; the column grows with N so the neighbours within cutoff stay constant
+    "column_radius": None, #um, None: derived from num_E + num_I and cell_density
+    "column_depth": None, #um, y runs from 0 down to -column_depth; None: derived (2.5 x radius if both are None)
+    "layers": None, #[(y_top, y_bottom, fraction of cells), ...] for placement "layers"; fixes the depth
+    "connection_cutoff": 300, #um, only cells closer than this are considered
+    "connection_length_constant": 150, #um, p(d) = connection_probability * exp(-d^2 / 2 lambda^2)
+    "axon_velocity": 0.5, #m/s, delay = netcon_delay + d / axon_velocity
+
+    #~~~ WEIGHT PARAMS ~~~# TO BE ADJUSTED!
+    "weight_EE": 0.003,
+    "weight_EI": 0.001,
+    "weight_IE": 0.01,
+    "weight_II": 0.01,
+
+    #~~~ DRIVE PARAMS ~~~# TO BE ADJUSTED!
+    "drive_rate": 15, #Hz, approx firing rate of background input p/cell
+    "drive_weight": 0.01, #uS (strength of background input)
+    "drive_start": 50, #ms, drive spikes start after this
+    "drive_seed": None, #int for reproducible drive trains
+    "drive_shared_fibers": 0, #>0: that many shared input fibers instead of one private train per cell
+    "drive_fibers_per_cell": 10, #fibers each cell samples when drive_shared_fibers > 0
+}
+
+
+class CellNetwork:
+    """Everything build_network() creates; the NEURON objects live as long as this object."""
+    def __init__(self, params):
+        self.params = params
+        self.num_E = params["num_E"]
+        self.num_I = params["num_I"]
+        self.total_cells = self.num_E + self.num_I
+        self.results_path = params["results_path"] or f"network_results_{time.strftime('%Y%m%d-%H%M%S')}"
+        self.cells = []
+        self.synapses_E = []
+        self.synapses_I = []
+        self.connectivity = None
+        self.positions = None #n_cells x 3 (um) when the cells are placed
+        self.netcons = []
+        self.drive = None
+        self.recorder = None
+
+
+def _size_column(p, n_cells):
+    """Fill in column_radius/column_depth left as None so the column holds n_cells at cell_density.
+
+    With the density fixed a cell has about the same number of candidates
+    within connection_cutoff at any N, so the spatial build stays O(N).
+    Explicit layers fix the depth; a given radius or depth fixes that one.
+    """
+    volume = n_cells / p["cell_density"] * 1e9 #um^3
+    radius, depth = p["column_radius"], p["column_depth"]
+    if p["layers"]:
+        depth = max(top for top, _, _ in p["layers"]) - min(bottom for _, bottom, _ in p["layers"])
+    if radius is None and depth is None:
+        radius, depth = column_size(n_cells, p["cell_density"])
+    elif radius is None:
+        radius = np.sqrt(volume / (np.pi * depth))
+    elif depth is None:
+        depth = volume / (np.pi * radius ** 2)
+    p["column_radius"], p["column_depth"] = float(radius), float(depth)
+
+
+def build_network(params=None, prof=None):
+    """Create cells, synapses, connections, drive and recorders. Nothing is simulated."""
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    prof = prof or Profiler(enabled=False)
+    net = CellNetwork(params)
+    p = params
+
+    with prof.phase("build"):
+        #~~~ CREATE CELL POP ~~~#
+        with prof.phase("cells"):
+            for i in range(net.total_cells):
+                net.cells.append(create_simple_hh_cell(i))
+            print(f"Created {net.num_E} E cells and {net.num_I} I cells")
+
+        #~~~ Adding synapse objects to cells ~~~#
+        with prof.phase("synapses"):
+            #Iterate through every soma and attach 2 objects at midpoint
+            for cell_soma in net.cells:
+                #EXCITATORY SYNAPSE (AMPA model)
+                syn_E = h.Exp2Syn(cell_soma(0.5))
+                syn_E.tau1 = 0.2 #rise time
+                syn_E.tau2 = 2.0 #decay time
+                syn_E.e = 0 #reversal potential (excitatory)
+                net.synapses_E.append(syn_E)
+
+                #INHIBITORY SYNAPSE (GABAa model)
+                syn_I = h.Exp2Syn(cell_soma(0.5))
+                syn_I.tau1 = 0.5
+                syn_I.tau2 = 5.0
+                syn_I.e = -75 #reversal potential (inhibitory)
+                net.synapses_I.append(syn_I)
+
+        #~~~IMPLEMENTING NETWORK CONNECTIVITY~~~#
+        with prof.phase("connectivity"):
+            #draw the whole adjacency in bulk (CSR), or reuse a saved one
+            connectivity_file = p["connectivity_file"]
+            if connectivity_file and os.path.exists(connectivity_file):
+                net.connectivity = Connectivity.load(connectivity_file)
+                print(f"Loaded connectivity from {connectivity_file}")
+            else:
+                weights = {"EE": p["weight_EE"], "EI": p["weight_EI"], "IE": p["weight_IE"], "II": p["weight_II"]}
+                if p["placement"] is None:
+                    net.connectivity = build_connectivity(
+                        net.num_E, net.num_I, p["connection_probability"], weights=weights,
+                        delay=p["netcon_delay"], seed=p["connectivity_seed"])
+                else:
+                    #positions and connections come from the same seed's streams, so one seed reproduces both
+                    streams = RandomStreams(p["connectivity_seed"])
+                    rng = streams.generator(0, "placement")
+                    _size_column(p, net.total_cells)
+                    if p["placement"] == "layers":
+                        layers = p["layers"] or [(0.0, -p["column_depth"], 1.0)]
+                        positions = place_layers(net.total_cells, layers, p["column_radius"], rng)
+                    else:
+                        positions = place_column(net.total_cells, p["column_radius"], p["column_depth"], rng)
+                    net.connectivity = build_spatial_connectivity(
+                        positions, net.num_E, net.num_I, p["connection_probability"],
+                        p["connection_length_constant"], p["connection_cutoff"], weights,
+                        min_delay=p["netcon_delay"], velocity=p["axon_velocity"], seed=streams)
+                if connectivity_file:
+                    net.connectivity.save(connectivity_file)
+                    print(f"Saved connectivity to {connectivity_file}")
+
+            #E senders drive the reciever's E synapse, I senders its I synapse
+            net.netcons = instantiate_netcons(net.connectivity, net.cells, net.synapses_E, net.synapses_I,
+                                              threshold=p["spike_threshold"])
+            print(f"Created {len(net.netcons)} random connections")
+            net.positions = net.connectivity.positions
+
+        #~~~SIMULATE BACKGROUND NOISE~~~#
+        #give each neuron some random excitatory inputs
+        #all Poisson trains for the run are drawn at once and played by VecStims
+        with prof.phase("drive"):
+            drive_rng = RandomStreams(p["drive_seed"]) #one stream per fiber and per cell's fiber choice
+            if p["drive_shared_fibers"]:
+                fiber_targets = shared_fibers(p["drive_shared_fibers"], net.total_cells,
+                                              p["drive_fibers_per_cell"], drive_rng)
+            else:
+                fiber_targets = private_fibers(net.total_cells) #one fiber per cell, like one NetStim per cell
+            drive_trains = generate_poisson_trains(len(fiber_targets), p["drive_rate"], p["drive_start"],
+                                                   p["sim_duration"], drive_rng)
+            net.drive = VecStimDrive(drive_trains, fiber_targets, net.synapses_E, weight=p["drive_weight"], delay=0.1)
+            print(f"Drive: {drive_trains.n_spikes} pre-generated spikes on {len(net.drive.vecstims)} fibers, "
+                  f"{len(net.drive.netcons)} connections")
+
+        #~~~SPIKE RECORDING SETUPS~~~#
+        #spikes and voltages are flushed to results_path every chunk, not kept in h.Vectors
+        #variable-step modes sample voltages every dt instead of at every (irregular) step
+        with prof.phase("recording"):
+            net.recorder = StreamingRecorder(net.results_path, chunk_duration=p["record_chunk_duration"],
+                                             voltage_dt=None if p["run_mode"] == "fixed" else p["dt"])
+            net.recorder.record_spikes(net.cells, p["spike_threshold"])
+            for i in p["record_voltage_ids"]:
+                if i < net.total_cells:
+                    net.recorder.record_voltage(i, net.cells[i](0.5)) #rec V
+    return net
+
+
+def run_network(net, prof=None):
+    """Simulate for sim_duration, streaming results to net.results_path. Returns the wall time."""
+    p = net.params
+    prof = prof or Profiler(enabled=False)
+    h.dt = p["dt"]
+    h.v_init = p["v_init"] #set starting voltage for all neruons
+    configure_run_mode(p["run_mode"], atol=p["atol"])
+    print(f"Running simulation for {p['sim_duration']} ms ({p['run_mode']})")
+
+    t_start = time.time() #record real world time finishing
+    with prof.phase("run"):
+        if p["checkpoint_dir"] is not None:
+            #nothing is delivered before the drive starts, so the fresh event queue is kept and
+            #the checkpoint only depends on the cells
+            with prof.phase("warm_start"):
+                checkpoint_key = model_hash({"num_E": net.num_E, "num_I": net.num_I, "dt": h.dt, "v_init": h.v_init,
+                                             "run_mode": p["run_mode"], "atol": p["atol"]},
+                                            sources=(create_simple_hh_cell,))
+                warm_start(checkpoint_key, p["drive_start"], p["checkpoint_dir"], keep_queue=True,
+                           reset_vectors=(net.recorder.spike_times_vec, net.recorder.spike_ids_vec))
+        t_solve_start = h.t if p["checkpoint_dir"] is not None else 0.0
+        t_solve_wall = time.time()
+        with prof.phase("solve"):
+            net.recorder.run(p["sim_duration"], initialize=p["checkpoint_dir"] is None) #(stdinit,) then continuerun in chunks
+        t_solve_wall = time.time() - t_solve_wall
+    wall = time.time() - t_start #record real world time ending
+    print(f"Simulation finished in {wall:.2f} seconds")
+    prof.record_solver(n_steps=(p["sim_duration"] - t_solve_start) / h.dt if p["run_mode"] == "fixed" else None,
+                       wall_s=t_solve_wall)
+    return wall
+
+
+def save_run_info(net, wall_time):
+    """<results_path>_run.json: params and timing, read by plot_results.py (+ _positions.npy if placed)."""
+    path = f"{net.results_path}_run.json"
+    if net.positions is not None:
+        np.save(f"{net.results_path}_positions.npy", net.positions)
+    with open(path, "w") as f:
+        json.dump({"results_path": net.results_path, "params": net.params, "wall_time_s": wall_time,
+                   "title": f"simple HH, N={net.total_cells}"}, f, indent=1)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate the E/I network of simple HH cells.")
+    parser.add_argument("--headless", action="store_true", help="never import the NEURON gui or matplotlib")
+    parser.add_argument("--num-E", type=int)
+    parser.add_argument("--num-I", type=int)
+    parser.add_argument("--sim-duration", type=float)
+    parser.add_argument("--run-mode", choices=("fixed", "cvode", "local_dt"))
+    parser.add_argument("--results-path")
+    parser.add_argument("--connectivity-file")
+    parser.add_argument("--connectivity-seed", type=int)
+    parser.add_argument("--placement", choices=("column", "layers"))
+    parser.add_argument("--cell-density", type=float, help="cells/mm^3 of the placed column")
+    parser.add_argument("--drive-seed", type=int)
+    parser.add_argument("--checkpoint-dir")
+    parser.add_argument("--no-profile", action="store_true")
+    args = parser.parse_args(argv)
+
+    params = {name: value for name, value in vars(args).items()
+              if name in DEFAULT_PARAMS and value is not None}
+    if args.no_profile:
+        params["profile"] = False
+    if not args.headless:
+        from neuron import gui #interactive startup, as the script always had
+
+    prof = Profiler(enabled=dict(DEFAULT_PARAMS, **params)["profile"])
+    net = build_network(params, prof)
+    prof.meta.update(script="cell_network", num_E=net.num_E, num_I=net.num_I,
+                     sim_duration=net.params["sim_duration"], run_mode=net.params["run_mode"])
+    wall = run_network(net, prof)
+    print(f"Run info saved to {save_run_info(net, wall)}")
+
+    spike_times, spike_ids = load_spikes(net.results_path)
+    print(f"Recorded {spike_times.size} spikes from {np.unique(spike_ids).size} cells")
+
+    #~~~PROFILE~~~#
+    if prof.enabled:
+        prof.write(f"{net.results_path}_profile")
+        print(prof.summary())
+        print(f"Profile saved to {net.results_path}_profile.json/.csv")
+
+    #~~~VISUALISE RESULTS~~~#
+    if not args.headless:
+        import plot_results
+        plot_results.plot_network(net.results_path)
+    else:
+        print(f"Headless run; plot later with: python plot_results.py {net.results_path}")
+    return net
+
+
+if __name__ == "__main__":
+    main()
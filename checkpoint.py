@@ -0,0 +1,168 @@
+###                ###
+###~~~CHECKPOINT~~~###
+###                ###
+"""Save the simulation state after equilibration and restore it for warm starts.
+
+A checkpoint is the full NEURON state at time t (all STATEs, NetCon weights and
+the pending event queue), written with h.SaveState, or with h.BBSaveState when
+the model is spread over several ranks. Files are keyed by a model hash plus t,
+so any change to the model, its parameters or the .mod sources misses the
+cache instead of restoring a stale state. warm_start() either restores a
+checkpoint or runs the transient once and saves it, and prints the restore time
+against the wall time the transient took.
+
+The model still has to be built and initialised as usual; only the
+integration up to t is skipped. Both paths of warm_start() leave the same
+recordings: Vector.record restarts at t, and spike vectors passed as
+reset_vectors are emptied, so nothing from before t is kept in either case.
+"""
+import hashlib
+import inspect
+import json
+import os
+import time
+
+from neuron import h
+
+from mechanisms import mod_digest, mod_files
+from morphology_cache import file_hash
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".checkpoints")
+
+
+def _code_description(code):
+    """Bytecode, constants and names of a code object; nested code (inner lambdas/defs) is
+    described the same way, as its repr holds a memory address that changes every process."""
+    consts = [_code_description(const) if inspect.iscode(const) else repr(const) for const in code.co_consts]
+    return f"{code.co_code.hex()}:[{','.join(consts)}]:{code.co_names!r}"
+
+
+def _stable(obj):
+    """json default for specs holding distance functions: describe the bytecode, not the address."""
+    code = getattr(obj, "__code__", None)
+    if code is not None:
+        defaults = [_stable(value) for value in obj.__defaults__ or ()]
+        return f"{_code_description(code)}:{defaults!r}"
+    return repr(obj)
+
+
+def model_hash(*parts, sources=()):
+    """Key of a model: JSON-able descriptions (params, specs, ...), the .mod sources and
+    the source files of the given functions/classes (e.g. the cell class)."""
+    digest = hashlib.sha256()
+    digest.update(mod_digest(mod_files()).encode())
+    for obj in sources:
+        digest.update(file_hash(inspect.getsourcefile(obj)).encode())
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=_stable).encode())
+    return digest.hexdigest()[:20]
+
+
+def checkpoint_path(key, t, checkpoint_dir=None):
+    return os.path.join(checkpoint_dir or DEFAULT_CHECKPOINT_DIR, f"{key}_t{t:g}.state")
+
+
+def _distributed(pc):
+    return pc is not None and int(pc.nhost()) > 1
+
+
+def _is_root(pc):
+    return pc is None or int(pc.id()) == 0
+
+
+def save_checkpoint(key, checkpoint_dir=None, pc=None, transient_wall_time=None, t=None):
+    """Write the current state under (key, t); t defaults to h.t. Returns the file path."""
+    path = checkpoint_path(key, h.t if t is None else t, checkpoint_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp" #sweep workers may save the same key at once
+    if _distributed(pc):
+        h.BBSaveState().save(tmp_path) #every rank contributes its gids, rank 0 writes
+        pc.barrier()
+    else:
+        state = h.SaveState()
+        state.save()
+        f = h.File()
+        f.wopen(tmp_path)
+        state.fwrite(f, 1)
+        f.close()
+    if _is_root(pc):
+        with open(path + ".json", "w") as f:
+            json.dump({"key": key, "t": h.t, "transient_wall_time": transient_wall_time,
+                       "created": time.strftime("%Y-%m-%d %H:%M:%S")}, f)
+        os.replace(tmp_path, path)
+    if pc is not None:
+        pc.barrier()
+    return path
+
+
+def restore_checkpoint(key, t, checkpoint_dir=None, pc=None, keep_queue=False):
+    """Restore the state saved under (key, t) into the built and initialised model.
+
+    keep_queue: keep the event queue set up by finitialize instead of the saved
+    one. Valid when nothing has been delivered before t (e.g. t <= drive start),
+    and lets runs that differ only in their drive trains or weights share one
+    checkpoint. Returns the checkpoint metadata with 'restore_time', or None.
+    """
+    path = checkpoint_path(key, t, checkpoint_dir)
+    if not os.path.exists(path):
+        return None
+    t0 = time.perf_counter()
+    if _distributed(pc):
+        h.BBSaveState().restore(path)
+    else:
+        state = h.SaveState()
+        f = h.File()
+        f.ropen(path)
+        state.fread(f, 1)
+        f.close()
+        state.restore(1 if keep_queue else 0)
+    if h.cvode.active():
+        h.cvode.re_init()
+    h.frecord_init() #Vector.record continues from the restored t
+    restore_time = time.perf_counter() - t0
+
+    with open(path + ".json") as f:
+        meta = json.load(f)
+    meta["restore_time"] = restore_time
+    return meta
+
+
+def warm_start(key, t, checkpoint_dir=None, pc=None, v_init=None, keep_queue=False, reset_vectors=()):
+    """Initialise, then restore the state at t or integrate to t once and save it.
+
+    v_init: finitialize(v_init) instead of h.stdinit(). With pc the transient is
+    run with pc.psolve. Returns the checkpoint metadata; 'restored' tells which
+    path was taken. Either way recording starts at t: Vector.record restarts
+    there and reset_vectors (e.g. NetCon.record / pc.spike_record vectors,
+    which frecord_init does not touch) are emptied.
+    """
+    if v_init is None:
+        h.stdinit()
+    else:
+        h.finitialize(v_init)
+
+    meta = restore_checkpoint(key, t, checkpoint_dir, pc, keep_queue)
+    if meta is not None:
+        meta["restored"] = True
+        for vec in reset_vectors:
+            vec.resize(0)
+        if _is_root(pc):
+            transient = meta["transient_wall_time"] or 0.0
+            print(f"Restored checkpoint {key} at t = {h.t:g} ms in {meta['restore_time']:.3f} s "
+                  f"(transient took {transient:.2f} s, saves {transient - meta['restore_time']:.2f} s per run)")
+        return meta
+
+    t0 = time.perf_counter()
+    if pc is not None:
+        pc.psolve(t)
+    else:
+        h.continuerun(t)
+    transient_wall_time = time.perf_counter() - t0
+    save_checkpoint(key, checkpoint_dir, pc, transient_wall_time, t) #h.t may be off by rounding
+    h.frecord_init() #drop the transient from Vector.record, as on the restore path
+    for vec in reset_vectors:
+        vec.resize(0)
+    if _is_root(pc):
+        print(f"Saved checkpoint {key} at t = {h.t:g} ms ({transient_wall_time:.2f} s of transient)")
+    return {"key": key, "t": h.t, "transient_wall_time": transient_wall_time,
+            "restore_time": 0.0, "restored": False}
@@ -0,0 +1,175 @@
+###                      ###
+###~~~NET CONNECTIVITY~~~###
+###                      ###
+"""Sparse E/I connectivity drawn with NumPy and stored CSR-style.
+
+Cells are indexed 0..N-1 with the excitatory population first (0..num_E-1)
+and the inhibitory population after it, the same layout cell_network.py uses.
+Row i of the CSR structure holds the targets of presynaptic cell i.
+Connections are drawn per reciever from counter-based streams
+(random_streams.py), so any subset of cells can be built on its own.
+Spatially embedded networks (spatial_network.py) also carry the cell
+positions, which are saved and loaded with the adjacency.
+"""
+import hashlib
+
+import numpy as np
+
+from random_streams import as_streams
+
+BLOCKS = ("EE", "EI", "IE", "II") #pre->post, e.g. "EI" = E sender, I reciever
+
+
+class Connectivity:
+    """CSR adjacency with per-connection weights and delays (and cell positions in um, if placed)."""
+    def __init__(self, indptr, indices, weights, delays, num_E, num_I, positions=None):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.delays = np.asarray(delays, dtype=np.float64)
+        self.num_E = int(num_E)
+        self.num_I = int(num_I)
+        self.positions = None if positions is None else np.asarray(positions, dtype=np.float64) #n_cells x 3
+
+    @property
+    def n_cells(self):
+        return self.num_E + self.num_I
+
+    @property
+    def n_connections(self):
+        return int(self.indices.size)
+
+    def sources(self):
+        """Presynaptic index of every connection (expanded from indptr)."""
+        return np.repeat(np.arange(self.n_cells, dtype=np.int32), np.diff(self.indptr))
+
+    def targets(self, i):
+        """Postsynaptic indices of presynaptic cell i."""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def block_counts(self):
+        """Number of connections in each of the EE/EI/IE/II blocks."""
+        pre_E = self.sources() < self.num_E
+        post_E = self.indices < self.num_E
+        return {
+            "EE": int(np.count_nonzero(pre_E & post_E)),
+            "EI": int(np.count_nonzero(pre_E & ~post_E)),
+            "IE": int(np.count_nonzero(~pre_E & post_E)),
+            "II": int(np.count_nonzero(~pre_E & ~post_E)),
+        }
+
+    def with_block_weights(self, weights):
+        """Copy sharing the same adjacency, with every connection reweighted by its block."""
+        edge_weights = _block_edge_weights(self.sources(), self.indices, self.num_E, weights)
+        return Connectivity(self.indptr, self.indices, edge_weights, self.delays, self.num_E, self.num_I,
+                            self.positions)
+
+    def digest(self):
+        """sha256 of the adjacency and delays (weights excluded, they are usually swept)."""
+        digest = hashlib.sha256()
+        for arr in (self.indptr, self.indices, self.delays, np.array([self.num_E, self.num_I])):
+            digest.update(np.ascontiguousarray(arr).tobytes())
+        return digest.hexdigest()
+
+    def save(self, path):
+        """Write the adjacency to a compressed .npz file."""
+        extra = {} if self.positions is None else {"positions": self.positions}
+        np.savez_compressed(path, indptr=self.indptr, indices=self.indices,
+                            weights=self.weights, delays=self.delays,
+                            num_E=self.num_E, num_I=self.num_I, **extra)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["indptr"], data["indices"], data["weights"], data["delays"],
+                       int(data["num_E"]), int(data["num_I"]),
+                       data["positions"] if "positions" in data.files else None)
+
+
+def _block_edge_weights(src, tgt, num_E, weights):
+    """Per-connection weight looked up from the EE/EI/IE/II block of each (src, tgt)."""
+    #row = sender is I, col = reciever is I
+    block_weights = np.array([[weights["EE"], weights["EI"]],
+                              [weights["IE"], weights["II"]]], dtype=np.float64)
+    return block_weights[(src >= num_E).astype(np.intp), (tgt >= num_E).astype(np.intp)]
+
+
+def _draw_inputs(gid, n_cells, connection_probability, rng):
+    """Presynaptic cells of one reciever: Bernoulli(p) for each of the other N-1 cells."""
+    if connection_probability > 0.25:
+        pre = np.flatnonzero(rng.random(n_cells - 1) < connection_probability)
+    else:
+        #Binomial(N-1, p) in-degree and a uniform sample without replacement: same distribution, O(k)
+        pre = rng.choice(n_cells - 1, rng.binomial(n_cells - 1, connection_probability), replace=False)
+    return pre + (pre >= gid) #skip the reciever itself
+
+
+def build_connectivity(num_E, num_I, connection_probability, weights, delay, seed=None, gids=None):
+    """Draw a random E/I network with independent pair probability p.
+
+    weights: dict with keys "EE", "EI", "IE", "II" (pre->post), e.g.
+        {"EE": weight_EE, "EI": weight_EI, "IE": weight_IE, "II": weight_II}
+    delay: synaptic delay in ms applied to every connection.
+    seed: int, None or a RandomStreams. The inputs of every reciever come from
+    its own (seed, gid, "connectivity") stream, so gids=[...] draws only the
+    connections onto those cells, identical to the same rows of the full network.
+
+    Each reciever gets one Bernoulli(p) trial per sender, drawn as a
+    Binomial(N-1, p) in-degree plus a uniform sample, at O(N*k) cost.
+    """
+    n_cells = num_E + num_I
+    streams = as_streams(seed)
+    gids = range(n_cells) if gids is None else [int(gid) for gid in gids]
+
+    src_parts, tgt_parts = [], []
+    if n_cells >= 2 and connection_probability > 0:
+        for gid in gids:
+            pre = _draw_inputs(gid, n_cells, connection_probability, streams.generator(gid, "connectivity"))
+            src_parts.append(pre)
+            tgt_parts.append(np.full(pre.size, gid, dtype=np.int64))
+    src = np.concatenate(src_parts).astype(np.int64) if src_parts else np.empty(0, dtype=np.int64)
+    tgt = np.concatenate(tgt_parts) if tgt_parts else np.empty(0, dtype=np.int64)
+    return connectivity_from_edges(src, tgt, np.full(tgt.size, float(delay)), num_E, num_I, weights)
+
+
+def connectivity_from_edges(src, tgt, delays, num_E, num_I, weights, positions=None):
+    """Connectivity from unordered (src, tgt, delay) edge arrays, weighted by block."""
+    n_cells = num_E + num_I
+    #CSR order: sort by sender, then by reciever
+    order = np.lexsort((tgt, src))
+    src = src[order]
+    tgt = tgt[order]
+    indptr = np.zeros(n_cells + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_cells), out=indptr[1:])
+
+    edge_weights = _block_edge_weights(src, tgt, num_E, weights)
+    return Connectivity(indptr, tgt, edge_weights, np.asarray(delays)[order], num_E, num_I, positions)
+
+
+def instantiate_netcons(conn, cells, synapses_E, synapses_I, threshold):
+    """Create one h.NetCon per connection in a single pass over the CSR arrays.
+
+    cells are soma sections; E senders drive synapses_E[j] of the reciever,
+    I senders drive synapses_I[j].
+    """
+    from neuron import h
+
+    netcons = []
+    indptr = conn.indptr.tolist()
+    indices = conn.indices.tolist()
+    weights = conn.weights.tolist()
+    delays = conn.delays.tolist()
+    for i in range(conn.n_cells):
+        start, stop = indptr[i], indptr[i + 1]
+        if start == stop:
+            continue
+        pre_soma = cells[i]
+        source_v = pre_soma(0.5)._ref_v
+        target_syns = synapses_E if i < conn.num_E else synapses_I
+        for k in range(start, stop):
+            nc = h.NetCon(source_v, target_syns[indices[k]], sec=pre_soma)
+            nc.threshold = threshold
+            nc.delay = delays[k]
+            nc.weight[0] = weights[k]
+            netcons.append(nc)
+    return netcons
@@ -0,0 +1,130 @@
+###                        ###
+###~~~CORENEURON BACKEND~~~###
+###                        ###
+"""Run a built gid-based network in CoreNEURON on the CPU instead of the classic solver.
+
+The model is built in NEURON as usual (every cell registered with
+pc.set_gid2node/pc.cell, spikes recorded with pc.spike_record) and handed to
+CoreNEURON for pc.psolve. There are two ways to transfer it:
+
+    "memory"  the model is copied into CoreNEURON inside the process, and the
+              spikes come back into the pc.spike_record vectors
+    "file"    pc.nrncore_write() writes it to data_dir, pc.nrncore_run()
+              simulates from the files and the spikes are read back from
+              out.dat, e.g. to run the same data again without rebuilding
+
+In both modes the spikes end up in the spike_record vectors, so the usual
+gather gives the same (times, ids) arrays the raster code plots.
+CoreNEURON only has the fixed-step method, and the mechanisms have to be built
+with nrnivmodl -coreneuron, i.e. load_mechanisms(coreneuron=True) before any
+cell is created. Vector.record, NetCon.record and Python callbacks during the
+run are not carried over.
+
+    load_mechanisms(coreneuron=True)
+    ...build...
+    wall = psolve(pc, tstop, v_init, mode="memory")
+"""
+import os
+import shutil
+import time
+
+import numpy as np
+from neuron import h
+
+from run_modes import enable_fixed_step
+
+BACKENDS = ("neuron", "coreneuron")
+TRANSFER_MODES = ("memory", "file")
+DEFAULT_DATA_DIR = "coreneuron_data"
+
+
+def coreneuron_available():
+    """True if this NEURON has the coreneuron module (NEURON >= 8); a build without CoreNEURON fails at psolve."""
+    try:
+        from neuron import coreneuron #noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def check_backend(backend, run_mode="fixed", checkpoint_dir=None):
+    """Raise ValueError for settings the backend can not run."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "coreneuron":
+        if run_mode != "fixed":
+            raise ValueError(f"CoreNEURON only runs the fixed-step method, not {run_mode!r}")
+        if checkpoint_dir is not None:
+            raise ValueError("Checkpoints (SaveState) are not supported with the CoreNEURON backend")
+
+
+def _set_enabled(enabled, verbose=0):
+    from neuron import coreneuron
+    coreneuron.enable = enabled
+    coreneuron.gpu = False
+    coreneuron.file_mode = False #file transfer is driven explicitly below
+    coreneuron.verbose = verbose
+    return coreneuron
+
+
+def read_spikes(path):
+    """(times, gids) from a CoreNEURON out.dat (one "time gid" line per spike), sorted by (time, id)."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+    data = np.loadtxt(path, ndmin=2, comments=("#", "time"))
+    times, ids = data[:, 0], data[:, 1].astype(np.int64)
+    order = np.lexsort((ids, times))
+    return times[order], ids[order]
+
+
+def psolve(pc, tstop, v_init, mode="memory", data_dir=DEFAULT_DATA_DIR, spike_vecs=None, verbose=0):
+    """finitialize(v_init) and simulate to tstop in CoreNEURON. Returns the wall time of the transfer and solve.
+
+    spike_vecs: the (times, ids) h.Vectors given to pc.spike_record; needed in
+    file mode, where rank 0's vectors get all spikes from out.dat and the
+    other ranks' are emptied.
+    """
+    if mode not in TRANSFER_MODES:
+        raise ValueError(f"Unknown transfer mode {mode!r}, expected one of {TRANSFER_MODES}")
+    enable_fixed_step(cache_efficient=True) #CoreNEURON needs the cache-efficient layout
+    pc.set_maxstep(10)
+    h.finitialize(v_init)
+    rank = int(pc.id())
+
+    if mode == "memory":
+        _set_enabled(True, verbose=verbose)
+        try:
+            pc.barrier()
+            t_start = time.time()
+            pc.psolve(tstop)
+            pc.barrier()
+            wall = time.time() - t_start
+        finally:
+            _set_enabled(False)
+        return wall
+
+    if spike_vecs is None:
+        raise ValueError("File mode needs the spike_record vectors to return the spikes in")
+    out_dir = os.path.join(data_dir, "output")
+    if rank == 0:
+        shutil.rmtree(data_dir, ignore_errors=True)
+        os.makedirs(out_dir)
+    pc.barrier()
+    t_start = time.time()
+    pc.nrncore_write(data_dir)
+    pc.barrier()
+    args = f"-d {data_dir} -o {out_dir} -e {tstop:g} --dt {h.dt:g} --voltage {v_init:g}"
+    if int(pc.nhost()) > 1:
+        args += " --mpi"
+    pc.nrncore_run(args)
+    pc.barrier()
+    wall = time.time() - t_start
+
+    times_vec, ids_vec = spike_vecs
+    times_vec.resize(0)
+    ids_vec.resize(0)
+    if rank == 0:
+        times, ids = read_spikes(os.path.join(out_dir, "out.dat"))
+        times_vec.from_python(times)
+        ids_vec.from_python(ids.astype(np.float64))
+    return wall
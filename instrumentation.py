@@ -0,0 +1,159 @@
+###                     ###
+###~~~INSTRUMENTATION~~~###
+###                     ###
+"""Nested phase timers with memory and NEURON object counts, saved as a JSON/CSV profile.
+
+    prof = Profiler()
+    with prof.phase("build"):
+        with prof.phase("cells"):
+            ...
+    with prof.phase("run"):
+        ...
+        prof.record_solver(pc, n_steps=tstop / h.dt)
+    prof.write("network_profile")    # network_profile.json + network_profile.csv
+
+At the end of every phase the profiler records the wall time, the current and
+peak RSS, the memory NEURON has allocated (h.nrn_mallinfo) and the number of
+sections, segments, point processes and NetCons. A Profiler(enabled=False)
+hands back one shared no-op context manager and measures nothing.
+"""
+import csv
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+from neuron import h
+
+_NULL_PHASE = nullcontext()
+
+CSV_FIELDS = ("phase", "depth", "start_s", "wall_s", "rss_mb", "peak_rss_mb", "mallinfo_mb", "mallinfo_delta_mb",
+              "sections", "segments", "point_processes", "netcons")
+
+
+def rss_mb():
+    """Current resident set size in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Peak resident set size of the process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3 #bytes on macOS, kB on Linux
+
+
+def mallinfo_mb():
+    """Heap memory in use by NEURON (and everything else using malloc) in MB."""
+    return h.nrn_mallinfo(0) / 1e6
+
+
+def neuron_object_counts():
+    """Sections, segments, point processes (all types) and NetCons currently alive."""
+    sections = segments = 0
+    for sec in h.allsec():
+        sections += 1
+        segments += sec.nseg
+    point_processes = 0
+    mech_type = h.MechanismType(1) #1: point processes, including artificial cells
+    name = h.ref("")
+    for k in range(int(mech_type.count())):
+        mech_type.select(k)
+        mech_type.selected(name)
+        point_processes += int(h.List(name[0]).count())
+    return {"sections": sections, "segments": segments, "point_processes": point_processes,
+            "netcons": int(h.List("NetCon").count())}
+
+
+class Profiler:
+    """Records nested phases in start order; paths are "parent/child"."""
+    def __init__(self, enabled=True, count_objects=True):
+        self.enabled = enabled
+        self.count_objects = count_objects #walks every section at the end of each phase
+        self.records = []
+        self.solver = {}
+        self.meta = {}
+        self._stack = []
+        self._t0 = time.perf_counter()
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_PHASE
+        return self._phase(name)
+
+    @contextmanager
+    def _phase(self, name):
+        self._stack.append(name)
+        record = {"phase": "/".join(self._stack), "depth": len(self._stack) - 1}
+        self.records.append(record) #parents stay ahead of their children
+        mem_start = mallinfo_mb()
+        t_start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["start_s"] = t_start - self._t0
+            record["wall_s"] = time.perf_counter() - t_start
+            record["rss_mb"] = rss_mb()
+            record["peak_rss_mb"] = peak_rss_mb()
+            record["mallinfo_mb"] = mallinfo_mb()
+            record["mallinfo_delta_mb"] = record["mallinfo_mb"] - mem_start
+            if self.count_objects:
+                record.update(neuron_object_counts())
+            self._stack.pop()
+
+    def record_solver(self, pc=None, n_steps=None, wall_s=None):
+        """Solver timing after a run: ParallelContext step/wait/send time and the time per step.
+
+        step_time is only accumulated by pc.psolve; for h.run() pass the run's wall_s.
+        """
+        if not self.enabled:
+            return
+        if pc is not None:
+            self.solver.update(step_time_s=pc.step_time(), wait_time_s=pc.wait_time(), send_time_s=pc.send_time())
+        if wall_s is not None:
+            self.solver["wall_s"] = wall_s
+        if n_steps:
+            self.solver["n_steps"] = int(n_steps)
+            total = self.solver.get("step_time_s") or self.solver.get("wall_s")
+            if total:
+                self.solver["time_per_step_us"] = total / n_steps * 1e6
+
+    def phase_times(self):
+        """{phase path: wall time in s}."""
+        return {record["phase"]: record["wall_s"] for record in self.records if "wall_s" in record}
+
+    def to_dict(self):
+        return {"meta": self.meta, "phases": self.records, "solver": self.solver}
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    def write_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.records)
+
+    def write(self, stem):
+        """<stem>.json and <stem>.csv; nothing when disabled."""
+        if not self.enabled:
+            return
+        self.write_json(stem + ".json")
+        self.write_csv(stem + ".csv")
+
+    def summary(self):
+        """Indented phase tree with wall time and memory."""
+        lines = [f"{'phase':<32} {'wall (s)':>9} {'RSS (MB)':>9} {'peak (MB)':>10}"]
+        for record in self.records:
+            label = "  " * record["depth"] + record["phase"].rsplit("/", 1)[-1]
+            lines.append(f"{label:<32} {record.get('wall_s', 0.0):9.3f} {record.get('rss_mb', 0.0):9.1f} "
+                         f"{record.get('peak_rss_mb', 0.0):10.1f}")
+        if self.solver:
+            lines.append("solver: " + ", ".join(f"{k}={v:.4g}" for k, v in self.solver.items()))
+        return "\n".join(lines)
@@ -0,0 +1,293 @@
+###         ###
+###~~~LFP~~~###
+###         ###
+"""Extracellular potentials (LFP/EAP) on a multi-contact probe, streamed with the recorder.
+
+Every segment is a line source (Holt & Koch 1999) in an infinite homogeneous
+medium: the potential at a contact is transfer @ i_membrane_, where the
+transfer matrix (contacts x segments, mV/nA) only depends on the morphology,
+the cell's placement and the probe. It is computed once per (morphology,
+placement, probe) and cached as an .npy file; the segment geometry it is
+built from is shared by every cell with the same morphology.
+
+LFPRecorder gathers i_membrane_ of all segments of all cells into one buffer
+(samples x segments) and, after every recorder chunk, turns it into the
+contact potentials with a single matrix multiply, so segment currents are
+never stored beyond one chunk. Placements only enter the extracellular
+calculation; the NEURON sections themselves are not moved.
+"""
+import glob
+import hashlib
+import os
+import time
+
+import numpy as np
+from neuron import h
+
+from morphology_cache import MorphologyData, get_cached_morphology
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".lfp_cache")
+SIGMA = 0.3 #S/m, extracellular conductivity
+
+_geometry_cache = {} #geometry key -> (start, end, diam)
+
+
+class Probe:
+    """Point contacts (um) in a medium of conductivity sigma (S/m)."""
+    def __init__(self, contacts, sigma=SIGMA):
+        self.contacts = np.atleast_2d(np.asarray(contacts, dtype=np.float64))
+        self.sigma = float(sigma)
+
+    @property
+    def n_contacts(self):
+        return self.contacts.shape[0]
+
+    @property
+    def key(self):
+        digest = hashlib.sha256(self.contacts.tobytes())
+        digest.update(repr(self.sigma).encode())
+        return digest.hexdigest()[:20]
+
+
+def linear_probe(n_contacts=32, spacing=20.0, origin=(0.0, 0.0, 0.0), axis=1, sigma=SIGMA):
+    """n_contacts evenly spaced along one axis (default y, the apical axis of the bundled SWCs)."""
+    contacts = np.tile(np.asarray(origin, dtype=np.float64), (n_contacts, 1))
+    contacts[:, axis] += np.arange(n_contacts) * spacing
+    return Probe(contacts, sigma)
+
+
+def rotation_matrix(rotation):
+    """Rotate about x, then y, then z (radians), as LFPy's Cell.set_rotation does."""
+    rx, ry, rz = rotation
+    cx, sx, cy, sy, cz, sz = np.cos(rx), np.sin(rx), np.cos(ry), np.sin(ry), np.cos(rz), np.sin(rz)
+    Rx = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    Ry = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    Rz = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    return Rz @ Ry @ Rx
+
+
+def cell_morphology(cell):
+    """MorphologyData of a RealisticNeuronTemplate or ClonedCell, sections in all_sections order."""
+    factory = getattr(cell, "factory", None)
+    if factory is not None:
+        return factory.morphology
+    key = getattr(cell, "morphology_key", None)
+    morph = get_cached_morphology(key) if key is not None else None
+    if morph is None:
+        morph = MorphologyData.from_sections(cell.all_sections, cell.soma, cell.axon)
+    return morph
+
+
+def geometry_key(morph):
+    digest = hashlib.sha256()
+    for array in (morph.pt3d, morph.pt3d_ptr, morph.nseg):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:20]
+
+
+def segment_geometry(morph):
+    """(start, end, diam) of every segment in the morphology's own frame; start/end are n x 3 (um).
+
+    A segment is the straight line between the 3D positions of its two ends,
+    interpolated along the section's arc length like NEURON does.
+    """
+    key = geometry_key(morph)
+    if key in _geometry_cache:
+        return _geometry_cache[key]
+    starts, ends, diams = [], [], []
+    ptr = morph.pt3d_ptr
+    for k in range(morph.n_sections):
+        pts = morph.pt3d[ptr[k]:ptr[k + 1]]
+        edges = np.linspace(0.0, 1.0, int(morph.nseg[k]) + 1)
+        if len(pts) == 0:
+            #no 3D points: a zero-length source at the origin
+            xyz = np.zeros((edges.size, 3))
+            diam = np.ones(edges.size - 1)
+        else:
+            arc = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(pts[:, :3], axis=0), axis=1))))
+            frac = arc / arc[-1] if arc[-1] > 0 else np.zeros(len(pts))
+            xyz = np.column_stack([np.interp(edges, frac, pts[:, i]) for i in range(3)])
+            diam = np.interp((edges[:-1] + edges[1:]) / 2, frac, pts[:, 3])
+        starts.append(xyz[:-1])
+        ends.append(xyz[1:])
+        diams.append(diam)
+    geometry = (np.concatenate(starts), np.concatenate(ends), np.concatenate(diams))
+    _geometry_cache[key] = geometry
+    return geometry
+
+
+def line_source_transfer(start, end, diam, contacts, sigma=SIGMA):
+    """(contacts, segments) potential in mV per nA of membrane current, segments as line sources.
+
+    The perpendicular distance to a segment is limited to its radius, so
+    contacts inside a neurite stay finite.
+    """
+    axis = end - start
+    length = np.linalg.norm(axis, axis=1)
+    unit = axis / np.maximum(length, 1e-12)[:, None]
+    rel = contacts[:, None, :] - start[None, :, :]
+    along = np.einsum("csk,sk->cs", rel, unit) #position of the contact along the segment axis
+    rho = np.sqrt(np.maximum(np.einsum("csk,csk->cs", rel, rel) - along ** 2, 0.0))
+    rho = np.maximum(rho, np.maximum(diam / 2, 1e-6))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        line = (np.arcsinh((length - along) / rho) + np.arcsinh(along / rho)) / length
+    point = 1.0 / np.sqrt(along ** 2 + rho ** 2)
+    return np.where(length > 1e-9, line, point) / (4 * np.pi * sigma)
+
+
+def transfer_matrix(cell, probe, position=(0.0, 0.0, 0.0), rotation=(0.0, 0.0, 0.0), cache_dir=None):
+    """Transfer matrix of one placed cell, from the .npy cache if this placement was seen before."""
+    morph = cell_morphology(cell)
+    n_segments = sum(sec.nseg for sec in cell.all_sections)
+    if n_segments != morph.n_segments:
+        raise ValueError(f"Cell {cell.cell_id} has {n_segments} segments, its morphology {morph.n_segments}")
+    position = tuple(float(p) for p in position)
+    rotation = tuple(float(r) for r in rotation)
+    key = hashlib.sha256(repr((CACHE_VERSION, geometry_key(morph), position, rotation,
+                               probe.key)).encode()).hexdigest()[:32]
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    path = os.path.join(cache_dir, key + ".npy")
+    if os.path.exists(path):
+        return np.load(path)
+
+    start, end, diam = segment_geometry(morph)
+    R = rotation_matrix(rotation)
+    offset = np.asarray(position)
+    matrix = line_source_transfer(start @ R.T + offset, end @ R.T + offset, diam, probe.contacts, probe.sigma)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy" #per process: two workers may compute the same matrix
+    np.save(tmp_path, matrix)
+    os.replace(tmp_path, path) #atomic, so parallel workers never read half a file
+    return matrix
+
+
+class LFPRecorder:
+    """Contact potentials of all cells, computed chunk by chunk from i_membrane_.
+
+    placements: one (position, rotation) per cell, default all at the origin.
+    sample_dt: sampling interval (ms), default every time step. The current
+    buffer holds at most max_buffer_mb; it is also projected early when full.
+    With pc, every rank projects its own cells and rank 0 writes the sum.
+    """
+    def __init__(self, cells, probe, path, placements=None, sample_dt=None, cache_dir=None,
+                 max_buffer_mb=256, pc=None):
+        self.probe = probe
+        self.path = path
+        self.pc = pc
+        self.is_root = pc is None or int(pc.id()) == 0
+        self.sample_dt = h.dt if sample_dt is None else float(sample_dt)
+        placements = placements if placements is not None else [((0, 0, 0), (0, 0, 0))] * len(cells)
+
+        h.cvode.use_fast_imem(1) #i_membrane_ (nA) on every segment
+        matrices = [transfer_matrix(cell, probe, position, rotation, cache_dir)
+                    for cell, (position, rotation) in zip(cells, placements)]
+        #all cells side by side: one multiply projects the whole population
+        self.transfer = np.hstack(matrices) if matrices else np.zeros((probe.n_contacts, 0))
+        n_segments = self.transfer.shape[1]
+
+        self._ptrs = h.PtrVector(n_segments)
+        k = 0
+        for cell in cells:
+            for sec in cell.all_sections:
+                for seg in sec:
+                    self._ptrs.pset(k, seg._ref_i_membrane_)
+                    k += 1
+        self._gather_vec = h.Vector(n_segments)
+        self._gather_view = self._gather_vec.as_numpy()
+
+        self.max_block = max(1, int(max_buffer_mb * 1e6 // (8 * max(n_segments, 1))))
+        self._allocate(self.max_block)
+        self._n = 0
+        self._next_t = -np.inf
+        self.n_chunks = 0
+        self.project_time = 0.0 #wall time spent in flush(), s
+
+        if self.is_root:
+            os.makedirs(path, exist_ok=True)
+            for old in _lfp_chunks(path):
+                os.remove(old)
+        self._callback = self._sample
+        h.cvode.extra_scatter_gather(0, self._callback) #called after every time step
+
+    @property
+    def transfer_mb(self):
+        return self.transfer.nbytes / 1e6
+
+    @property
+    def buffer_mb(self):
+        return self._buffer.nbytes / 1e6
+
+    def _allocate(self, block):
+        if self.pc is not None:
+            block = int(self.pc.allreduce(block, 3)) #same block on every rank, so they flush together
+        self._buffer = np.empty((block, self.transfer.shape[1]))
+        self._t_buffer = np.empty(block)
+
+    def attach(self, recorder):
+        """Project and write after every StreamingRecorder chunk; the buffer shrinks to one chunk."""
+        chunk_samples = int(np.ceil(recorder.chunk_duration / self.sample_dt)) + 1
+        self.flush()
+        self._allocate(min(self.max_block, chunk_samples))
+        recorder.flush_hooks.append(self.flush)
+        return self
+
+    def detach(self):
+        """Stop sampling; whatever is still buffered is written first."""
+        self.flush()
+        h.cvode.extra_scatter_gather_remove(self._callback)
+
+    def _sample(self):
+        t = h.t
+        if t < self._next_t - self.sample_dt: #h.t went back: a new run started
+            self._next_t = t
+        if t < self._next_t:
+            return
+        self._next_t = t + self.sample_dt - 0.5 * h.dt
+        if self._n == self._t_buffer.size:
+            self.flush()
+        if self._buffer.shape[1]:
+            self._ptrs.gather(self._gather_vec)
+            self._buffer[self._n] = self._gather_view
+        self._t_buffer[self._n] = t
+        self._n += 1
+
+    def flush(self):
+        """Contacts x samples potentials of everything buffered (one matrix multiply), appended to path."""
+        n = self._n
+        if n == 0:
+            return
+        t0 = time.perf_counter()
+        lfp = self.transfer @ self._buffer[:n].T
+        if self.pc is not None and int(self.pc.nhost()) > 1:
+            vec = h.Vector(lfp.ravel())
+            self.pc.allreduce(vec, 1)
+            lfp = vec.as_numpy().reshape(lfp.shape)
+        if self.is_root:
+            np.savez(os.path.join(self.path, f"chunk_{self.n_chunks:05d}.npz"), t=self._t_buffer[:n],
+                     lfp=lfp, contacts=self.probe.contacts)
+        self.n_chunks += 1
+        self._n = 0
+        self.project_time += time.perf_counter() - t0
+
+
+def _lfp_chunks(path):
+    return sorted(glob.glob(os.path.join(path, "chunk_*.npz")))
+
+
+def iter_lfp_chunks(path):
+    """(t, lfp) blocks written by LFPRecorder; lfp is contacts x samples (mV)."""
+    for chunk in _lfp_chunks(path):
+        with np.load(chunk) as data:
+            yield data["t"], data["lfp"]
+
+
+def load_lfp(path):
+    """(t, lfp, contacts) of an LFPRecorder output directory."""
+    chunks = _lfp_chunks(path)
+    if not chunks:
+        return np.empty(0), np.empty((0, 0)), np.empty((0, 3))
+    ts, lfps = zip(*iter_lfp_chunks(path))
+    with np.load(chunks[0]) as data:
+        contacts = data["contacts"]
+    return np.concatenate(ts), np.concatenate(lfps, axis=1), contacts
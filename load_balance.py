@@ -0,0 +1,23 @@
+"""Assign cells to ranks or threads, either round-robin or balanced by cost."""
+import numpy as np
+
+
+def round_robin_owners(n_cells, nhost):
+    """gid -> rank, dealt like cards: gid % nhost."""
+    return np.arange(n_cells) % nhost
+
+
+def balanced_owners(costs, nhost):
+    """gid -> rank, greedy longest-processing-time assignment by per-cell cost.
+
+    Use e.g. the number of segments of each cell as its cost. Ties go to the
+    lowest rank, so the result only depends on costs and nhost.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    owners = np.empty(costs.size, dtype=np.int64)
+    load = np.zeros(nhost)
+    for gid in np.argsort(-costs, kind="stable"):
+        rank = int(np.argmin(load))
+        owners[gid] = rank
+        load[rank] += costs[gid]
+    return owners
@@ -0,0 +1,209 @@
+###                ###
+###~~~MECHANISMS~~~###
+###                ###
+"""Compile the repo's .mod files once into a content-addressed cache and load them.
+
+The cache directory is named after the sha256 of the .mod sources, the
+NEURON version, the platform and the nrnivmodl flags, so any edit to a .mod
+file (or a NEURON upgrade) triggers exactly one rebuild and every later process
+(including sweep workers) just loads the existing library with
+h.nrn_load_dll. load_mechanisms() fails fast if a required mechanism is
+still missing afterwards.
+
+Im and Kv3_1 can look their rates up in voltage tables instead of calling
+exp every segment every step. The tables are off after loading (analytic
+rates, as before) and are switched at run time with set_rate_tables(). A
+library that was built before the tables existed (e.g. a leftover x86_64/ that
+NEURON loads from the working directory) is refused by load_mechanisms().
+
+coreneuron=True builds with nrnivmodl -coreneuron into its own cache entry;
+that library also serves classic NEURON runs, and CORENEURONLIB is pointed
+at the matching libcorenrnmech for coreneuron_backend.py.
+
+    python mechanisms.py [--coreneuron]       # pre-build the cache
+"""
+import glob
+import hashlib
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from neuron import h
+
+MOD_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.environ.get(
+    "NEURO_SIM_MECH_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "neuro-tumour-sim", "mechanisms"))
+REQUIRED_MECHANISMS = ("pas", "hh", "Im", "Kv3_1")
+REPO_MECHANISMS = ("Im", "Kv3_1") #compiled from the .mod files here
+TABLE_MECHANISMS = ("Im", "Kv3_1") #rates() has a TABLE over v
+TABLE_INTERVALS = 2000 #WITH in the .mod files; resolution = (vmax - vmin) / TABLE_INTERVALS
+
+_loaded_digests = {} #digest -> built with CoreNEURON support
+_tables_reset = set() #table mechanisms already switched to analytic rates in this process
+
+
+def mod_files(mod_dir=None):
+    return sorted(glob.glob(os.path.join(mod_dir or MOD_DIR, "*.mod")))
+
+
+def mod_digest(files):
+    """sha256 over the names and contents of the .mod files."""
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _find_library(build_dir, name="libnrnmech"):
+    """Library in the nrnivmodl output (<arch>/.libs/ on NEURON 8, <arch>/ on 9)."""
+    for pattern in (f"*/.libs/{name}.so", f"*/{name}.so", f"*/.libs/{name}.dylib", f"*/{name}.dylib"):
+        found = glob.glob(os.path.join(build_dir, pattern))
+        if found:
+            return found[0]
+    return None
+
+
+def _nrnivmodl_command(coreneuron=False):
+    return ["nrnivmodl", "-coreneuron"] if coreneuron else ["nrnivmodl"]
+
+
+def _build_dir(files, cache_dir=None, coreneuron=False):
+    """Cache entry for the sources as built by this NEURON on this platform with these flags."""
+    key = hashlib.sha256()
+    for part in (mod_digest(files), h.nrnversion(), sys.platform, platform.machine(),
+                 " ".join(_nrnivmodl_command(coreneuron)), os.environ.get("CFLAGS", "")):
+        key.update(part.encode() + b"\0")
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, key.hexdigest()[:20] + ("-coreneuron" if coreneuron else ""))
+
+
+def build_mechanisms(mod_dir=None, cache_dir=None, coreneuron=False):
+    """Return the path of the compiled library for the current .mod sources, compiling if needed."""
+    files = mod_files(mod_dir)
+    if not files:
+        raise RuntimeError(f"No .mod files found in {mod_dir or MOD_DIR}")
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    build_dir = _build_dir(files, cache_dir, coreneuron)
+
+    lib = _find_library(build_dir)
+    if lib:
+        return lib
+
+    print(f"Compiling {len(files)} mechanisms into {build_dir}...")
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix="build-", dir=cache_dir)
+    try:
+        for path in files:
+            shutil.copy(path, tmp_dir)
+        result = subprocess.run(_nrnivmodl_command(coreneuron), cwd=tmp_dir, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"nrnivmodl failed:\n{result.stdout}\n{result.stderr}")
+        try:
+            os.rename(tmp_dir, build_dir) #atomic; another process may have won the race
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    lib = _find_library(build_dir)
+    if not lib:
+        raise RuntimeError(f"nrnivmodl finished but no libnrnmech was found in {build_dir}")
+    return lib
+
+
+def coreneuron_library(mod_dir=None, cache_dir=None):
+    """Path of libcorenrnmech built by build_mechanisms(coreneuron=True), or None."""
+    return _find_library(_build_dir(mod_files(mod_dir), cache_dir, coreneuron=True), "libcorenrnmech")
+
+
+def missing_mechanisms(names=REQUIRED_MECHANISMS):
+    return [name for name in names if not h.name_declared(name)]
+
+
+def require_mechanisms(names=REQUIRED_MECHANISMS):
+    """Raise RuntimeError unless every mechanism in names is available."""
+    missing = missing_mechanisms(names)
+    if missing:
+        raise RuntimeError(f"Mechanisms not loaded: {', '.join(missing)}. "
+                           f"Check the .mod files in {MOD_DIR} and the nrnivmodl output.")
+
+
+def load_mechanisms(mod_dir=None, cache_dir=None, required=REQUIRED_MECHANISMS, coreneuron=False):
+    """Build (once) and load the repo mechanisms, then check that required ones exist.
+
+    Cheap to call repeatedly. If the required mechanisms are already declared
+    (e.g. built-ins, or running under nrniv/special) nothing is loaded, and a
+    later call that needs more still builds and loads the library.
+    coreneuron=True has to come before anything else loads the mechanisms: a
+    library can not be swapped once loaded. Whoever loaded them, the rate
+    tables are switched off the first time a table mechanism is seen.
+    """
+    files = mod_files(mod_dir)
+    digest = mod_digest(files)
+    if digest in _loaded_digests:
+        if coreneuron and not _loaded_digests[digest]:
+            raise RuntimeError("Mechanisms were already loaded without CoreNEURON support; "
+                               "call load_mechanisms(coreneuron=True) before building any cells")
+    elif coreneuron or missing_mechanisms(required):
+        #the CoreNEURON build is loaded whatever `required` says: CoreNEURON needs it for every mechanism
+        _load_library(mod_dir, cache_dir, digest, coreneuron)
+    require_mechanisms(required)
+    declared = _check_rate_tables()
+    set_rate_tables(False, mechanisms=[name for name in declared if name not in _tables_reset])
+    _tables_reset.update(declared)
+
+
+def _check_rate_tables():
+    """Declared table mechanisms; RuntimeError if one was compiled from sources without the TABLE."""
+    declared = [name for name in TABLE_MECHANISMS if h.name_declared(name)]
+    stale = [name for name in declared if not h.name_declared(f"usetable_{name}")]
+    if stale:
+        raise RuntimeError(f"{', '.join(stale)} loaded from a library older than the .mod files in {MOD_DIR} "
+                           f"(no rate tables). Remove the stale x86_64/ (or arm64/) nrnivmodl output in "
+                           f"{os.getcwd()} and rebuild.")
+    return declared
+
+
+def _load_library(mod_dir, cache_dir, digest, coreneuron=False):
+    lib = build_mechanisms(mod_dir, cache_dir, coreneuron)
+    if coreneuron:
+        core_lib = coreneuron_library(mod_dir, cache_dir)
+        if core_lib is None:
+            raise RuntimeError(f"nrnivmodl -coreneuron produced no libcorenrnmech next to {lib}")
+        declared = [name for name in REPO_MECHANISMS if h.name_declared(name)]
+        if declared:
+            raise RuntimeError(f"{', '.join(declared)} already loaded from another library; "
+                               "the -coreneuron build has to be loaded first")
+        os.environ["CORENEURONLIB"] = core_lib #picked up by in-memory psolve and nrncore_run
+    h.nrn_load_dll(lib)
+    _loaded_digests[digest] = coreneuron #only once a library was actually loaded
+
+
+def set_rate_tables(enabled=True, vmin=None, vmax=None, mechanisms=TABLE_MECHANISMS):
+    """Switch the tabulated rates of mechanisms on or off; vmin/vmax (mV) move the table range.
+
+    Tables are rebuilt by NEURON on the next step after celsius, vshift or the
+    range change. Outside [vmin, vmax] the table clamps to its end values.
+    """
+    for name in mechanisms:
+        setattr(h, f"usetable_{name}", 1 if enabled else 0)
+        if vmin is not None:
+            setattr(h, f"vmin_table_{name}", vmin)
+        if vmax is not None:
+            setattr(h, f"vmax_table_{name}", vmax)
+
+
+def rate_table_state(mechanisms=TABLE_MECHANISMS):
+    """{mechanism: (enabled, vmin, vmax)} as currently set in NEURON."""
+    return {name: (bool(getattr(h, f"usetable_{name}")), getattr(h, f"vmin_table_{name}"),
+                   getattr(h, f"vmax_table_{name}")) for name in mechanisms}
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--coreneuron"]
+    print(build_mechanisms(args[0] if args else None, coreneuron="--coreneuron" in sys.argv[1:]))
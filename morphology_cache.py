@@ -0,0 +1,159 @@
+###                     ###
+###~~~MORPHOLOGY CACHE~~~###
+###                     ###
+"""Parse each SWC once and share the result across RealisticNeuronTemplate instances.
+
+The first cell built from a morphology is loaded through LFPy as usual. Its
+sections (3D points, tree topology, nseg from lambda_f) and the soma/dendrite/axon
+classification are then stored in memory and as an .npz file keyed by
+(file content hash, Ra, cm, nsegs_method, lambda_f). Every later cell is
+instantiated straight from those arrays without touching the SWC text.
+"""
+import hashlib
+import os
+
+import numpy as np
+from neuron import h
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".morphology_cache")
+
+_memory_cache = {} #key -> MorphologyData
+_hash_cache = {} #(path, mtime, size) -> sha256 of the file contents
+
+
+def file_hash(path):
+    """sha256 of the file contents, remembered per (path, mtime, size)."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    stamp = (path, st.st_mtime_ns, st.st_size)
+    if stamp not in _hash_cache:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _hash_cache[stamp] = digest.hexdigest()
+    return _hash_cache[stamp]
+
+
+def morphology_key(swc_file, Ra, cm, nsegs_method, lambda_f):
+    """Cache key; also used as the on-disk file name."""
+    return f"{file_hash(swc_file)[:20]}_Ra{Ra:g}_cm{cm:g}_{nsegs_method}_lf{lambda_f:g}"
+
+
+class MorphologyData:
+    """Flat-array snapshot of a loaded morphology and its section classification."""
+    def __init__(self, names, parent, parent_x, child_x, nseg, pt3d, pt3d_ptr, soma_index, is_axon):
+        self.names = [str(n) for n in names]
+        self.parent = np.asarray(parent, dtype=np.int32) #-1 for the root section
+        self.parent_x = np.asarray(parent_x, dtype=np.float64)
+        self.child_x = np.asarray(child_x, dtype=np.float64)
+        self.nseg = np.asarray(nseg, dtype=np.int32)
+        self.pt3d = np.asarray(pt3d, dtype=np.float64).reshape(-1, 4) #x, y, z, diam
+        self.pt3d_ptr = np.asarray(pt3d_ptr, dtype=np.int64)
+        self.soma_index = int(soma_index) #-1 if no soma was identified
+        self.is_axon = np.asarray(is_axon, dtype=bool)
+
+    @property
+    def n_sections(self):
+        return len(self.names)
+
+    @property
+    def n_segments(self):
+        return int(self.nseg.sum())
+
+    @property
+    def dendrite_indices(self):
+        mask = ~self.is_axon
+        if self.soma_index >= 0:
+            mask[self.soma_index] = False
+        return np.flatnonzero(mask)
+
+    @property
+    def axon_indices(self):
+        return np.flatnonzero(self.is_axon)
+
+    @classmethod
+    def from_sections(cls, sections, soma, axon):
+        """Snapshot already built NEURON sections (e.g. an LFPy cell's allseclist)."""
+        index = {sec: k for k, sec in enumerate(sections)}
+        axon_set = set(axon)
+        names, parent, parent_x, child_x, nseg, pt3d_ptr = [], [], [], [], [], [0]
+        points = []
+        for sec in sections:
+            names.append(sec.name())
+            pseg = sec.parentseg()
+            if pseg is not None and pseg.sec in index:
+                parent.append(index[pseg.sec])
+                parent_x.append(pseg.x)
+            else:
+                parent.append(-1)
+                parent_x.append(0.0)
+            child_x.append(sec.orientation())
+            nseg.append(sec.nseg)
+            n3d = int(sec.n3d())
+            for i in range(n3d):
+                points.append((sec.x3d(i), sec.y3d(i), sec.z3d(i), sec.diam3d(i)))
+            pt3d_ptr.append(pt3d_ptr[-1] + n3d)
+        soma_index = index[soma] if soma is not None else -1
+        is_axon = [sec in axon_set for sec in sections]
+        return cls(names, parent, parent_x, child_x, nseg, points, pt3d_ptr, soma_index, is_axon)
+
+    def instantiate(self, owner=None):
+        """Create NEURON sections from the snapshot. Returns them in stored order."""
+        sections = [h.Section(name=name, cell=owner) if owner is not None else h.Section(name=name)
+                    for name in self.names]
+        ptr = self.pt3d_ptr
+        for k, sec in enumerate(sections):
+            pts = self.pt3d[ptr[k]:ptr[k + 1]]
+            if pts.size:
+                #vector form of pt3dadd: one call per section instead of per point
+                sec.pt3dadd(h.Vector(pts[:, 0]), h.Vector(pts[:, 1]), h.Vector(pts[:, 2]), h.Vector(pts[:, 3]))
+            sec.nseg = int(self.nseg[k])
+        for k, sec in enumerate(sections):
+            p = int(self.parent[k])
+            if p >= 0:
+                sec.connect(sections[p](self.parent_x[k]), self.child_x[k])
+        return sections
+
+    def save(self, path):
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, version=CACHE_VERSION, names=np.array(self.names),
+                            parent=self.parent, parent_x=self.parent_x, child_x=self.child_x,
+                            nseg=self.nseg, pt3d=self.pt3d, pt3d_ptr=self.pt3d_ptr,
+                            soma_index=self.soma_index, is_axon=self.is_axon)
+        os.replace(tmp_path, path) #atomic, so parallel workers never read half a file
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["version"]) != CACHE_VERSION:
+                return None
+            return cls(data["names"].tolist(), data["parent"], data["parent_x"], data["child_x"],
+                       data["nseg"], data["pt3d"], data["pt3d_ptr"], int(data["soma_index"]),
+                       data["is_axon"])
+
+
+def get_cached_morphology(key, cache_dir=None):
+    """Return the MorphologyData for key from memory or disk, or None."""
+    if key in _memory_cache:
+        return _memory_cache[key]
+    path = os.path.join(cache_dir or DEFAULT_CACHE_DIR, key + ".npz")
+    if os.path.exists(path):
+        morph = MorphologyData.load(path)
+        if morph is not None:
+            _memory_cache[key] = morph
+            return morph
+    return None
+
+
+def store_morphology(key, morph, cache_dir=None):
+    """Keep morph in memory and write it to the on-disk cache."""
+    _memory_cache[key] = morph
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    morph.save(os.path.join(cache_dir, key + ".npz"))
+
+
+def clear_memory_cache():
+    _memory_cache.clear()
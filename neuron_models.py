@@ -0,0 +1,19 @@
+###                   ###
+###~~~NEURON MODELS~~~###
+###                   ###
+"""Point-neuron models for the simple networks (cell_network.py, parallel_network.py).
+
+The cell is the single_hh_neuron.py soma: one 20 x 20 um compartment with the
+built-in Hodgkin-Huxley channels. Synapses, spike detectors and stimuli are
+added by the network that owns the cell.
+"""
+from neuron import h
+
+
+def create_simple_hh_cell(gid):
+    """Single-compartment HH soma named soma_<gid>; returns the Section."""
+    soma = h.Section(name=f"soma_{gid}")
+    soma.L = 20 #length in microns
+    soma.diam = 20 #diameter in microns
+    soma.insert("hh")
+    return soma
@@ -0,0 +1,289 @@
+###                            ###
+###~~~PARALLEL CELL NETWORK~~~###
+###                            ###
+"""Distributed version of the cell_network.py model on h.ParallelContext.
+
+Every cell gets a global id (gid) and is owned by exactly one rank. Each rank
+draws only the connections onto the cells it owns and their drive trains, from
+the per-gid random streams of random_streams.py, and instantiates them with
+pc.gid_connect, so the model does not depend on how many ranks it is split over.
+
+    mpiexec -n 4 python parallel_network.py [--headless] [--coreneuron [--file-mode]]
+
+Spikes are gathered to rank 0 as the same (times, ids) arrays cell_network.py
+plots, sorted by (time, id). With backend "coreneuron" the built model is run
+in CoreNEURON instead (coreneuron_backend.py), in memory or via files.
+"""
+import hashlib
+import sys
+import time
+
+import numpy as np
+from neuron import h
+
+from background_drive import VecStimDrive, generate_poisson_trains
+from checkpoint import model_hash, warm_start
+from connectivity import build_connectivity
+from coreneuron_backend import check_backend, psolve as coreneuron_psolve
+from load_balance import round_robin_owners
+from mechanisms import load_mechanisms
+from random_streams import RandomStreams
+from run_modes import configure_run_mode
+from neuron_models import create_simple_hh_cell
+
+h.load_file("stdrun.hoc")
+
+#~~~ DEFAULT PARAMS (same values as cell_network.py) ~~~#
+DEFAULT_PARAMS = {
+    "num_E": 80,
+    "num_I": 20,
+    "sim_duration": 500, #ms
+    "dt": 0.025, #fixed-step run mode only
+    "run_mode": "fixed", #"fixed", "cvode" or "local_dt", see run_modes.configure_run_mode
+    "atol": 1e-3, #variable-step modes
+    "backend": "neuron", #"neuron" or "coreneuron" (fixed step only, no checkpoints)
+    "coreneuron_mode": "memory", #"memory" or "file" transfer to CoreNEURON
+    "coreneuron_data_dir": "coreneuron_data", #file mode only
+    "v_init": -65, #mV
+    "connection_probability": 0.1,
+    "netcon_delay": 1.5, #ms
+    "spike_threshold": -20, #mV
+    "weight_EE": 0.003,
+    "weight_EI": 0.001,
+    "weight_IE": 0.01,
+    "weight_II": 0.01,
+    "drive_rate": 15, #Hz
+    "drive_weight": 0.01, #uS
+    "drive_start": 50, #ms
+    "drive_delay": 0.1, #ms
+    "connectivity_seed": 1,
+    "drive_seed": 1,
+}
+
+#params that cannot change the cell states before the drive starts; a checkpoint taken
+#before drive_start (with the fresh event queue kept) is shared across them
+PRE_DRIVE_INDEPENDENT = ("sim_duration", "connection_probability", "netcon_delay",
+                         "weight_EE", "weight_EI", "weight_IE", "weight_II",
+                         "drive_rate", "drive_weight", "drive_start", "drive_delay",
+                         "connectivity_seed", "drive_seed")
+
+
+def spike_digest(times, ids):
+    """sha256 of the raster, to compare runs with different rank counts bit for bit."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(times, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(ids, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+class ParallelNetwork:
+    """E/I network of simple HH cells distributed over the ranks of a ParallelContext.
+
+    owners: optional gid -> rank array, e.g. load_balance.balanced_owners(costs, nhost);
+    round-robin when omitted.
+    """
+    def __init__(self, params=None, connectivity=None, pc=None, owners=None):
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.pc = pc if pc is not None else h.ParallelContext()
+        self.rank = int(self.pc.id())
+        self.nhost = int(self.pc.nhost())
+
+        p = self.params
+        self.num_E = p["num_E"]
+        self.num_I = p["num_I"]
+        self.n_cells = self.num_E + self.num_I
+        check_backend(p["backend"], p["run_mode"])
+        if p["backend"] == "coreneuron":
+            load_mechanisms(coreneuron=True) #the -coreneuron build, before anything loads the plain library
+
+        self.owners = round_robin_owners(self.n_cells, self.nhost) if owners is None else np.asarray(owners)
+        self.local_gids = np.flatnonzero(self.owners == self.rank)
+
+        #drawn here: only the rows of the local recievers; given: the full network on every rank
+        self.connectivity_from_params = connectivity is None
+        if connectivity is None:
+            connectivity = build_connectivity(
+                self.num_E, self.num_I, p["connection_probability"],
+                weights={"EE": p["weight_EE"], "EI": p["weight_EI"], "IE": p["weight_IE"], "II": p["weight_II"]},
+                delay=p["netcon_delay"], seed=p["connectivity_seed"], gids=self.local_gids)
+        self.connectivity = connectivity
+
+        self.cells = {} #gid -> soma section
+        self.synapses_E = {}
+        self.synapses_I = {}
+        self.spike_detectors = []
+        self.netcons = []
+        self.drive = None
+        self.drive_netcons = []
+
+        self._create_cells()
+        self._connect()
+        self._add_drive()
+
+        self.spike_times_vec = h.Vector()
+        self.spike_ids_vec = h.Vector()
+        self.pc.spike_record(-1, self.spike_times_vec, self.spike_ids_vec) #all local gids
+
+    def _create_cells(self):
+        threshold = self.params["spike_threshold"]
+        for gid in self.local_gids.tolist():
+            soma = create_simple_hh_cell(gid)
+            self.cells[gid] = soma
+
+            syn_E = h.Exp2Syn(soma(0.5))
+            syn_E.tau1, syn_E.tau2, syn_E.e = 0.2, 2.0, 0
+            syn_I = h.Exp2Syn(soma(0.5))
+            syn_I.tau1, syn_I.tau2, syn_I.e = 0.5, 5.0, -75
+            self.synapses_E[gid] = syn_E
+            self.synapses_I[gid] = syn_I
+
+            #register the cell and its spike source with the ParallelContext
+            self.pc.set_gid2node(gid, self.rank)
+            nc = h.NetCon(soma(0.5)._ref_v, None, sec=soma)
+            nc.threshold = threshold
+            self.pc.cell(gid, nc)
+            self.spike_detectors.append(nc)
+
+    def _connect(self):
+        """One pc.gid_connect per connection whose target lives on this rank."""
+        conn = self.connectivity
+        sources = conn.sources()
+        local = np.flatnonzero(self.owners[conn.indices] == self.rank)
+        for k, pre, post in zip(local.tolist(), sources[local].tolist(), conn.indices[local].tolist()):
+            target_syn = self.synapses_E[post] if pre < self.num_E else self.synapses_I[post]
+            nc = self.pc.gid_connect(pre, target_syn)
+            nc.delay = float(conn.delays[k])
+            self.netcons.append(nc)
+        self.netcon_edges = local #edge index of every netcon in self.netcons
+        self._apply_weights()
+
+    def _apply_weights(self):
+        """(Re)set every NetCon weight from the connectivity, e.g. after a checkpoint restore."""
+        for nc, w in zip(self.netcons, self.connectivity.weights[self.netcon_edges].tolist()):
+            nc.weight[0] = w
+        for nc in self.drive_netcons:
+            nc.weight[0] = self.params["drive_weight"]
+
+    def _add_drive(self):
+        """Poisson background drive played by one VecStim per local cell.
+
+        Every rank draws only the trains of its own cells, each from the cell's
+        (drive_seed, gid, "drive") stream, so a cell's drive does not depend on
+        which rank owns it.
+        """
+        p = self.params
+        trains = generate_poisson_trains(self.n_cells, p["drive_rate"], p["drive_start"], p["sim_duration"],
+                                         RandomStreams(p["drive_seed"]), fibers=self.local_gids.tolist())
+        fiber_targets = [[] for _ in range(self.n_cells)] #fibers of other ranks' cells stay empty
+        for gid in self.local_gids.tolist():
+            fiber_targets[gid] = [gid]
+        self.drive = VecStimDrive(trains, fiber_targets, self.synapses_E,
+                                  weight=p["drive_weight"], delay=p["drive_delay"])
+        self.drive_netcons = self.drive.netcons
+
+    def checkpoint_key(self, t):
+        """Model hash for a checkpoint at t; drive and weights only count once the drive has started.
+
+        After drive onset the key also covers the adjacency and weights (every
+        rank's rows for connectivity drawn from the params, gathered so all ranks
+        agree) and the code that draws the connections and trains. Collective
+        past drive_start: call it on every rank.
+        """
+        p = self.params
+        if t <= p["drive_start"]:
+            p = {name: value for name, value in p.items() if name not in PRE_DRIVE_INDEPENDENT}
+            return model_hash(p, sources=(create_simple_hh_cell,))
+        seeds = ("connectivity_seed", "drive_seed") if self.connectivity_from_params else ("drive_seed",)
+        unseeded = [name for name in seeds if p[name] is None]
+        if unseeded:
+            raise ValueError(f"{', '.join(unseeded)} is None: a checkpoint after drive_start would not "
+                             "reproduce the same network; set the seeds or checkpoint at t <= drive_start")
+        connectivity = (self.connectivity.digest(),
+                        hashlib.sha256(self.connectivity.weights.tobytes()).hexdigest())
+        if self.connectivity_from_params:
+            #each rank holds only its own rows; every rank hashes all of them, in rank order
+            connectivity = hashlib.sha256(repr(self.pc.py_allgather(connectivity)).encode()).hexdigest()
+        p = dict(p, connectivity=connectivity)
+        return model_hash(p, sources=(create_simple_hh_cell, build_connectivity, generate_poisson_trains,
+                                      RandomStreams))
+
+    def run(self, tstop=None, checkpoint_dir=None, equilibrate_until=None):
+        """Initialise and run with pc.psolve. Returns wall time of the solve on this rank.
+
+        With checkpoint_dir the state at equilibrate_until (default: drive_start) is
+        restored from a checkpoint, or computed once and saved, and only the rest of
+        the run is timed. Spikes before that time are not in the raster.
+        With the CoreNEURON backend the time includes the model transfer.
+        """
+        p = self.params
+        h.dt = p["dt"]
+        h.tstop = tstop if tstop is not None else p["sim_duration"]
+        check_backend(p["backend"], p["run_mode"], checkpoint_dir)
+        if p["backend"] == "coreneuron":
+            return coreneuron_psolve(self.pc, h.tstop, p["v_init"], p["coreneuron_mode"], p["coreneuron_data_dir"],
+                                     spike_vecs=(self.spike_times_vec, self.spike_ids_vec))
+        configure_run_mode(p["run_mode"], p["atol"])
+        self.pc.set_maxstep(10) #exchange interval is bounded by the min NetCon delay
+        if checkpoint_dir is not None:
+            t_eq = p["drive_start"] if equilibrate_until is None else equilibrate_until
+            meta = warm_start(self.checkpoint_key(t_eq), t_eq, checkpoint_dir, pc=self.pc,
+                              v_init=p["v_init"], keep_queue=t_eq <= p["drive_start"],
+                              reset_vectors=(self.spike_times_vec, self.spike_ids_vec))
+            if meta["restored"]:
+                self._apply_weights() #SaveState also restores NetCon weights
+        else:
+            h.finitialize(p["v_init"])
+        self.pc.barrier()
+        t_start = time.time()
+        self.pc.psolve(h.tstop)
+        self.pc.barrier()
+        return time.time() - t_start
+
+    def gather_spikes(self):
+        """Collect (times, ids) from all ranks on rank 0, sorted by (time, id). Other ranks get None."""
+        local = (self.spike_times_vec.as_numpy().copy(), self.spike_ids_vec.as_numpy().astype(np.int64))
+        gathered = self.pc.py_gather(local, 0)
+        if self.rank != 0:
+            return None, None
+        times = np.concatenate([g[0] for g in gathered])
+        ids = np.concatenate([g[1] for g in gathered])
+        order = np.lexsort((ids, times))
+        return times[order], ids[order]
+
+
+def main(headless=False, backend="neuron", coreneuron_mode="memory"):
+    h.nrnmpi_init() #no-op when not launched under mpiexec
+    pc = h.ParallelContext()
+    t_build = time.time()
+    net = ParallelNetwork({"backend": backend, "coreneuron_mode": coreneuron_mode}, pc=pc)
+    pc.barrier()
+    t_build = time.time() - t_build
+    n_connections = int(pc.allreduce(net.connectivity.n_connections, 1)) #each rank holds its own rows
+    if net.rank == 0:
+        print(f"Built {net.n_cells} cells / {n_connections} connections "
+              f"on {net.nhost} ranks in {t_build:.2f} seconds")
+
+    t_run = net.run()
+    spike_times, spike_ids = net.gather_spikes()
+
+    if net.rank == 0:
+        print(f"Simulation finished in {t_run:.2f} seconds ({backend})")
+        print(f"Gathered {spike_times.size} spikes, digest {spike_digest(spike_times, spike_ids)}")
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        spikes_filename = f"network_spikes_parallel_{timestamp}.npz"
+        np.savez(spikes_filename, times=spike_times, ids=spike_ids)
+        print(f"Spikes saved to {spikes_filename}")
+        if not headless:
+            import plot_results
+            plot_results.plot_raster_density((spike_times, spike_ids), net.n_cells, net.params["sim_duration"],
+                                             f"simple HH, N={net.n_cells}, {net.nhost} ranks",
+                                             f"network_raster_parallel_{timestamp}.png")
+
+    pc.barrier()
+    pc.done()
+
+
+if __name__ == "__main__":
+    main(headless="--headless" in sys.argv[1:],
+         backend="coreneuron" if "--coreneuron" in sys.argv[1:] else "neuron",
+         coreneuron_mode="file" if "--file-mode" in sys.argv[1:] else "memory")
@@ -0,0 +1,222 @@
+###                     ###
+###~~~PARAMETER SWEEP~~~###
+###                     ###
+"""Batched weight/drive sweeps over the network, one worker process per point.
+
+NEURON state is global, so every point runs in a fresh process
+(maxtasksperchild=1) and this module never imports neuron itself. All points
+share one pre-built connectivity (.npz) whose block weights are replaced per
+point, and each point is seeded from the hash of its parameters. Finished
+points are cached as <hash>.json in the sweep directory, so an interrupted
+sweep resumes where it stopped. The equilibrated state at drive onset does
+not depend on the swept parameters, so it is checkpointed once in
+<sweep_dir>/checkpoints and every later point starts from it.
+
+    python parameter_sweep.py
+"""
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+import spike_analysis
+
+SWEEP_PARAMS = ("weight_EE", "weight_EI", "weight_IE", "weight_II", "drive_rate", "drive_weight")
+
+
+#~~~ SAMPLERS ~~~#
+def grid_points(space):
+    """Full factorial grid. space: {name: [values, ...]}."""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+
+
+def random_points(bounds, n, seed=0):
+    """n uniform samples. bounds: {name: (low, high)}."""
+    rng = np.random.default_rng(seed)
+    names = list(bounds)
+    low = np.array([bounds[n][0] for n in names])
+    high = np.array([bounds[n][1] for n in names])
+    samples = low + rng.random((n, len(names))) * (high - low)
+    return [dict(zip(names, row.tolist())) for row in samples]
+
+
+def latin_hypercube_points(bounds, n, seed=0):
+    """n Latin-hypercube samples: one sample per 1/n stratum of every parameter."""
+    rng = np.random.default_rng(seed)
+    names = list(bounds)
+    low = np.array([bounds[n][0] for n in names])
+    high = np.array([bounds[n][1] for n in names])
+    strata = np.argsort(rng.random((n, len(names))), axis=0) #independent permutation per column
+    unit = (strata + rng.random((n, len(names)))) / n
+    samples = low + unit * (high - low)
+    return [dict(zip(names, row.tolist())) for row in samples]
+
+
+#~~~ HASHING / SEEDING ~~~#
+def point_hash(point, base_params, connectivity_digest):
+    """Stable id of one simulation: its parameters, the fixed params and the adjacency."""
+    payload = json.dumps({"point": point, "base": base_params, "connectivity": connectivity_digest},
+                         sort_keys=True, default=float)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def point_seed(base_seed, key):
+    """Deterministic 32-bit seed per point, independent of sweep order."""
+    return (int(key, 16) + base_seed) % (2 ** 31 - 1)
+
+
+#~~~ SUMMARY STATISTICS ~~~#
+def _summary_stats(times, ids, num_E, num_I, t_start, t_stop, bin_size=5.0):
+    """Population rates, mean CV of ISI and Golomb synchrony of one run."""
+    n_cells = num_E + num_I
+    rates = spike_analysis.firing_rates(times, ids, n_cells, t_start, t_stop)
+    cv = spike_analysis.isi_cv(times, ids, n_cells, t_start, t_stop)
+    counts = spike_analysis.binned_counts(times, ids, n_cells, t_start, t_stop, bin_size)
+    return {
+        "rate_E": float(rates[:num_E].mean()) if num_E else float("nan"),
+        "rate_I": float(rates[num_E:].mean()) if num_I else float("nan"),
+        "cv_isi": float(np.nanmean(cv)) if np.isfinite(cv).any() else float("nan"),
+        "synchrony": spike_analysis.synchrony(counts),
+        "n_spikes": int(counts.sum()),
+    }
+
+
+#~~~ WORKER ~~~#
+def _run_point(task):
+    """Build and run one network in this (fresh) process and cache its summary.
+
+    A failing point does not stop the sweep: its row carries the error instead
+    of the statistics and is not cached, so the next run retries it.
+    """
+    point, key, seed, base_params, connectivity_path, cache_dir, checkpoint_dir = task
+    try:
+        result = _simulate_point(point, key, seed, base_params, connectivity_path, checkpoint_dir)
+    except Exception as exc:
+        return dict(point, hash=key, seed=seed, error=f"{type(exc).__name__}: {exc}")
+    tmp_path = os.path.join(cache_dir, key + ".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, os.path.join(cache_dir, key + ".json"))
+    return result
+
+
+def _simulate_point(point, key, seed, base_params, connectivity_path, checkpoint_dir):
+    from neuron import h
+    from connectivity import Connectivity
+    from parallel_network import ParallelNetwork
+
+    params = dict(base_params, **point)
+    params["drive_seed"] = seed
+    weights = {block: params["weight_" + block] for block in ("EE", "EI", "IE", "II")}
+    conn = Connectivity.load(connectivity_path).with_block_weights(weights)
+
+    t0 = time.time()
+    net = ParallelNetwork(params=params, connectivity=conn, pc=h.ParallelContext())
+    t_build = time.time() - t0
+    t_run = net.run(checkpoint_dir=checkpoint_dir)
+    times, ids = net.gather_spikes()
+
+    result = dict(point, hash=key, seed=seed, build_s=t_build, run_s=t_run)
+    result.update(_summary_stats(times, ids, net.num_E, net.num_I,
+                                 net.params["drive_start"], net.params["sim_duration"]))
+    return result
+
+
+def run_sweep(points, connectivity_path, sweep_dir, base_params=None, base_seed=0, processes=None,
+              use_checkpoints=True):
+    """Run every point not cached yet, then return all results (in points order).
+
+    Also writes sweep_dir/results.csv with one row per point; points that
+    failed have an "error" column instead of the statistics. The network size
+    is taken from the connectivity; num_E/num_I in base_params must match it.
+    use_checkpoints warm-starts every point from the state at drive onset.
+    """
+    from connectivity import Connectivity
+
+    base_params = dict(base_params or {})
+    unknown = {name for point in points for name in point} - set(SWEEP_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {sorted(unknown)}; expected a subset of {SWEEP_PARAMS}")
+    if not points:
+        print("Sweep: no points to run")
+        return []
+    os.makedirs(sweep_dir, exist_ok=True)
+    conn = Connectivity.load(connectivity_path)
+    sizes = {"num_E": conn.num_E, "num_I": conn.num_I}
+    mismatched = {name: base_params[name] for name in sizes if name in base_params and base_params[name] != sizes[name]}
+    if mismatched:
+        raise ValueError(f"base_params {mismatched} do not match the connectivity in {connectivity_path} ({sizes})")
+    digest = conn.digest()
+
+    keys = [point_hash(point, base_params, digest) for point in points]
+    checkpoint_dir = os.path.join(sweep_dir, "checkpoints") if use_checkpoints else None
+    network_params = dict(base_params, **sizes)
+    tasks = [(point, key, point_seed(base_seed, key), network_params, connectivity_path, sweep_dir, checkpoint_dir)
+             for point, key in zip(points, keys)
+             if not os.path.exists(os.path.join(sweep_dir, key + ".json"))]
+    print(f"Sweep: {len(points)} points, {len(points) - len(tasks)} cached, {len(tasks)} to run")
+
+    t_start = time.time()
+    failed = {}
+    if tasks:
+        with multiprocessing.Pool(processes=processes, maxtasksperchild=1) as pool:
+            for done, result in enumerate(pool.imap_unordered(_run_point, tasks), 1):
+                if "error" in result:
+                    failed[result["hash"]] = result
+                    print(f"  [{done}/{len(tasks)}] {result['hash']}: failed, {result['error']}")
+                    continue
+                print(f"  [{done}/{len(tasks)}] {result['hash']}: rate_E={result['rate_E']:.2f} Hz, "
+                      f"rate_I={result['rate_I']:.2f} Hz")
+    elapsed = time.time() - t_start
+    if tasks:
+        print(f"Ran {len(tasks)} simulations in {elapsed:.1f} s "
+              f"({len(tasks) / elapsed * 3600:.0f} simulations/hour)")
+    if failed:
+        print(f"{len(failed)} points failed; they are rerun on the next call")
+
+    results = []
+    for key in keys:
+        if key in failed:
+            results.append(failed[key])
+            continue
+        with open(os.path.join(sweep_dir, key + ".json")) as f:
+            results.append(json.load(f))
+    fieldnames = list(dict.fromkeys(name for result in results for name in result))
+    with open(os.path.join(sweep_dir, "results.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(results)
+    return results
+
+
+def main():
+    from connectivity import build_connectivity
+
+    sweep_dir = "sweep_results"
+    os.makedirs(sweep_dir, exist_ok=True)
+    connectivity_path = os.path.join(sweep_dir, "connectivity.npz")
+    if not os.path.exists(connectivity_path):
+        conn = build_connectivity(80, 20, 0.1, weights={"EE": 0.003, "EI": 0.001, "IE": 0.01, "II": 0.01},
+                                  delay=1.5, seed=1)
+        conn.save(connectivity_path)
+
+    points = latin_hypercube_points({
+        "weight_EE": (0.001, 0.006),
+        "weight_EI": (0.0005, 0.003),
+        "weight_IE": (0.005, 0.02),
+        "weight_II": (0.005, 0.02),
+        "drive_rate": (5, 30),
+        "drive_weight": (0.005, 0.02),
+    }, n=32, seed=0)
+    results = run_sweep(points, connectivity_path, sweep_dir)
+    print(f"Results table: {os.path.join(sweep_dir, 'results.csv')} ({len(results)} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+###                  ###
+###~~~PLOT RESULTS~~~###
+###                  ###
+"""Plots made after the fact from saved results; the only module that needs matplotlib.
+
+    python plot_results.py network_results_20250428-021808       # raster + voltage traces (+ positions)
+    python plot_results.py --scatter network_results_...          # every spike as a marker
+    python plot_results.py test_Pyramidal_20250428-021808.npz     # single-cell trace
+
+Network results are read from the recorder store and the
+<results_path>_run.json written by cell_network.py; single-cell results are
+the .npz written by test_realistic_cell.py. By default the raster is a spike
+density image and the voltage traces are min/max decimated (rendering.py), so
+plotting time and memory do not grow with the number of spikes or samples.
+"""
+import json
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg") #files only, works without a display
+import matplotlib.pyplot as plt
+import numpy as np
+
+from recorder import iter_spike_chunks, load_spikes, load_voltages
+from rendering import render_raster, render_voltages
+
+
+def load_run_info(results_path):
+    with open(f"{results_path}_run.json") as f:
+        return json.load(f)
+
+
+def plot_raster(spike_times, spike_ids, n_cells, sim_duration, title, output_filename):
+    plt.figure(figsize=(12, 7)) #creates figure window for plot
+    plt.scatter(spike_times, spike_ids, marker='.', s=5, c='black') #creates scatter plot
+    #labels
+    plt.xlabel("Time (ms)")
+    plt.ylabel("Neuron ID")
+    plt.title(f"Network activity ({title})")
+    #set limits of axes to match sim
+    plt.xlim(0, sim_duration)
+    plt.ylim(-1, n_cells)
+    plt.savefig(output_filename)
+    plt.close()
+    print(f"RASTER PLOT SAVED TO: {output_filename}")
+
+
+def plot_raster_density(source, n_cells, sim_duration, title, output_filename):
+    """Raster as a (neuron x time) spike density image; source is a store path or (times, ids)."""
+    fig, ax = plt.subplots(figsize=(12, 7))
+    image = render_raster(ax, source, n_cells, 0, sim_duration)
+    fig.colorbar(image, ax=ax, label="Spikes per bin")
+    ax.set_xlabel("Time (ms)")
+    ax.set_ylabel("Neuron ID")
+    ax.set_title(f"Network activity ({title})")
+    fig.savefig(output_filename)
+    plt.close(fig)
+    print(f"RASTER PLOT SAVED TO: {output_filename}")
+
+
+def plot_voltages_decimated(source, num_E, sim_duration, output_filename):
+    """Voltage traces as min/max bands per pixel column; source is a store path or load_voltages() output."""
+    fig, ax = plt.subplots(figsize=(12, 5))
+    render_voltages(ax, source, 0, sim_duration,
+                    label=lambda i: f"Cell {i} ({'E' if i < num_E else 'I'})")
+    ax.set_xlabel("Time (ms)")
+    ax.set_ylabel("Membrane Potential (mV)")
+    ax.set_title("Sample Neuron Voltage Traces")
+    ax.legend()
+    ax.grid(True)
+    fig.savefig(output_filename)
+    plt.close(fig)
+    print(f"--- VOLTAGE PLOT SAVED TO: {output_filename} ---")
+
+
+def plot_voltages(t_rec, v_ids, v_traces, num_E, output_filename):
+    plt.figure(figsize=(12, 5))
+    for i, v_trace in zip(v_ids.tolist(), v_traces):
+        cell_type = "E" if i < num_E else "I"
+        plt.plot(t_rec, v_trace, label=f'Cell {i} ({cell_type})')
+    plt.xlabel("Time (ms)")
+    plt.ylabel("Membrane Potential (mV)")
+    plt.title("Sample Neuron Voltage Traces")
+    plt.legend()
+    plt.grid(True)
+    plt.savefig(output_filename)
+    plt.close()
+    print(f"--- VOLTAGE PLOT SAVED TO: {output_filename} ---")
+
+
+def plot_positions(positions, num_E, output_filename, rates=None):
+    """Top (x-z) and side (x-depth) view of placed cells, coloured by E/I or by firing rate (Hz)."""
+    fig, (ax_top, ax_side) = plt.subplots(1, 2, figsize=(12, 6))
+    for ax, (a, b), (label_a, label_b) in [(ax_top, (0, 2), ("x (um)", "z (um)")),
+                                            (ax_side, (0, 1), ("x (um)", "depth y (um)"))]:
+        if rates is None:
+            ax.scatter(positions[:num_E, a], positions[:num_E, b], s=4, c='tab:red', label='E')
+            ax.scatter(positions[num_E:, a], positions[num_E:, b], s=4, c='tab:blue', label='I')
+        else:
+            points = ax.scatter(positions[:, a], positions[:, b], s=4, c=rates, cmap='viridis')
+        ax.set_xlabel(label_a)
+        ax.set_ylabel(label_b)
+        ax.set_aspect('equal')
+    if rates is None:
+        ax_top.legend()
+    else:
+        fig.colorbar(points, ax=[ax_top, ax_side], label="Firing rate (Hz)")
+    ax_top.set_title("Cell positions (top)")
+    ax_side.set_title("Cell positions (side)")
+    fig.savefig(output_filename)
+    plt.close(fig)
+    print(f"POSITIONS PLOT SAVED TO: {output_filename}")
+
+
+def plot_network(results_path, scatter=False):
+    """Raster and voltage plots of a cell_network.py run, saved with a unique timestamp as name.
+
+    scatter=True loads everything and draws every spike and sample (small runs only).
+    """
+    info = load_run_info(results_path)
+    p = info["params"]
+    n_cells = p["num_E"] + p["num_I"]
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    raster_filename = f"network_raster_simple_{timestamp}.png"
+    voltage_filename = f"network_voltages_{timestamp}.png"
+    if scatter:
+        spike_times, spike_ids = load_spikes(results_path)
+        plot_raster(spike_times, spike_ids, n_cells, p["sim_duration"], info["title"], raster_filename)
+        print("Plotting voltage traces...")
+        t_rec, v_ids, v_traces = load_voltages(results_path)
+        plot_voltages(t_rec, v_ids, v_traces, p["num_E"], voltage_filename)
+    else:
+        plot_raster_density(results_path, n_cells, p["sim_duration"], info["title"], raster_filename)
+        print("Plotting voltage traces...")
+        plot_voltages_decimated(results_path, p["num_E"], p["sim_duration"], voltage_filename)
+
+    positions_path = f"{results_path}_positions.npy"
+    if os.path.exists(positions_path):
+        counts = np.zeros(n_cells, dtype=np.int64)
+        for _, ids in iter_spike_chunks(results_path):
+            counts += np.bincount(ids, minlength=n_cells)
+        plot_positions(np.load(positions_path), p["num_E"], f"network_positions_{timestamp}.png",
+                       rates=counts / (p["sim_duration"] / 1000.0))
+
+
+def plot_cell_trace(path):
+    """Soma trace and spikes of a test_realistic_cell.py run (.npz); the .png goes next to it."""
+    data = np.load(path)
+    info = json.loads(str(data["info"]))
+    spike_times = data["spike_times"]
+
+    plt.figure(figsize=(12, 5))
+    plt.plot(data["t"], data["v_soma"], label=f"Soma Vm (Adapt Ratio: {info['adaptation_ratio']:.3f})")
+    if spike_times.size > 0:
+        y_min, y_max = plt.ylim()
+        # Ensure y_marker is a finite number before plotting
+        y_marker = y_max * 0.95 if np.isfinite(y_max) else 0
+        plt.scatter(spike_times, np.full(spike_times.shape, y_marker),
+                    color='red', marker='|', s=100, label='Spikes')
+
+    plt.xlabel("Time (ms)")
+    plt.ylabel("Membrane Potential (mV)")
+    plt.title(f"Test: {info['cell_label']} (I={info['iclamp_amp']:.2f} nA for {info['iclamp_dur']}ms)")
+    plt.legend(loc='upper right')
+    plt.grid(True)
+    output_filename = path[:-len(".npz")] + ".png" if path.endswith(".npz") else path + ".png"
+    plt.savefig(output_filename)
+    plt.close()
+    print(f"--- Plot saved to {output_filename} ---")
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else list(argv)
+    scatter = "--scatter" in args
+    paths = [arg for arg in args if arg != "--scatter"]
+    if not paths:
+        print(__doc__)
+        return
+    for path in paths:
+        if path.endswith(".npz"):
+            plot_cell_trace(path)
+        else:
+            plot_network(path, scatter=scatter)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+###                ###
+###~~~POPULATION~~~###
+###                ###
+"""Stamp out large populations by cloning one fully built prototype cell.
+
+The prototype (an L23PyramidalCell or L23BasketCell) goes through the normal
+LFPy constructor once. PopulationFactory snapshots its sections, region
+membership and biophysics spec; every clone is then created directly at the
+NEURON section level (no LFPy, no SWC, no soma heuristic) and only gets its
+own synapses, placed on the prototype's shared SegmentIndex with the cell's
+(seed, cell_id, "synapses") random stream.
+"""
+from neuron import h
+
+from biophysics import apply_biophysics, region_section_lists, set_section_params
+from morphology_cache import MorphologyData
+from random_streams import RandomStreams
+from segment_index import SegmentIndex, place_synapse_placeholders
+
+
+class ClonedCell:
+    """Section-level copy of a prototype: same attributes the network code uses, no LFPy cell.
+
+    staged=True only sets the attributes and leaves instantiate(),
+    assign_biophysics() and add_synapses() to the caller (used to time them separately).
+    """
+    def __init__(self, cell_id, factory, seed, num_syn_each_type=10, staged=False):
+        self.cell_id = cell_id
+        self.factory = factory
+        self.prototype_class = factory.prototype_class
+        self.swc_file = factory.swc_file
+        self.Ra = factory.Ra
+        self.cm = factory.cm
+        self.v_init = factory.v_init
+        self.cell = None
+        self.all_sections = []
+        self.soma = None
+        self.dendrites = []
+        self.axon = []
+        self.rng = RandomStreams(seed).generator(cell_id, "synapses") #independent of build order and rank
+        self.segment_index = factory.segment_index
+        self.syn_E_list = []
+        self.syn_I_list = []
+        if not staged:
+            self.instantiate()
+            self.assign_biophysics()
+            self.add_synapses(num_syn_each_type)
+
+    def instantiate(self):
+        morph = self.factory.morphology
+        sections = morph.instantiate(owner=self)
+        self.all_sections = sections
+        self.soma = sections[morph.soma_index] if morph.soma_index >= 0 else None
+        self.dendrites = [sections[k] for k in morph.dendrite_indices]
+        self.axon = [sections[k] for k in morph.axon_indices]
+
+    def assign_biophysics(self):
+        sections = self.all_sections
+        self.region_lists = region_section_lists(
+            {name: [sections[k] for k in idx] for name, idx in self.factory.region_indices.items()})
+        set_section_params(self.region_lists['all'], {'Ra': self.Ra, 'cm': self.cm})
+        self.biophysics_spec = self.factory.biophysics_spec
+        apply_biophysics(self.biophysics_spec, self.region_lists, origin=self.soma)
+
+    def __repr__(self):
+        return f"{self.prototype_class.__name__}Clone[{self.cell_id}]"
+
+    def add_synapses(self, num_syn_each_type=10):
+        """Same placement as RealisticNeuronTemplate, drawn from this cell's own RNG."""
+        self.syn_E_list, self.syn_I_list = place_synapse_placeholders(
+            self.all_sections, self.segment_index, num_syn_each_type, self.rng)
+
+
+class PopulationFactory:
+    """Snapshot of a built prototype cell from which ClonedCells are created."""
+    def __init__(self, prototype):
+        if not prototype.all_sections:
+            raise ValueError(f"Prototype cell {prototype.cell_id} has no sections to clone")
+        self.prototype_class = type(prototype)
+        self.swc_file = prototype.swc_file
+        self.Ra = prototype.Ra
+        self.cm = prototype.cm
+        self.v_init = prototype.v_init
+        self.morphology = MorphologyData.from_sections(prototype.all_sections, prototype.soma, prototype.axon)
+        #regions are stored as indices into all_sections so they map onto every clone
+        index = {sec: k for k, sec in enumerate(prototype.all_sections)}
+        self.region_indices = {name: [index[sec] for sec in secs]
+                               for name, secs in prototype._region_sections().items()}
+        self.biophysics_spec = prototype.biophysics_spec
+        self.segment_index = getattr(prototype, 'segment_index', None)
+        if self.segment_index is None:
+            self.segment_index = SegmentIndex.from_sections(prototype.all_sections, prototype.soma, prototype.axon)
+
+    def clone(self, cell_id, seed=0, num_syn_each_type=10, staged=False):
+        return ClonedCell(cell_id, self, seed, num_syn_each_type, staged)
+
+    def build(self, n, first_id=0, seed=0, num_syn_each_type=10):
+        """n clones with ids first_id..first_id+n-1."""
+        return [self.clone(first_id + k, seed, num_syn_each_type) for k in range(n)]
+
+
+def clone_population(prototype, n, first_id=0, seed=0, num_syn_each_type=10):
+    """Convenience wrapper: PopulationFactory(prototype).build(...)."""
+    return PopulationFactory(prototype).build(n, first_id, seed, num_syn_each_type)
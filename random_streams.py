@@ -0,0 +1,52 @@
+###                    ###
+###~~~RANDOM STREAMS~~~###
+###                    ###
+"""Counter-based random streams keyed by (global seed, gid, purpose).
+
+Every stochastic choice of model construction draws from its own Philox
+generator whose key is (seed, purpose, gid), so a cell's inputs, synapse
+sites and drive train are the same whichever rank, thread or worker builds
+it and in whatever order. Philox is a keyed block cipher over a counter:
+distinct keys give independent streams without any hashing or coordination,
+and creating one costs a few microseconds. NetStims get the matching
+Random123 stream in NEURON (noiseFromRandom123).
+
+    streams = RandomStreams(seed)
+    rng = streams.generator(gid, "synapses")
+"""
+import numpy as np
+
+PURPOSES = {
+    "connectivity": 1, #inputs of a postsynaptic gid
+    "synapses": 2, #synapse sites on a cell
+    "drive": 3, #Poisson train of a drive fiber
+    "drive_fibers": 4, #which shared fibers a cell samples
+    "netstim": 5, #NEURON NetStim noise
+    "placement": 6, #cell positions (population-wide, gid 0)
+}
+GID_BITS = 40 #gid and purpose share the second key word: purpose << 40 | gid
+
+
+class RandomStreams:
+    """Source of per-(gid, purpose) generators for one global seed; seed=None picks one at random."""
+    def __init__(self, seed=None):
+        self.seed = int(np.random.SeedSequence().entropy % (1 << 63)) if seed is None else int(seed)
+
+    def key(self, gid, purpose):
+        #negative gids (e.g. prototype cells) wrap into the 40-bit range
+        return np.array([self.seed & ((1 << 64) - 1),
+                         (PURPOSES[purpose] << GID_BITS) | (int(gid) & ((1 << GID_BITS) - 1))], dtype=np.uint64)
+
+    def generator(self, gid, purpose):
+        """np.random.Generator of the (gid, purpose) stream, always starting at counter 0."""
+        return np.random.Generator(np.random.Philox(key=self.key(gid, purpose)))
+
+    def netstim_noise(self, netstim, gid, purpose="netstim"):
+        """Give a NetStim its own Random123 stream (ids: gid, purpose, seed)."""
+        netstim.noiseFromRandom123(int(gid), PURPOSES[purpose], self.seed % (1 << 32))
+        return netstim
+
+
+def as_streams(seed):
+    """RandomStreams from a seed (int or None), or the object itself if it already is one."""
+    return seed if isinstance(seed, RandomStreams) else RandomStreams(seed)
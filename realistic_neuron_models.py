@@ -2,19 +2,28 @@ from neuron import h
 #import lfpykit
 from LFPy import Cell as LFPyCell # Correct import
 import numpy as np
-import random
 import os
+from biophysics import apply_biophysics, region_section_lists
+from mechanisms import load_mechanisms
+from morphology_cache import MorphologyData, get_cached_morphology, morphology_key, store_morphology
+from random_streams import RandomStreams
+from segment_index import get_segment_index, place_synapse_placeholders
 
 #Base class for basic neuron morphology using lfpykit
 class RealisticNeuronTemplate:
     """Base class using LFPy to handle morphology and basic setup.""" # User comment retained
-    def __init__(self, cell_id, swc_file, Ra=150.0, cm=1.0, v_init=-65.0, nsegs_method='lambda_f', lambda_f=100):
+    def __init__(self, cell_id, swc_file, Ra=150.0, cm=1.0, v_init=-65.0, nsegs_method='lambda_f', lambda_f=100,
+                 use_morphology_cache=True, morphology_cache_dir=None, synapse_seed=None):
         self.cell_id = cell_id
         self.swc_file = swc_file
         self.Ra = Ra
         self.cm = cm
         self.v_init = v_init
+        #None keeps placement unseeded, as before; an int gives the cell its own (seed, cell_id, "synapses") stream
+        self.rng = (np.random.default_rng() if synapse_seed is None
+                    else RandomStreams(synapse_seed).generator(cell_id, "synapses"))
         print(f"Initializing RealisticNeuronTemplate {self.cell_id} from {self.swc_file}...")
+        load_mechanisms() #compiles/loads Im.mod and Kv3.mod once per process, fails fast if missing
 
         Rm = 30000.0
         self.g_pas = 1.0 / Rm
@@ -36,16 +45,56 @@ class RealisticNeuronTemplate:
             'lambda_f': lambda_f,
             'delete_sections': False # Keep this False to access sections
         }
-        print(f"  Loading Cell {self.cell_id} morphology using LFPy...")
-        self.cell = LFPyCell(**self.cell_parameters)
-
-        self.all_sections = list(self.cell.allseclist)
-        print(f"  Successfully loaded {len(self.all_sections)} sections (from Python list).")
 
         self.soma = None
         self.dendrites = []
         self.axon = []
 
+        morph_key = None
+        morph = None
+        if use_morphology_cache:
+            morph_key = morphology_key(swc_file, Ra, cm, nsegs_method, lambda_f)
+            morph = get_cached_morphology(morph_key, morphology_cache_dir)
+        self.morphology_key = morph_key
+
+        if morph is not None:
+            #Cache hit: build sections from stored arrays, LFPy only wraps them
+            print(f"  Loading Cell {self.cell_id} morphology from cache ({morph_key})...")
+            sections = morph.instantiate(owner=self)
+            seclist = h.SectionList()
+            for sec in sections:
+                seclist.append(sec=sec)
+            self.cell_parameters['morphology'] = seclist
+            self.cell_parameters['nsegs_method'] = None #nseg already restored from cache
+            self.cell = LFPyCell(**self.cell_parameters)
+            self.all_sections = sections
+            if morph.soma_index >= 0:
+                self.soma = sections[morph.soma_index]
+            self.dendrites = [sections[k] for k in morph.dendrite_indices]
+            self.axon = [sections[k] for k in morph.axon_indices]
+            print(f"  Restored {morph.n_sections} sections ({morph.n_segments} segments), "
+                  f"{len(self.dendrites)} dendrite and {len(self.axon)} axon sections.")
+        else:
+            print(f"  Loading Cell {self.cell_id} morphology using LFPy...")
+            self.cell = LFPyCell(**self.cell_parameters)
+
+            self.all_sections = list(self.cell.allseclist)
+            print(f"  Successfully loaded {len(self.all_sections)} sections (from Python list).")
+            self._classify_sections()
+            if morph_key is not None and self.all_sections:
+                store_morphology(morph_key, MorphologyData.from_sections(self.all_sections, self.soma, self.axon),
+                                 morphology_cache_dir)
+
+        if not self.soma: print(f"  WARNING: Soma section not successfully identified for cell {self.cell_id}!")
+
+        self._assign_biophysics()
+
+        self.syn_E_list = []
+        self.syn_I_list = []
+        self._add_synapse_placeholders()
+
+    def _classify_sections(self):
+        """Split all_sections into soma (largest diameter), axon and dendrites."""
         if not self.all_sections:
              print("  WARNING: No sections loaded, cannot identify parts.")
         else:
@@ -70,13 +119,22 @@ class RealisticNeuronTemplate:
                      self.dendrites.append(sec)
             print(f"  Identified {len(self.dendrites)} dendrite sections and {len(self.axon)} axon sections (heuristic).")
 
-        if not self.soma: print(f"  WARNING: Soma section not successfully identified for cell {self.cell_id}!")
-
-        self._assign_biophysics()
+    def _region_sections(self):
+        """Named groups of sections that a biophysics spec can refer to."""
+        return {
+            'all': self.all_sections,
+            'soma': [self.soma] if self.soma else [],
+            'dend': self.dendrites,
+            'axon': self.axon,
+        }
 
-        self.syn_E_list = []
-        self.syn_I_list = []
-        self._add_synapse_placeholders()
+    def _biophysics_spec(self):
+        """Mechanism -> region -> {parameter: value or f(distance from soma, um)}."""
+        return {
+            'pas': {'all': {'g_pas': self.g_pas, 'e_pas': self.e_pas}},
+            'hh': {'all': {'gnabar_hh': self.gnabar_hh, 'gkbar_hh': self.gkbar_hh, 'gl_hh': self.gl_hh,
+                           'ena': self.ena, 'ek': self.ek}},
+        }
 
     def _assign_biophysics(self):
         """Insert mechanisms and set parameters for all sections.""" # Retained docstring
@@ -85,31 +143,12 @@ class RealisticNeuronTemplate:
             print("    No sections found in list, cannot assign biophysics.")
             return
 
-        num_inserted_pas = 0
-        num_inserted_hh = 0
-        for sec in self.all_sections:
-            if h.name_declared('pas'):
-                sec.insert('pas')
-                sec.g_pas = self.g_pas
-                sec.e_pas = self.e_pas
-                num_inserted_pas += 1
-            else:
-                 print("    WARNING: 'pas' mechanism not found/loaded. Leak current might be missing or rely solely on hh's gl_hh.")
-
-            if h.name_declared('hh'):
-                sec.insert('hh')
-                sec.gnabar_hh = self.gnabar_hh
-                sec.gkbar_hh = self.gkbar_hh
-                sec.gl_hh = self.gl_hh
-                sec.ena = self.ena
-                sec.ek = self.ek
-                num_inserted_hh += 1
-            else:
-                print("    ERROR: 'hh' mechanism not found/loaded. Cannot simulate spiking!")
-
-        print(f"    Inserted 'pas' into {num_inserted_pas} sections.")
-        print(f"    Inserted 'hh' into {num_inserted_hh} sections.")
-
+        #mechanism availability is checked once by load_mechanisms() in __init__
+        self.biophysics_spec = self._biophysics_spec()
+        self.region_lists = region_section_lists(self._region_sections())
+        counts = apply_biophysics(self.biophysics_spec, self.region_lists, origin=self.soma)
+        for mech, count in counts.items():
+            print(f"    Inserted '{mech}' into {count} sections.")
 
     def _add_synapse_placeholders(self, num_syn_each_type=10):
         """Adds placeholder synapses to somewhat realistic locations.""" # User comment retained
@@ -118,94 +157,49 @@ class RealisticNeuronTemplate:
              print("    No sections available for synapse placement.")
              return
 
-        possible_e_targets = self.dendrites if self.dendrites else ([self.soma] if self.soma else [])
-        possible_i_targets = ([self.soma] if self.soma else []) + self.dendrites[:min(len(self.dendrites), 5)]
-        if not possible_i_targets and possible_e_targets: possible_i_targets = possible_e_targets
-        if not possible_e_targets and not possible_i_targets:
-             print("    No suitable target sections (soma/dendrites) found for synapses.")
-             return
-
-        for _ in range(num_syn_each_type):
-            if possible_e_targets:
-                target_sec_e = random.choice(possible_e_targets)
-                loc = random.random()
-                syn_e = h.Exp2Syn(target_sec_e(loc))
-                syn_e.tau1, syn_e.tau2, syn_e.e = 0.2, 2.0, 0
-                self.syn_E_list.append(syn_e)
-            if possible_i_targets:
-                 target_sec_i = random.choice(possible_i_targets)
-                 loc = random.random()
-                 syn_i = h.Exp2Syn(target_sec_i(loc))
-                 syn_i.tau1, syn_i.tau2, syn_i.e = 0.5, 5.0, -75
-                 self.syn_I_list.append(syn_i)
-        print(f"    Finished adding synapse placeholders.")
+        #length-weighted sites drawn in one searchsorted pass; index shared per morphology
+        self.segment_index = get_segment_index(self.all_sections, self.soma, self.axon, key=self.morphology_key)
+        self.syn_E_list, self.syn_I_list = place_synapse_placeholders(
+            self.all_sections, self.segment_index, num_syn_each_type, self.rng)
+        n_point_processes = len({id(syn) for syn in self.syn_E_list + self.syn_I_list})
+        print(f"    Finished adding synapse placeholders ({n_point_processes} point processes after coalescing).")
 
 # --- Specific Cell Type Classes ---
 
 class L23PyramidalCell(RealisticNeuronTemplate):
     """ Inherits from base, adds Pyramidal specific channels like Im """ # User comment retained
+    gbar_im_initial_guess = 0.0001
+    n_perisomatic_dendrites = 10 #Im goes on the soma and the first few dendrite sections
+
     def __init__(self, cell_id, swc_file, **kwargs):
         super().__init__(cell_id, swc_file, **kwargs)
-        print(f"  Applying L2/3 Pyramidal specifics to Cell {self.cell_id}...")
-
-        gbar_im_initial_guess = 0.0001
-        im_mech_name = 'Im'
-
-        if h.name_declared(im_mech_name):
-            target_sections = ([self.soma] if self.soma else []) + self.dendrites[:min(len(self.dendrites), 10)]
-            if not target_sections and self.all_sections: target_sections = self.all_sections
-            count = 0
-            for sec in target_sections:
-                 if not hasattr(sec, 'gbar_Im'):
-                     sec.insert(im_mech_name)
-
-                 im_param_name = 'gbar_Im' 
-
-                 try:
-                     setattr(sec, im_param_name, gbar_im_initial_guess)
-                     count += 1
-                 except AttributeError:
-                      try:
-                          im_param_name_alt = 'gbar' 
-                          setattr(sec, im_param_name_alt, gbar_im_initial_guess)
-                          count += 1
-                          print(f"    Note: Used '{im_param_name_alt}' instead of '{im_param_name}' for {sec.name()}")
-                      except AttributeError:
-                           print(f"    WARNING: Could not set '{im_param_name}' or '{im_param_name_alt}'. Check parameter name in {im_mech_name}.mod")
-
-            print(f"    Applied '{im_mech_name}' to {count} sections with initial gbar = {gbar_im_initial_guess:.5f}")
-        else:
-            print(f"    WARNING: '{im_mech_name}' mechanism not found/loaded. Cannot insert.")
+        print(f"  Applied L2/3 Pyramidal specifics (Im, gbar = {self.gbar_im_initial_guess:.5f}) to Cell {self.cell_id}")
+
+    def _region_sections(self):
+        regions = super()._region_sections()
+        perisomatic = regions['soma'] + self.dendrites[:self.n_perisomatic_dendrites]
+        regions['perisomatic'] = perisomatic if perisomatic else self.all_sections
+        return regions
+
+    def _biophysics_spec(self):
+        spec = super()._biophysics_spec()
+        spec['Im'] = {'perisomatic': {'gbar_Im': self.gbar_im_initial_guess}}
+        return spec
 
 class L23BasketCell(RealisticNeuronTemplate):
     """ Inherits from base, adds Basket cell specific channels like Kv3 """ 
+    gbar_kv3_initial_guess = 0.01
+
     def __init__(self, cell_id, swc_file, **kwargs):
         super().__init__(cell_id, swc_file, **kwargs)
-        print(f"  Applying Basket Cell specifics to Cell {self.cell_id}...")
-
-        kv3_mech_name = 'Kv3_1' 
-        gbar_kv3_initial_guess = 0.01
-
-        if h.name_declared(kv3_mech_name):
-            target_sections = ([self.soma] if self.soma else [])
-            if not target_sections and self.all_sections: target_sections = self.all_sections
-            count = 0
-            for sec in target_sections:
-               kv3_param_name = 'gbar_Kv3_1' 
-
-               if not hasattr(sec, kv3_param_name):
-                   sec.insert(kv3_mech_name)
-               try:
-                   setattr(sec, kv3_param_name, gbar_kv3_initial_guess)
-               except AttributeError:
-                    try:
-                        kv3_param_name_alt = 'gbar' 
-                        setattr(sec, kv3_param_name_alt, gbar_kv3_initial_guess)
-                        print(f"    Note: Used '{kv3_param_name_alt}' instead of '{kv3_param_name}' for {sec.name()}")
-                    except AttributeError:
-                         print(f"    WARNING: Could not set '{kv3_param_name}' or '{kv3_param_name_alt}'. Check parameter name in {kv3_mech_name}.mod")
-               count += 1
-            print(f"    Applied '{kv3_mech_name}' to {count} sections with initial gbar = {gbar_kv3_initial_guess:.4f}")
-        else:
-            print(f"    WARNING: '{kv3_mech_name}' mechanism not found/loaded.")
+        print(f"  Applied Basket Cell specifics (Kv3_1, gbar = {self.gbar_kv3_initial_guess:.4f}) to Cell {self.cell_id}")
+
+    def _region_sections(self):
+        regions = super()._region_sections()
+        regions['kv3'] = regions['soma'] if regions['soma'] else self.all_sections
+        return regions
 
+    def _biophysics_spec(self):
+        spec = super()._biophysics_spec()
+        spec['Kv3_1'] = {'kv3': {'gbar_Kv3_1': self.gbar_kv3_initial_guess}}
+        return spec
@@ -0,0 +1,243 @@
+###                        ###
+###~~~STREAMING RECORDER~~~###
+###                        ###
+"""Run a simulation in fixed time chunks and stream spikes/voltages to disk.
+
+After every h.continuerun() window the recorded h.Vectors are written to an
+appendable store and cleared, so peak memory depends on the chunk length,
+not on the simulation length. The store is HDF5 when h5py is installed and a
+directory of per-chunk .npz files otherwise; load_spikes()/load_voltages()
+read either back.
+"""
+import glob
+import os
+
+import numpy as np
+from neuron import h
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+h.load_file("stdrun.hoc")
+
+
+class _HDF5Store:
+    """spikes/times, spikes/ids, voltages/t and voltages/v (samples x cells), all resizable."""
+    def __init__(self, path, voltage_ids):
+        self.file = h5py.File(path, "w")
+        spikes = self.file.create_group("spikes")
+        spikes.create_dataset("times", shape=(0,), maxshape=(None,), dtype="f8", chunks=(65536,))
+        spikes.create_dataset("ids", shape=(0,), maxshape=(None,), dtype="i8", chunks=(65536,))
+        voltages = self.file.create_group("voltages")
+        voltages.create_dataset("cell_ids", data=np.asarray(voltage_ids, dtype=np.int64))
+        voltages.create_dataset("t", shape=(0,), maxshape=(None,), dtype="f8", chunks=(65536,))
+        n = len(voltage_ids)
+        if n:
+            voltages.create_dataset("v", shape=(0, n), maxshape=(None, n), dtype="f4",
+                                    chunks=(max(65536 // n, 1), n))
+
+    @staticmethod
+    def _append(dataset, data):
+        start = dataset.shape[0]
+        dataset.resize(start + data.shape[0], axis=0)
+        dataset[start:] = data
+
+    def append(self, spike_times, spike_ids, t, v):
+        self._append(self.file["spikes/times"], spike_times)
+        self._append(self.file["spikes/ids"], spike_ids)
+        if "v" in self.file["voltages"]:
+            self._append(self.file["voltages/t"], t)
+            self._append(self.file["voltages/v"], v)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class _NPZStore:
+    """One chunk_#####.npz per window inside a directory."""
+    def __init__(self, path, voltage_ids):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        for old in glob.glob(os.path.join(path, "chunk_*.npz")):
+            os.remove(old)
+        self.voltage_ids = np.asarray(voltage_ids, dtype=np.int64)
+        self.n_chunks = 0
+
+    def append(self, spike_times, spike_ids, t, v):
+        np.savez(os.path.join(self.path, f"chunk_{self.n_chunks:05d}.npz"),
+                 spike_times=spike_times, spike_ids=spike_ids, t=t, v=v, cell_ids=self.voltage_ids)
+        self.n_chunks += 1
+
+    def close(self):
+        pass
+
+
+def _drop_front(vec, n):
+    """Remove the first n samples of a recording vector, keeping any later ones."""
+    if n >= vec.size():
+        vec.resize(0)
+    elif n > 0:
+        vec.remove(0, n - 1) #end index is inclusive
+
+
+def _is_hdf5(path):
+    return path.endswith((".h5", ".hdf5"))
+
+
+class StreamingRecorder:
+    """Spike and voltage recording that is flushed to disk every chunk_duration ms.
+
+    path ending in .h5/.hdf5 selects HDF5 (needs h5py), anything else is a
+    directory of .npz chunks.
+    """
+    def __init__(self, path, chunk_duration=100.0, voltage_dt=None):
+        if _is_hdf5(path) and h5py is None:
+            raise ImportError("h5py is required for an HDF5 recording store; use a directory path for .npz chunks")
+        self.path = path
+        self.chunk_duration = float(chunk_duration)
+        self.voltage_dt = voltage_dt #None samples every time step
+        self.store = None
+
+        self.spike_times_vec = h.Vector()
+        self.spike_ids_vec = h.Vector()
+        self.spike_recorders = []
+        self.t_vec = None
+        self.voltage_ids = []
+        self.voltage_vecs = []
+        self.flush_hooks = [] #called with no arguments after every flush (e.g. lfp.LFPRecorder.flush)
+
+    def _new_record_vector(self, ref):
+        if self.voltage_dt is None:
+            return h.Vector().record(ref)
+        return h.Vector().record(ref, self.voltage_dt)
+
+    def record_spikes(self, cells, threshold, ids=None):
+        """Threshold detector on soma(0.5) of every cell; ids default to list position."""
+        ids = range(len(cells)) if ids is None else ids
+        for cell_id, soma in zip(ids, cells):
+            nc = h.NetCon(soma(0.5)._ref_v, None, sec=soma)
+            nc.threshold = threshold
+            nc.record(self.spike_times_vec, self.spike_ids_vec, int(cell_id))
+            self.spike_recorders.append(nc)
+
+    def record_voltage(self, cell_id, seg):
+        """Sample seg.v (e.g. soma(0.5)) into the store under cell_id."""
+        if self.t_vec is None:
+            self.t_vec = self._new_record_vector(h._ref_t)
+        self.voltage_ids.append(int(cell_id))
+        self.voltage_vecs.append(self._new_record_vector(seg._ref_v))
+
+    def current_spikes(self):
+        """Zero-copy views of the spikes recorded since the last flush."""
+        return self.spike_times_vec.as_numpy(), self.spike_ids_vec.as_numpy()
+
+    def flush(self):
+        """Append everything recorded since the last flush to the store and clear the vectors.
+
+        Voltage vectors can differ by a sample at a window edge: only the
+        samples all of them have are written, the rest stay in the vectors and
+        start the next chunk.
+        """
+        spike_times, spike_ids = self.current_spikes()
+        n = 0
+        if self.t_vec is not None:
+            t = self.t_vec.as_numpy()
+            n = min([t.size] + [vec.size() for vec in self.voltage_vecs])
+            v = np.empty((n, len(self.voltage_vecs)), dtype=np.float32)
+            for k, vec in enumerate(self.voltage_vecs):
+                v[:, k] = vec.as_numpy()[:n]
+            t = t[:n]
+        else:
+            t = np.empty(0)
+            v = np.empty((0, 0), dtype=np.float32)
+        self.store.append(spike_times, spike_ids.astype(np.int64), t, v)
+
+        self.spike_times_vec.resize(0)
+        self.spike_ids_vec.resize(0)
+        if self.t_vec is not None:
+            for vec in [self.t_vec] + self.voltage_vecs:
+                _drop_front(vec, n)
+        for hook in self.flush_hooks:
+            hook()
+
+    def run(self, tstop, initialize=True):
+        """h.stdinit() then h.continuerun() in chunk_duration windows, flushing after each.
+
+        initialize=False continues from the current h.t (e.g. after checkpoint.warm_start).
+        """
+        self.store = _HDF5Store(self.path, self.voltage_ids) if _is_hdf5(self.path) else _NPZStore(self.path, self.voltage_ids)
+        h.tstop = tstop
+        if initialize:
+            h.stdinit()
+        try:
+            t_next = h.t
+            while t_next < tstop:
+                t_next = min(t_next + self.chunk_duration, tstop)
+                h.continuerun(t_next)
+                self.flush()
+        finally:
+            self.store.close()
+
+
+def _npz_chunks(path):
+    return sorted(glob.glob(os.path.join(path, "chunk_*.npz")))
+
+
+def iter_spike_chunks(path, block_size=1 << 20):
+    """(times, ids) blocks of a recorder store in recording order, for constant-memory readers."""
+    if _is_hdf5(path):
+        with h5py.File(path, "r") as f:
+            times, ids = f["spikes/times"], f["spikes/ids"]
+            for start in range(0, times.shape[0], block_size):
+                yield times[start:start + block_size], ids[start:start + block_size]
+        return
+    for chunk in _npz_chunks(path):
+        with np.load(chunk) as data:
+            yield data["spike_times"], data["spike_ids"]
+
+
+def iter_voltage_chunks(path, block_size=1 << 16):
+    """(t, cell_ids, v) blocks of a recorder store in time order; v is samples x cells here."""
+    if _is_hdf5(path):
+        with h5py.File(path, "r") as f:
+            cell_ids = f["voltages/cell_ids"][:]
+            if "v" not in f["voltages"]:
+                return
+            t, v = f["voltages/t"], f["voltages/v"]
+            for start in range(0, t.shape[0], block_size):
+                yield t[start:start + block_size], cell_ids, v[start:start + block_size]
+        return
+    for chunk in _npz_chunks(path):
+        with np.load(chunk) as data:
+            yield data["t"], data["cell_ids"], data["v"]
+
+
+def load_spikes(path):
+    """(times, ids) arrays from a recorder store."""
+    times, ids = [], []
+    for chunk_times, chunk_ids in iter_spike_chunks(path):
+        times.append(chunk_times)
+        ids.append(chunk_ids)
+    if not times:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+    return np.concatenate(times), np.concatenate(ids)
+
+
+def load_voltages(path):
+    """(t, cell_ids, v) from a recorder store; v has one row per recorded cell."""
+    if _is_hdf5(path):
+        with h5py.File(path, "r") as f:
+            cell_ids = f["voltages/cell_ids"][:]
+            if "v" not in f["voltages"]:
+                return np.empty(0), cell_ids, np.empty((0, 0))
+            return f["voltages/t"][:], cell_ids, f["voltages/v"][:].T
+    ts, vs, cell_ids = [], [], np.empty(0, dtype=np.int64)
+    for t, cell_ids, v in iter_voltage_chunks(path):
+        ts.append(t)
+        vs.append(v)
+    if not ts:
+        return np.empty(0), cell_ids, np.empty((cell_ids.size, 0))
+    return np.concatenate(ts), cell_ids, np.concatenate(vs).T
@@ -0,0 +1,221 @@
+###               ###
+###~~~REDUCTION~~~###
+###               ###
+"""Collapse the dendritic and axonal trees of a realistic cell into a few equivalent cylinders.
+
+Every tree that leaves the soma (the soma/dendrite/axon classification of
+RealisticNeuronTemplate) becomes one cylinder, after Bush & Sejnowski (1993):
+it has the stem's diameter, its length keeps the mean electrotonic length from
+the stem to the tips, and cm and all conductances are scaled so that it has
+the tree's membrane area. Every original segment is mapped onto its cylinder
+by normalised electrotonic distance; a cylinder segment gets the area-weighted
+parameters of the original segments mapped onto it, so regional and
+distance-dependent biophysics carry over. Synapse sites are drawn on the full
+cell's SegmentIndex as before and moved to the mapped location.
+
+    plan = ReductionPlan.from_cell(full_cell)
+    reduced = ReducedCell(0, plan, seed=1)
+
+benchmarks/reduction.py compares reduced and full cells under the
+test_realistic_cell.py IClamp protocol.
+"""
+import numpy as np
+from neuron import h
+
+from random_streams import RandomStreams
+from segment_index import SegmentIndex, get_segment_index, place_synapse_placeholders
+
+
+def _lambda_nseg(L, diam, Ra, cm, lambda_f=100, min_nseg=3):
+    """Odd nseg from NEURON's d_lambda rule (segments <= 0.1 AC length constant at lambda_f Hz)."""
+    lam = 1e5 * np.sqrt(diam / (4 * np.pi * lambda_f * Ra * cm))
+    return max(int((L / (0.1 * lam) + 0.9) / 2) * 2 + 1, min_nseg)
+
+
+class ReductionPlan:
+    """Geometry, parameters and segment map of a reduced cell, read once from a built full cell."""
+    def __init__(self, cylinders, segment_index, biophysics_spec, key):
+        self.cylinders = cylinders #dicts: name, kind, L, diam, nseg, Ra, parent_x, mechs, cm, params
+        self.segment_index = segment_index #full cell's SegmentIndex with sec_index/x moved onto cylinders
+        self.biophysics_spec = biophysics_spec
+        self.key = key
+
+    @property
+    def n_segments(self):
+        return sum(cyl["nseg"] for cyl in self.cylinders)
+
+    @classmethod
+    def from_cell(cls, cell, lambda_f=100, min_nseg=3):
+        sections = list(cell.all_sections)
+        soma = cell.soma
+        if soma is None:
+            raise ValueError(f"Cell {cell.cell_id} has no soma to reduce onto")
+        axon_set = set(cell.axon)
+        position = {sec: k for k, sec in enumerate(sections)}
+        mech_params = {mech: sorted({param for params in by_region.values() for param in params})
+                       for mech, by_region in cell.biophysics_spec.items()}
+
+        #~~~ TREES: stem (first section after the soma) of every section ~~~#
+        parent = {}
+        children = {sec: [] for sec in sections}
+        for sec in sections:
+            pseg = sec.parentseg()
+            if sec != soma and pseg is not None and pseg.sec in position:
+                parent[sec] = pseg
+                children[pseg.sec].append(sec)
+        stems = [sec for sec in sections if sec != soma and (sec not in parent or parent[sec].sec == soma)]
+
+        #~~~ PER SEGMENT: area, electrotonic distance from the stem, parameters ~~~#
+        seg_area = {}
+        seg_X = {} #section -> X at its segment centres, relative to a uniform membrane (um^0.5)
+        X_end = {}
+        seg_values = {}
+        for sec in sections:
+            segs = list(sec)
+            seg_area[sec] = np.array([seg.area() for seg in segs])
+            values = {"cm": np.array([seg.cm for seg in segs])}
+            for mech, params in mech_params.items():
+                present = sec.has_membrane(mech)
+                for param in params:
+                    values[param] = np.array([getattr(seg, param) if present else np.nan for seg in segs])
+            seg_values[sec] = values
+
+        for stem in stems:
+            stack = [(stem, 0.0)]
+            while stack:
+                sec, X_start = stack.pop()
+                dX = (sec.L / sec.nseg) / np.sqrt(np.maximum([seg.diam for seg in sec], 1e-6))
+                X = X_start + np.cumsum(dX)
+                seg_X[sec] = X - dX / 2
+                X_end[sec] = X[-1]
+                for child in children[sec]:
+                    #attachment point on the parent, interpolated along its electrotonic length
+                    stack.append((child, X_start + parent[child].x * (X[-1] - X_start)))
+
+        #~~~ CYLINDERS ~~~#
+        seg_cyl = {soma: np.zeros(soma.nseg, dtype=np.int32)}
+        seg_x = {soma: (np.arange(soma.nseg) + 0.5) / soma.nseg}
+        #the soma keeps its length, nseg and membrane area
+        cylinders = [cls._cylinder("soma", "soma", soma.L, seg_area[soma].sum() / (np.pi * soma.L), soma.nseg,
+                                   soma.Ra, 0.5, [soma], mech_params, seg_values, seg_area, [np.arange(soma.nseg)], 1.0)]
+        for stem in stems:
+            tree = []
+            stack = [stem]
+            while stack:
+                sec = stack.pop()
+                tree.append(sec)
+                stack.extend(children[sec])
+            X_tree = float(np.mean([X_end[sec] for sec in tree if not children[sec]])) #mean over tips
+            diam = float(next(iter(stem)).diam)
+            L = max(X_tree * np.sqrt(diam), 1e-3)
+            areas = np.concatenate([seg_area[sec] for sec in tree])
+            factor = areas.sum() / (np.pi * diam * L)
+            mean_cm = float((np.concatenate([seg_values[sec]["cm"] for sec in tree]) * areas).sum() / areas.sum())
+            nseg = _lambda_nseg(L, diam, stem.Ra, mean_cm * factor, lambda_f, min_nseg)
+            k = len(cylinders)
+            bins = []
+            for sec in tree:
+                u = np.clip(seg_X[sec] / X_tree, 0.0, 1.0) if X_tree > 0 else np.full(sec.nseg, 0.5)
+                seg_cyl[sec] = np.full(sec.nseg, k, dtype=np.int32)
+                seg_x[sec] = u
+                bins.append(np.minimum((u * nseg).astype(np.int64), nseg - 1))
+            pseg = parent.get(stem)
+            kind = "axon" if stem in axon_set else "dend"
+            cylinders.append(cls._cylinder(f"{kind}_{k}", kind, L, diam, nseg, stem.Ra,
+                                           pseg.x if pseg is not None else 0.5,
+                                           tree, mech_params, seg_values, seg_area, bins, factor))
+
+        #~~~ SEGMENT MAP: the full cell's index with locations moved onto the cylinders ~~~#
+        full_index = getattr(cell, "segment_index", None)
+        if full_index is None:
+            full_index = get_segment_index(sections, soma, cell.axon)
+        index = SegmentIndex(np.concatenate([seg_cyl[sec] for sec in sections]),
+                             np.concatenate([seg_x[sec] for sec in sections]),
+                             full_index.length, full_index.area, full_index.distance, full_index.region)
+        key = f"{getattr(cell, 'morphology_key', None)}_reduced_lf{lambda_f:g}_n{min_nseg}"
+        return cls(cylinders, index, cell.biophysics_spec, key)
+
+    @staticmethod
+    def _cylinder(name, kind, L, diam, nseg, Ra, parent_x, tree, mech_params, seg_values, seg_area, bins, factor):
+        """Per-segment cm and parameters: area-weighted mean of the original segments in each bin.
+
+        Conductances (g*) count as 0 where their mechanism is absent and are
+        scaled like cm by factor (tree area / cylinder area); other parameters
+        (reversal potentials) are averaged where present. Empty bins are
+        interpolated from their neighbours.
+        """
+        areas = np.concatenate([seg_area[sec] for sec in tree])
+        bins = np.concatenate(bins)
+        mechs = [mech for mech in mech_params if any(sec.has_membrane(mech) for sec in tree)]
+        params = {}
+        for param in seg_values[tree[0]]:
+            v = np.concatenate([seg_values[sec][param] for sec in tree])
+            present = ~np.isnan(v)
+            if not present.any():
+                continue #mechanism not in this tree
+            is_conductance = param == "cm" or param.startswith("g")
+            w = areas if is_conductance else np.where(present, areas, 0.0)
+            total = np.bincount(bins, weights=np.where(present, v, 0.0) * w, minlength=nseg)
+            norm = np.bincount(bins, weights=w, minlength=nseg)
+            ok = np.flatnonzero(norm > 0)
+            mean = np.interp(np.arange(nseg), ok, total[ok] / norm[ok])
+            params[param] = mean * factor if is_conductance else mean
+        return {"name": name, "kind": kind, "L": float(L), "diam": float(diam), "nseg": int(nseg), "Ra": float(Ra),
+                "parent_x": float(parent_x), "mechs": mechs, "cm": params.pop("cm"), "params": params}
+
+
+class ReducedCell:
+    """Soma plus one equivalent cylinder per tree; same attributes the network code uses, no LFPy cell."""
+    def __init__(self, cell_id, plan, seed=None, num_syn_each_type=10):
+        self.cell_id = cell_id
+        self.plan = plan
+        self.cell = None
+        self.morphology_key = plan.key
+        self.biophysics_spec = plan.biophysics_spec
+        self.segment_index = plan.segment_index
+        self.rng = np.random.default_rng() if seed is None else RandomStreams(seed).generator(cell_id, "synapses")
+        self.all_sections = []
+        self.dendrites = []
+        self.axon = []
+        for cyl in plan.cylinders:
+            sec = h.Section(name=cyl["name"], cell=self)
+            sec.L, sec.diam, sec.nseg, sec.Ra = cyl["L"], cyl["diam"], cyl["nseg"], cyl["Ra"]
+            self.all_sections.append(sec)
+            if cyl["kind"] == "dend":
+                self.dendrites.append(sec)
+            elif cyl["kind"] == "axon":
+                self.axon.append(sec)
+        self.soma = self.all_sections[0]
+        for sec, cyl in zip(self.all_sections[1:], plan.cylinders[1:]):
+            sec.connect(self.soma(cyl["parent_x"]), 0)
+        self._assign_biophysics()
+        self.syn_E_list, self.syn_I_list = place_synapse_placeholders(
+            self.all_sections, self.segment_index, num_syn_each_type, self.rng)
+
+    def _assign_biophysics(self):
+        for sec, cyl in zip(self.all_sections, self.plan.cylinders):
+            for mech in cyl["mechs"]:
+                sec.insert(mech)
+            for k, seg in enumerate(sec):
+                seg.cm = cyl["cm"][k]
+                for param, values in cyl["params"].items():
+                    setattr(seg, param, values[k])
+
+    def __repr__(self):
+        return f"Reduced[{self.cell_id}]"
+
+
+def delete_cell_sections(cell):
+    """Remove a cell's sections from the model (e.g. the full cell once its plan is taken)."""
+    for sec in cell.all_sections:
+        h.delete_section(sec=sec)
+    cell.all_sections = []
+
+
+def reduce_cell(cell, seed=None, num_syn_each_type=10, lambda_f=100, min_nseg=3):
+    """ReducedCell replacing cell: the full cell's sections are deleted."""
+    plan = ReductionPlan.from_cell(cell, lambda_f, min_nseg)
+    delete_cell_sections(cell)
+    reduced = ReducedCell(cell.cell_id, plan, seed, num_syn_each_type)
+    print(f"  Reduced Cell {cell.cell_id} to {len(plan.cylinders)} sections ({plan.n_segments} segments).")
+    return reduced
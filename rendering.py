@@ -0,0 +1,98 @@
+###               ###
+###~~~RENDERING~~~###
+###               ###
+"""Raster and voltage plots whose cost depends on the image size, not on the data size.
+
+Spikes are binned into a (neuron x time) count image with np.bincount and
+drawn with imshow, so 10^7 spikes cost one array of height x width counts
+instead of 10^7 scatter markers. Voltage traces are reduced to the min and
+max of every pixel column and drawn as a filled band, which looks the same as
+the full trace at that resolution. Both read a recorder store block by block
+(recorder.iter_spike_chunks/iter_voltage_chunks), so memory stays constant
+however long the run was.
+"""
+import numpy as np
+
+from recorder import iter_spike_chunks, iter_voltage_chunks
+
+DEFAULT_WIDTH = 2000 #pixel columns (time bins)
+DEFAULT_HEIGHT = 1000 #pixel rows (cell bins)
+
+
+def _spike_chunks(source):
+    """A recorder store path, or (times, ids) arrays already in memory."""
+    if isinstance(source, str):
+        return iter_spike_chunks(source)
+    return [source]
+
+
+def _voltage_chunks(source):
+    """A recorder store path, or (t, cell_ids, v) with v as cells x samples (load_voltages)."""
+    if isinstance(source, str):
+        return iter_voltage_chunks(source)
+    t, cell_ids, v = source
+    return [(t, cell_ids, np.asarray(v).T)]
+
+
+def spike_density(source, n_cells, t_start, t_stop, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT):
+    """(height, width) spike counts; row r covers cells r * n_cells / height onwards."""
+    height = min(height, n_cells)
+    counts = np.zeros(height * width, dtype=np.int64)
+    scale_t = width / (t_stop - t_start)
+    for times, ids in _spike_chunks(source):
+        times = np.asarray(times)
+        ids = np.asarray(ids).astype(np.int64, copy=False)
+        keep = (times >= t_start) & (times < t_stop) & (ids >= 0) & (ids < n_cells)
+        cols = ((times[keep] - t_start) * scale_t).astype(np.int64)
+        rows = ids[keep] * height // n_cells
+        counts += np.bincount(rows * width + np.minimum(cols, width - 1), minlength=height * width)
+    return counts.reshape(height, width)
+
+
+def minmax_decimate(source, t_start, t_stop, width=DEFAULT_WIDTH):
+    """Per-pixel-column (cell_ids, column centres, vmin, vmax); vmin/vmax are cells x width, NaN where empty."""
+    vmin = vmax = cell_ids = None
+    scale_t = width / (t_stop - t_start)
+    for t, ids, v in _voltage_chunks(source):
+        if vmin is None:
+            cell_ids = np.asarray(ids)
+            vmin = np.full((width, cell_ids.size), np.inf)
+            vmax = np.full((width, cell_ids.size), -np.inf)
+        if len(t) == 0:
+            continue
+        t = np.asarray(t)
+        v = np.asarray(v)
+        keep = (t >= t_start) & (t < t_stop)
+        t, v = t[keep], v[keep]
+        if t.size == 0:
+            continue
+        cols = np.minimum(((t - t_start) * scale_t).astype(np.int64), width - 1)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(cols)) + 1)) #t is sorted: one run per column
+        used = cols[starts]
+        vmin[used] = np.minimum(vmin[used], np.minimum.reduceat(v, starts, axis=0))
+        vmax[used] = np.maximum(vmax[used], np.maximum.reduceat(v, starts, axis=0))
+    centres = t_start + (np.arange(width) + 0.5) / scale_t
+    if vmin is None:
+        return np.empty(0, dtype=np.int64), centres, np.empty((0, width)), np.empty((0, width))
+    vmin[np.isinf(vmin)] = np.nan
+    vmax[np.isinf(vmax)] = np.nan
+    return cell_ids, centres, vmin.T, vmax.T
+
+
+def render_raster(ax, source, n_cells, t_start, t_stop, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT,
+                  cmap="gray_r", log=False):
+    """Spike density image on ax (same axes as the old scatter raster); returns the AxesImage."""
+    counts = spike_density(source, n_cells, t_start, t_stop, width, height)
+    image = np.log1p(counts) if log else counts
+    return ax.imshow(image, origin="lower", aspect="auto", interpolation="nearest", cmap=cmap,
+                     extent=(t_start, t_stop, -0.5, n_cells - 0.5), vmin=0, vmax=max(image.max(), 1))
+
+
+def render_voltages(ax, source, t_start, t_stop, width=DEFAULT_WIDTH, label=None):
+    """Min/max band per recorded cell on ax. label: cell id -> legend label."""
+    cell_ids, centres, vmin, vmax = minmax_decimate(source, t_start, t_stop, width)
+    for cell_id, lo, hi in zip(cell_ids.tolist(), vmin, vmax):
+        valid = np.isfinite(lo)
+        ax.fill_between(centres, lo, hi, where=valid, step="mid", linewidth=0.8,
+                        label=label(cell_id) if label else f"Cell {cell_id}")
+    return cell_ids
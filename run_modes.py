@@ -0,0 +1,153 @@
+###               ###
+###~~~RUN MODES~~~###
+###               ###
+"""Solver settings applied before h.stdinit()/h.run().
+
+enable_multithreading() turns on ParallelContext.nthread with the cells spread
+over threads by compartment count. A single large cell can instead be cut at
+its soma with multisplit so its subtrees are solved on different threads.
+
+configure_run_mode() picks the integrator: the fixed-step reference, global
+variable-step CVODE, or CVODE with a local time step per cell ("local_dt").
+The variable-step modes take long steps through silent stretches (before the
+drive or IClamp starts) and get an absolute tolerance per state variable.
+benchmarks/integrators.py compares them against the fixed-step reference.
+"""
+import itertools
+
+from neuron import h
+
+from load_balance import balanced_owners
+
+RUN_MODES = ("fixed", "cvode", "local_dt")
+
+#absolute tolerance of a state = atol x scale (cvode.atolscale). v is in mV and
+#moves by ~100 mV per spike, the gates live in 0..1
+DEFAULT_STATE_TOLERANCES = {
+    "v": 10.0,
+    "m_hh": 0.1,
+    "h_hh": 0.1,
+    "n_hh": 0.1,
+    "m_Im": 0.1,
+    "m_Kv3_1": 0.1,
+}
+
+_pc = None
+#hoc_internal_name() of somas already declared to multisplit; works for bare Sections too (not weak-referenceable).
+#The name holds the section's address, so disable_multithreading() forgets them before cells are freed.
+_split_cells = set()
+_split_ids = itertools.count() #one split id per cell, never reused
+
+
+def get_parallel_context():
+    global _pc
+    if _pc is None:
+        _pc = h.ParallelContext()
+    return _pc
+
+
+def _cell_sections(cell):
+    """Sections of a RealisticNeuronTemplate-like cell, or [cell] for a bare soma section."""
+    if hasattr(cell, "all_sections"):
+        return list(cell.all_sections)
+    return [cell]
+
+
+def _cell_soma(cell):
+    return cell.soma if hasattr(cell, "soma") else cell
+
+
+def compartment_count(cell):
+    return sum(sec.nseg for sec in _cell_sections(cell))
+
+
+def enable_fixed_step(cache_efficient=True):
+    """Fixed-step (cvode off) with cache-efficient data layout."""
+    h.cvode.use_local_dt(0)
+    h.cvode.active(0)
+    h.cvode.cache_efficient(1 if cache_efficient else 0)
+
+
+def _state_declared(state):
+    """True for "v" and for states of mechanisms that are loaded ("m_hh" -> hh)."""
+    if "_" not in state:
+        return True
+    return bool(h.name_declared(state.split("_", 1)[1]))
+
+
+def enable_variable_step(atol=1e-3, rtol=0.0, local_dt=False, state_tolerances=None):
+    """CVODE with per-state absolute tolerances; local_dt gives every cell its own step.
+
+    state_tolerances: {state: atol scale}, defaults to DEFAULT_STATE_TOLERANCES.
+    States of mechanisms that are not loaded are skipped.
+    """
+    h.cvode.active(1)
+    h.cvode.use_local_dt(1 if local_dt else 0)
+    h.cvode.atol(atol)
+    h.cvode.rtol(rtol)
+    h.cvode.condition_order(2) #interpolate threshold crossings, spike times are not snapped to steps
+    tolerances = DEFAULT_STATE_TOLERANCES if state_tolerances is None else state_tolerances
+    for state, scale in tolerances.items():
+        if _state_declared(state):
+            h.cvode.atolscale(state, scale)
+
+
+def configure_run_mode(mode="fixed", atol=1e-3, rtol=0.0, state_tolerances=None):
+    """Select the integrator: "fixed" (h.dt), "cvode" or "local_dt".
+
+    Call after enable_multithreading(), which resets to fixed step.
+    """
+    if mode == "fixed":
+        enable_fixed_step()
+    elif mode == "cvode":
+        enable_variable_step(atol, rtol, local_dt=False, state_tolerances=state_tolerances)
+    elif mode == "local_dt":
+        enable_variable_step(atol, rtol, local_dt=True, state_tolerances=state_tolerances)
+    else:
+        raise ValueError(f"Unknown run mode '{mode}', expected one of {RUN_MODES}")
+
+
+def enable_multithreading(nthread, cells, multisplit=None):
+    """Run the cells on nthread threads, balanced by compartment count.
+
+    multisplit: cut each cell at soma(0.5) so its subtrees can be placed on
+    different threads. Defaults to True when there are fewer cells than
+    threads (e.g. the single-cell test), where whole-cell partitioning
+    would leave threads idle.
+    """
+    pc = get_parallel_context()
+    enable_fixed_step()
+    cells = list(cells)
+    if multisplit is None:
+        multisplit = len(cells) < nthread
+
+    if multisplit:
+        for cell in cells:
+            soma = _cell_soma(cell)
+            if soma.hoc_internal_name() in _split_cells:
+                continue
+            pc.multisplit(0.5, next(_split_ids), sec=soma)
+            _split_cells.add(soma.hoc_internal_name())
+        pc.multisplit()
+        pc.nthread(nthread)
+        pc.partition() #NEURON balances the split pieces itself
+    else:
+        pc.nthread(nthread)
+        owners = balanced_owners([compartment_count(cell) for cell in cells], nthread)
+        roots = [h.SectionList() for _ in range(nthread)]
+        for cell, thread in zip(cells, owners.tolist()):
+            root = h.SectionRef(sec=_cell_sections(cell)[0]).root
+            roots[thread].append(sec=root)
+        for thread, seclist in enumerate(roots):
+            pc.partition(thread, seclist)
+    print(f"Running on {int(pc.nthread())} threads ({'multisplit' if multisplit else 'whole cells'}), "
+          f"{sum(compartment_count(cell) for cell in cells)} compartments")
+    return pc
+
+
+def disable_multithreading():
+    """Back to one thread; call before freeing multisplit cells so their split ids are forgotten."""
+    pc = get_parallel_context()
+    pc.nthread(1)
+    pc.partition()
+    _split_cells.clear()
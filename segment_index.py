@@ -0,0 +1,115 @@
+###                   ###
+###~~~SEGMENT INDEX~~~###
+###                   ###
+"""Per-segment geometry table for vectorised synapse placement.
+
+SegmentIndex holds, for every segment of a cell, its section index, x,
+length, membrane area, path distance to soma(0.5) and region label. Synapse
+sites are drawn in one np.searchsorted pass over the cumulative
+(length or area) x density weights, so sections get synapses in proportion
+to their size instead of uniformly per section. Indices are stored by
+section position, so one index can be shared by every cell with the same
+morphology (e.g. a prototype and its clones).
+"""
+import numpy as np
+from neuron import h
+
+SOMA, DEND, AXON = 0, 1, 2
+REGION_CODES = {"soma": SOMA, "dend": DEND, "axon": AXON}
+
+_index_cache = {} #morphology key -> SegmentIndex
+
+
+def uniform_density(distance):
+    return np.ones_like(distance)
+
+
+def perisomatic_density(distance, length_constant=50.0):
+    """Density falling off exponentially with path distance from the soma (um)."""
+    return np.exp(-distance / length_constant)
+
+
+class SegmentIndex:
+    """Flat arrays describing every segment of one morphology."""
+    def __init__(self, sec_index, x, length, area, distance, region):
+        self.sec_index = np.asarray(sec_index, dtype=np.int32)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.length = np.asarray(length, dtype=np.float64)
+        self.area = np.asarray(area, dtype=np.float64)
+        self.distance = np.asarray(distance, dtype=np.float64)
+        self.region = np.asarray(region, dtype=np.int8)
+
+    @property
+    def n_segments(self):
+        return int(self.x.size)
+
+    @classmethod
+    def from_sections(cls, sections, soma, axon):
+        axon_set = set(axon)
+        if soma is not None:
+            h.distance(0, 0.5, sec=soma)
+        sec_index, xs, length, area, distance, region = [], [], [], [], [], []
+        for k, sec in enumerate(sections):
+            code = SOMA if sec == soma else (AXON if sec in axon_set else DEND)
+            seg_length = sec.L / sec.nseg
+            for seg in sec:
+                sec_index.append(k)
+                xs.append(seg.x)
+                length.append(seg_length)
+                area.append(seg.area())
+                distance.append(h.distance(seg) if soma is not None else 0.0)
+                region.append(code)
+        return cls(sec_index, xs, length, area, distance, region)
+
+    def sample(self, n, rng, regions=("dend",), weight="length", density=None):
+        """Draw n segment indices with probability ~ weight x density(distance) within regions."""
+        mask = np.isin(self.region, [REGION_CODES[r] for r in regions])
+        w = np.where(mask, self.length if weight == "length" else self.area, 0.0)
+        if density is not None:
+            w = w * density(self.distance)
+        cdf = np.cumsum(w)
+        if n == 0 or cdf.size == 0 or cdf[-1] <= 0:
+            return np.empty(0, dtype=np.int64)
+        return np.searchsorted(cdf, rng.random(n) * cdf[-1], side="right")
+
+
+def get_segment_index(sections, soma, axon, key=None):
+    """SegmentIndex for these sections, reused across cells that share key."""
+    if key is not None and key in _index_cache:
+        return _index_cache[key]
+    index = SegmentIndex.from_sections(sections, soma, axon)
+    if key is not None:
+        _index_cache[key] = index
+    return index
+
+
+def _make_synapses(sections, index, seg_ids, tau1, tau2, e, coalesce):
+    """One Exp2Syn per drawn site, or per distinct segment when coalescing."""
+    if coalesce:
+        unique_ids, inverse = np.unique(seg_ids, return_inverse=True)
+    else:
+        unique_ids, inverse = seg_ids, np.arange(seg_ids.size)
+    made = []
+    for sec_k, x in zip(index.sec_index[unique_ids].tolist(), index.x[unique_ids].tolist()):
+        syn = h.Exp2Syn(sections[sec_k](x))
+        syn.tau1, syn.tau2, syn.e = tau1, tau2, e
+        made.append(syn)
+    return [made[k] for k in inverse.tolist()]
+
+
+def place_synapse_placeholders(sections, index, num_syn_each_type, rng, coalesce=True,
+                               e_density=uniform_density, i_density=perisomatic_density):
+    """(syn_E_list, syn_I_list) with num_syn_each_type entries each.
+
+    E synapses are spread over the dendrites by membrane length, I synapses over
+    soma and dendrites with a perisomatic density profile. Exp2Syn is linear in
+    its input events, so with coalesce=True sites that fall on the same segment
+    share one point process (the lists then contain repeated references, and
+    NetCons onto the shared synapse sum exactly as onto separate ones).
+    """
+    e_regions = ("dend",) if np.any(index.region == DEND) else ("soma",)
+    e_sites = index.sample(num_syn_each_type, rng, regions=e_regions, density=e_density)
+    i_sites = index.sample(num_syn_each_type, rng, regions=("soma", "dend"), weight="area", density=i_density)
+    syn_E_list = _make_synapses(sections, index, e_sites, 0.2, 2.0, 0, coalesce)
+    syn_I_list = _make_synapses(sections, index, i_sites, 0.5, 5.0, -75, coalesce)
+    return syn_E_list, syn_I_list
@@ -0,0 +1,122 @@
+###                     ###
+###~~~SPATIAL NETWORK~~~###
+###                     ###
+"""Cells placed in 3D and connected with distance-dependent probability and delay.
+
+Cells are placed in a cylindrical column (y is depth, 0 at the top, negative
+downwards) or in layer slabs of that column, E population first as in
+connectivity.py. Candidate pairs come from a scipy.spatial.cKDTree: only
+cells within cutoff of each other are ever looked at, so the build is
+O(N * k) in the number of neighbours k instead of O(N^2). That only holds if
+k does not grow with N: a fixed column filled with more cells gets denser, so
+k ~ N and the build is quadratic again. column_size() scales the column with
+N at a fixed cell density instead, which keeps k (about density x the
+volume within cutoff) constant. Each candidate
+connects with probability
+
+    p(d) = p_max * exp(-d^2 / (2 * length_constant^2))
+
+and its delay is min_delay + d / velocity (axonal conduction after the
+synaptic delay). The result is an ordinary Connectivity that also carries the
+positions, e.g. for lfp.LFPRecorder placements or plot_results.plot_positions.
+"""
+import numpy as np
+
+from connectivity import _block_edge_weights, connectivity_from_edges
+from random_streams import as_streams
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+def column_size(n_cells, density, aspect=2.5):
+    """(radius, depth) in um of a column holding n_cells at density (cells/mm^3); depth = aspect * radius."""
+    volume = n_cells / density * 1e9 #um^3
+    radius = (volume / (np.pi * aspect)) ** (1 / 3)
+    return radius, aspect * radius
+
+
+def place_column(n_cells, radius, depth, rng, top=0.0):
+    """n_cells x 3 positions (um) uniform in a vertical cylinder from top down to top - depth."""
+    r = radius * np.sqrt(rng.random(n_cells))
+    phi = 2 * np.pi * rng.random(n_cells)
+    y = top - depth * rng.random(n_cells)
+    return np.column_stack([r * np.cos(phi), y, r * np.sin(phi)])
+
+
+def place_layers(n_cells, layers, radius, rng):
+    """Positions in layer slabs of a column; layers: [(y_top, y_bottom, fraction of cells), ...].
+
+    Cells are assigned to layers by a multinomial draw on the fractions, and
+    returned in random layer order so E and I populations both span all layers.
+    """
+    fractions = np.array([fraction for _, _, fraction in layers], dtype=np.float64)
+    counts = rng.multinomial(n_cells, fractions / fractions.sum())
+    parts = [place_column(n, radius, y_top - y_bottom, rng, top=y_top)
+             for (y_top, y_bottom, _), n in zip(layers, counts.tolist())]
+    positions = np.concatenate(parts) if parts else np.empty((0, 3))
+    return positions[rng.permutation(n_cells)]
+
+
+def lfp_placements(positions, rng=None):
+    """(position, rotation) pairs for lfp.LFPRecorder; random rotation about the depth axis if rng is given."""
+    angles = np.zeros(len(positions)) if rng is None else 2 * np.pi * rng.random(len(positions))
+    return [(tuple(pos), (0.0, angle, 0.0)) for pos, angle in zip(positions.tolist(), angles.tolist())]
+
+
+def build_spatial_connectivity(positions, num_E, num_I, p_max, length_constant, cutoff, weights,
+                               min_delay=0.5, velocity=0.5, seed=None, rows_per_chunk=4096, gids=None):
+    """Distance-dependent random E/I network on placed cells.
+
+    p_max: connection probability at distance 0, a number or a dict per
+    EE/EI/IE/II block like weights. cutoff (um): pairs further apart never
+    connect. velocity: axonal conduction velocity in m/s (= mm/ms).
+    seed: int, None or a RandomStreams; every reciever's candidate inputs
+    (sorted by sender) are accepted with its own (seed, gid, "connectivity")
+    stream, so gids=[...] builds just the connections onto those cells.
+    Recievers are processed rows_per_chunk at a time against one KD-tree of all
+    cells, so memory stays at O(rows_per_chunk * k).
+    """
+    if cKDTree is None:
+        raise ImportError("scipy is required for spatial connectivity (scipy.spatial.cKDTree)")
+    positions = np.asarray(positions, dtype=np.float64)
+    n_cells = num_E + num_I
+    if positions.shape != (n_cells, 3):
+        raise ValueError(f"positions must be {n_cells} x 3, got {positions.shape}")
+    streams = as_streams(seed)
+    gids = np.arange(n_cells, dtype=np.int64) if gids is None else np.sort(np.asarray(gids, dtype=np.int64))
+    tree = cKDTree(positions)
+    um_per_ms = velocity * 1000.0
+
+    src_parts, tgt_parts, dist_parts = [], [], []
+    for start in range(0, gids.size, rows_per_chunk):
+        chunk = gids[start:start + rows_per_chunk]
+        pairs = cKDTree(positions[chunk]).sparse_distance_matrix(tree, cutoff, output_type="ndarray")
+        tgt = chunk[pairs["i"]]
+        src = pairs["j"].astype(np.int64)
+        d = pairs["v"]
+        #every reciever finds itself at d = 0: no autapses
+        keep = src != tgt
+        src, tgt, d = src[keep], tgt[keep], d[keep]
+        order = np.lexsort((src, tgt)) #group by reciever, senders ascending: the order its stream is read in
+        src, tgt, d = src[order], tgt[order], d[order]
+        post, counts = np.unique(tgt, return_counts=True)
+        u = np.concatenate([streams.generator(gid, "connectivity").random(n)
+                            for gid, n in zip(post.tolist(), counts.tolist())]) if post.size else np.empty(0)
+        p0 = _block_edge_weights(src, tgt, num_E, p_max) if isinstance(p_max, dict) else p_max
+        hit = u < p0 * np.exp(-d ** 2 / (2 * length_constant ** 2))
+        src_parts.append(src[hit])
+        tgt_parts.append(tgt[hit])
+        dist_parts.append(d[hit])
+
+    src = np.concatenate(src_parts) if src_parts else np.empty(0, dtype=np.int64)
+    tgt = np.concatenate(tgt_parts) if tgt_parts else np.empty(0, dtype=np.int64)
+    dist = np.concatenate(dist_parts) if dist_parts else np.empty(0)
+    return connectivity_from_edges(src, tgt, min_delay + dist / um_per_ms, num_E, num_I, weights, positions)
+
+
+def distances(conn):
+    """Distance (um) of every connection of a placed Connectivity, in CSR order."""
+    return np.linalg.norm(conn.positions[conn.sources()] - conn.positions[conn.indices], axis=1)
@@ -0,0 +1,156 @@
+###                    ###
+###~~~SPIKE ANALYSIS~~~###
+###                    ###
+"""Vectorised spike-train statistics on flat (times, ids) arrays.
+
+Everything works on the raster format the network scripts record: one array
+of spike times (ms) and one array of integer cell ids of the same length.
+Metrics are computed for all cells at once by sorting by (id, time) and
+using np.diff/np.bincount, with no per-neuron Python loops. Per-cell results
+are arrays of length n_cells with NaN where a cell has too few spikes.
+"""
+import numpy as np
+
+
+def _window(times, ids, t_start, t_stop):
+    times = np.asarray(times, dtype=np.float64)
+    ids = np.asarray(ids).astype(np.int64, copy=False)
+    if t_start is None and t_stop is None:
+        return times, ids
+    keep = np.ones(times.size, dtype=bool)
+    if t_start is not None:
+        keep &= times >= t_start
+    if t_stop is not None:
+        keep &= times < t_stop
+    return times[keep], ids[keep]
+
+
+def sort_by_cell(times, ids):
+    """Spikes sorted by (id, time)."""
+    order = np.lexsort((times, ids))
+    return times[order], ids[order]
+
+
+def spike_counts_per_cell(times, ids, n_cells, t_start=None, t_stop=None):
+    _, ids = _window(times, ids, t_start, t_stop)
+    return np.bincount(ids, minlength=n_cells)
+
+
+def firing_rates(times, ids, n_cells, t_start, t_stop):
+    """Mean rate (Hz) of every cell over [t_start, t_stop) ms."""
+    counts = spike_counts_per_cell(times, ids, n_cells, t_start, t_stop)
+    return counts / ((t_stop - t_start) / 1000.0)
+
+
+def isis(times, ids, t_start=None, t_stop=None):
+    """All inter-spike intervals and the cell each belongs to, grouped by cell in time order."""
+    times, ids = _window(times, ids, t_start, t_stop)
+    t_sorted, id_sorted = sort_by_cell(times, ids)
+    same_cell = id_sorted[1:] == id_sorted[:-1] #drop diffs that cross from one cell to the next
+    return np.diff(t_sorted)[same_cell], id_sorted[1:][same_cell]
+
+
+def isi_cv(times, ids, n_cells, t_start=None, t_stop=None, min_isis=2):
+    """Coefficient of variation of the ISIs of every cell."""
+    isi, isi_ids = isis(times, ids, t_start, t_stop)
+    n = np.bincount(isi_ids, minlength=n_cells)
+    total = np.bincount(isi_ids, weights=isi, minlength=n_cells)
+    total_sq = np.bincount(isi_ids, weights=isi * isi, minlength=n_cells)
+    cv = np.full(n_cells, np.nan)
+    valid = n >= max(min_isis, 1)
+    mean = total[valid] / n[valid]
+    var = np.maximum(total_sq[valid] / n[valid] - mean * mean, 0.0)
+    cv[valid] = np.sqrt(var) / mean
+    return cv
+
+
+def adaptation_ratios(times, ids, n_cells, t_start=None, t_stop=None):
+    """Last ISI / first ISI of every cell (NaN with fewer than two ISIs)."""
+    isi, isi_ids = isis(times, ids, t_start, t_stop)
+    n = np.bincount(isi_ids, minlength=n_cells)
+    indptr = np.zeros(n_cells + 1, dtype=np.int64)
+    np.cumsum(n, out=indptr[1:])
+    ratios = np.full(n_cells, np.nan)
+    valid = n >= 2
+    first = isi[indptr[:-1][valid]]
+    last = isi[indptr[1:][valid] - 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios[valid] = np.where(first > 1e-5, last / first, np.nan)
+    return ratios
+
+
+def binned_counts(times, ids, n_cells, t_start, t_stop, bin_size):
+    """(n_cells, n_bins) spike-count matrix in bins of bin_size ms."""
+    times, ids = _window(times, ids, t_start, t_stop)
+    n_bins = max(int(np.ceil((t_stop - t_start) / bin_size)), 1)
+    bins = np.minimum(((times - t_start) / bin_size).astype(np.int64), n_bins - 1)
+    return np.bincount(ids * n_bins + bins, minlength=n_cells * n_bins).reshape(n_cells, n_bins)
+
+
+def psth(times, t_start, t_stop, bin_size, n_cells=1):
+    """Population PSTH: (bin left edges, rate in Hz per cell)."""
+    times = np.asarray(times, dtype=np.float64)
+    edges = np.arange(t_start, t_stop + bin_size, bin_size)
+    counts, edges = np.histogram(times, bins=edges)
+    return edges[:-1], counts / (n_cells * bin_size / 1000.0)
+
+
+def fano_factor(counts):
+    """Per-cell variance/mean of a binned_counts matrix (NaN for silent cells)."""
+    mean = counts.mean(axis=1)
+    var = counts.var(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(mean > 0, var / mean, np.nan)
+
+
+def spike_count_correlations(counts):
+    """(n_cells, n_cells) Pearson correlation of binned counts; NaN rows/cols for silent cells."""
+    counts = np.asarray(counts, dtype=np.float64)
+    centered = counts - counts.mean(axis=1, keepdims=True)
+    norms = np.sqrt(np.einsum("ij,ij->i", centered, centered))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unit = centered / norms[:, None]
+    return unit @ unit.T
+
+
+def mean_pairwise_correlation(counts):
+    """Mean off-diagonal spike-count correlation over cells that fired."""
+    active = counts.sum(axis=1) > 0
+    corr = spike_count_correlations(counts[active])
+    n = corr.shape[0]
+    if n < 2:
+        return np.nan
+    return float((np.nansum(corr) - np.nansum(np.diag(corr))) / (n * (n - 1)))
+
+
+def synchrony(counts):
+    """Golomb chi: sqrt(var of the population-mean count / mean single-cell variance)."""
+    cell_var = counts.var(axis=1).mean()
+    if cell_var <= 0:
+        return np.nan
+    return float(np.sqrt(counts.mean(axis=0).var() / cell_var))
+
+
+def spike_time_deviation(ref_times, ref_ids, times, ids, n_cells):
+    """Spike-timing error of a raster against a reference raster (e.g. the fixed-step run).
+
+    The k-th spike of every cell is paired with the k-th reference spike of the
+    same cell. Returns (max |dt|, mean |dt|, n_unpaired): spikes beyond the
+    shorter of the two trains of a cell count as unpaired, not as timing error.
+    """
+    ref_t, ref_i = sort_by_cell(*_window(ref_times, ref_ids, None, None))
+    t, i = sort_by_cell(*_window(times, ids, None, None))
+    ref_counts = np.bincount(ref_i, minlength=n_cells)
+    counts = np.bincount(i, minlength=n_cells)
+    n_paired = np.minimum(ref_counts, counts)
+
+    def paired(t_sorted, id_sorted, cell_counts):
+        first = np.cumsum(cell_counts) - cell_counts
+        rank = np.arange(t_sorted.size) - first[id_sorted]
+        return t_sorted[rank < n_paired[id_sorted]]
+
+    err = np.abs(paired(t, i, counts) - paired(ref_t, ref_i, ref_counts))
+    n_unpaired = int(np.abs(ref_counts - counts).sum())
+    if err.size == 0:
+        return 0.0, 0.0, n_unpaired
+    return float(err.max()), float(err.mean()), n_unpaired
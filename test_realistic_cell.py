@@ -1,126 +1,221 @@
 #ONLY TEMPORARY FOR PYRAMIDAL AND BASKET CELLS
-from neuron import h
-import matplotlib.pyplot as plt
-import numpy as np
+"""Single realistic cell under a long IClamp step: spike count, ISIs and adaptation ratio.
+
+    python test_realistic_cell.py [--cell Basket]      # run, then plot (loads the NEURON gui)
+    python test_realistic_cell.py --headless           # run and save the .npz only
+    python test_realistic_cell.py --reduce             # equivalent-cylinder version of the cell
+    python test_realistic_cell.py --rate-tables        # tabulated Im/Kv3_1 rates
+
+build_cell() and run_cell() can be imported without running anything. The
+trace is saved as test_<cell>_<timestamp>.npz and plotted from that file by
+plot_results.py.
+"""
+import argparse
+import json
 import time
+
+import numpy as np
+from neuron import h
+
 # Import the specific cell class you want to test
 from realistic_neuron_models import L23PyramidalCell, L23BasketCell
+from run_modes import configure_run_mode, enable_multithreading
+from checkpoint import model_hash, warm_start
+from mechanisms import set_rate_tables
+from instrumentation import Profiler
+from reduction import reduce_cell
+from spike_analysis import adaptation_ratios, isis
 
 h.load_file("stdrun.hoc")
 
 # Parameters
-CELL_TO_TEST = "Pyramidal" # Or "Basket"
-if CELL_TO_TEST == "Pyramidal":
-    swc_file = 'H17.06.006.11.09.04_591274508_m (1).swc' 
-    CellClass = L23PyramidalCell
-    cell_label = "L2/3 Pyramidal"
-    iclamp_amp = 0.5
-else:
-    swc_file = 'Fig2b_cell1_0904091kg.CNG.swc' 
-    CellClass = L23BasketCell
-    cell_label = "L2/3 Basket"
-    iclamp_amp = 0.8
-
-sim_duration = 1000  # ms (Long duration to observe adaptation/sustained firing)
-h.dt = 0.025         # ms
-v_init = -65         # mV
-h.celsius = 34       # degC
-
-#Create Cell
-cell_object = CellClass(0, swc_file, v_init=v_init)
-if not cell_object.soma:
-    print("Error: Soma not found in loaded model!")
-    exit()
-print("Cell created.")
-
-#Stimulus current injection
-iclamp = h.IClamp(cell_object.soma(0.5)) # Attach to the identified soma midpoint
-iclamp.delay = 100   # ms - Wait 100ms before starting
-iclamp.dur = 800     # ms - *** Make the pulse long to observe adaptation ***
-iclamp.amp = iclamp_amp # Set the amplitude
-
-#Setup recording
-v_soma_vec = h.Vector().record(cell_object.soma(0.5)._ref_v) # Record soma voltage
-t_vec = h.Vector().record(h._ref_t)                 # Record time points
-spike_times_vec = h.Vector()
-spike_threshold = -10 # Or maybe lower (-20?) - TUNE if needed
-nc_record = h.NetCon(cell_object.soma(0.5)._ref_v, None, sec=cell_object.soma)
-nc_record.threshold = spike_threshold
-nc_record.record(spike_times_vec) # Record only times
-
-#Run simulation
-h.tstop = sim_duration
-h.v_init = v_init
-print(f"--- Setting h.v_init = {h.v_init} mV ---")
-h.stdinit()
-print(f"--- Called h.stdinit() ---")
-print(f"Running simulation for {sim_duration} ms...")
-t_start_sim = time.time()
-h.run()
-t_end_sim = time.time()
-print(f"Simulation finished in {t_end_sim - t_start_sim:.2f} seconds.")
-
-#Analyze & Plot
-# --- Correction: Explicitly convert spike_times_vec before np.array ---
-spike_times = np.array([]) # Initialize as empty NumPy array
-conversion_successful = False
-try:
-    # Create a Python list by iterating through the NEURON vector and converting each element to float
-    py_spike_times = [float(t) for t in spike_times_vec]
-    # Create the NumPy array from the clean Python list
-    spike_times = np.array(py_spike_times)
-    conversion_successful = True
-except Exception as e:
-    print(f"ERROR during spike_times conversion to NumPy array: {e}")
-# --- End Correction ---
-
-
-# Calculate ISIs and Adaptation Ratio
-adaptation_ratio = np.nan
-first_isi = np.nan
-last_isi = np.nan
-print(f"  Spike Count: {len(spike_times)}")
-if conversion_successful and len(spike_times) > 1: # Need at least 2 spikes for 1 ISI
-    stim_start_time = iclamp.delay
-    stim_end_time = iclamp.delay + iclamp.dur
-    stim_spikes = spike_times[(spike_times >= stim_start_time) & (spike_times <= stim_end_time)]
-
-    if len(stim_spikes) > 2: # Need at least 3 spikes during stim for 2 ISIs
-        isis = np.diff(stim_spikes)
-        first_isi = isis[0]
-        last_isi = isis[-1]
-        if first_isi > 1e-5: # Avoid division by zero or near-zero
-             adaptation_ratio = last_isi / first_isi
+CELL_TYPES = {
+    #name: (class, swc file, label, IClamp amplitude in nA)
+    "Pyramidal": (L23PyramidalCell, 'H17.06.006.11.09.04_591274508_m (1).swc', "L2/3 Pyramidal", 0.5),
+    "Basket": (L23BasketCell, 'Fig2b_cell1_0904091kg.CNG.swc', "L2/3 Basket", 0.8),
+}
+
+DEFAULT_PARAMS = {
+    "cell": "Pyramidal",  # Or "Basket"
+    "sim_duration": 1000, # ms (Long duration to observe adaptation/sustained firing)
+    "dt": 0.025,          # ms
+    "v_init": -65,        # mV
+    "celsius": 34,        # degC
+    "nthread": 1,         # >1 runs the cell multithreaded (multisplit at the soma)
+    "reduce": False,      # True: equivalent cylinders instead of the full tree (see benchmarks/reduction.py)
+    "rate_tables": False, # True: Im/Kv3_1 rates from voltage tables (see benchmarks/rate_tables.py)
+    "run_mode": "fixed",  # "fixed", "cvode" or "local_dt" (see benchmarks/integrators.py)
+    "atol": 1e-3,         # absolute tolerance of the variable-step modes
+    "checkpoint_dir": None, # e.g. ".checkpoints": restore the rest state at the IClamp onset
+    "profile": True,      # phase timings, memory and object counts next to the results (.json/.csv)
+    "iclamp_delay": 100,  # ms - Wait 100ms before starting
+    "iclamp_dur": 800,    # ms - *** Make the pulse long to observe adaptation ***
+    "iclamp_amp": None,   # nA, None: the cell type's default
+    "spike_threshold": -10, # Or maybe lower (-20?) - TUNE if needed
+}
+
+
+class CellTest:
+    """Cell, stimulus and recordings of one test run."""
+    def __init__(self, params):
+        self.params = params
+        self.CellClass, self.swc_file, self.cell_label, default_amp = CELL_TYPES[params["cell"]]
+        self.iclamp_amp = default_amp if params["iclamp_amp"] is None else params["iclamp_amp"]
+        self.cell_object = None
+        self.iclamp = None
+
+
+def build_cell(params=None, prof=None):
+    """Create the cell, the IClamp and the recordings. Nothing is simulated."""
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    prof = prof or Profiler(enabled=False)
+    test = CellTest(params)
+    h.dt = params["dt"]
+    h.celsius = params["celsius"]
+
+    #Create Cell
+    with prof.phase("build"):
+        test.cell_object = test.CellClass(0, test.swc_file, v_init=params["v_init"])
+        if params["reduce"]:
+            test.cell_object = reduce_cell(test.cell_object)
+    cell_object = test.cell_object
+    if not cell_object.soma:
+        raise RuntimeError("Soma not found in loaded model!")
+    print("Cell created.")
+    set_rate_tables(params["rate_tables"]) #mechanisms are loaded by the cell constructor
+
+    if params["nthread"] > 1:
+        enable_multithreading(params["nthread"], [cell_object])
+    configure_run_mode(params["run_mode"], atol=params["atol"])
+
+    #Stimulus current injection
+    test.iclamp = h.IClamp(cell_object.soma(0.5)) # Attach to the identified soma midpoint
+    test.iclamp.delay = params["iclamp_delay"]
+    test.iclamp.dur = params["iclamp_dur"]
+    test.iclamp.amp = test.iclamp_amp # Set the amplitude
+
+    #Setup recording
+    #sampled every h.dt so the trace has the same time base in every run mode
+    test.v_soma_vec = h.Vector().record(cell_object.soma(0.5)._ref_v, h.dt) # Record soma voltage
+    test.t_vec = h.Vector().record(h._ref_t, h.dt)                 # Record time points
+    test.spike_times_vec = h.Vector()
+    test.nc_record = h.NetCon(cell_object.soma(0.5)._ref_v, None, sec=cell_object.soma)
+    test.nc_record.threshold = params["spike_threshold"]
+    test.nc_record.record(test.spike_times_vec) # Record only times
+    return test
+
+
+def run_cell(test, prof=None):
+    """Simulate for sim_duration. Returns the wall time."""
+    params = test.params
+    prof = prof or Profiler(enabled=False)
+    h.tstop = params["sim_duration"]
+    h.v_init = params["v_init"]
+    print(f"--- Setting h.v_init = {h.v_init} mV ---")
+    print(f"Running simulation for {params['sim_duration']} ms ({params['run_mode']})...")
+    t_start_sim = time.time()
+    with prof.phase("run"):
+        if params["checkpoint_dir"] is not None:
+            cell_object = test.cell_object
+            checkpoint_key = model_hash({"cell": test.CellClass.__name__, "morphology": cell_object.morphology_key,
+                                         "biophysics": cell_object.biophysics_spec, "celsius": h.celsius,
+                                         "v_init": params["v_init"], "dt": h.dt, "run_mode": params["run_mode"],
+                                         "atol": params["atol"], "rate_tables": params["rate_tables"]},
+                                        sources=(test.CellClass,))
+            #stdinit, then restore or run to the stimulus; either way the recordings start there
+            warm_start(checkpoint_key, test.iclamp.delay, params["checkpoint_dir"], reset_vectors=(test.spike_times_vec,))
+            h.continuerun(h.tstop)
+        else:
+            h.stdinit()
+            print(f"--- Called h.stdinit() ---")
+            h.run()
+    wall = time.time() - t_start_sim
+    print(f"Simulation finished in {wall:.2f} seconds.")
+    prof.record_solver(n_steps=params["sim_duration"] / h.dt if params["run_mode"] == "fixed" else None, wall_s=wall)
+    return wall
+
+
+def analyze(test):
+    """Spike count, first/last ISI and adaptation ratio during the stimulus."""
+    spike_times = test.spike_times_vec.as_numpy().copy()
+
+    # Calculate ISIs and Adaptation Ratio
+    adaptation_ratio = np.nan
+    first_isi = np.nan
+    last_isi = np.nan
+    print(f"  Spike Count: {len(spike_times)}")
+    stim_start_time = test.iclamp.delay
+    stim_end_time = test.iclamp.delay + test.iclamp.dur
+    cell_ids = np.zeros(spike_times.size, dtype=np.int64) #single cell: every spike belongs to id 0
+    isi, _ = isis(spike_times, cell_ids, stim_start_time, stim_end_time)
+    if isi.size >= 2:
+        first_isi = isi[0]
+        last_isi = isi[-1]
+        adaptation_ratio = adaptation_ratios(spike_times, cell_ids, 1, stim_start_time, stim_end_time)[0]
         print(f"  First ISI during stim: {first_isi:.2f} ms")
         print(f"  Last ISI during stim: {last_isi:.2f} ms")
         print(f"  Adaptation Ratio (Last/First): {adaptation_ratio:.3f}")
-    elif len(stim_spikes) > 1 :
-         isis = np.diff(stim_spikes)
-         first_isi = isis[0]
-         print(f"  Only one ISI during stim: {first_isi:.2f} ms")
+    elif isi.size == 1:
+        first_isi = isi[0]
+        print(f"  Only one ISI during stim: {first_isi:.2f} ms")
     else:
         print("  Not enough spikes during stimulus to calculate adaptation ratio.")
-else:
-     print("  Not enough spikes recorded/converted to calculate adaptation ratio.")
-
-#Plot voltage trace
-plt.figure(figsize=(12, 5))
-plt.plot(t_vec, v_soma_vec, label=f'Soma Vm (Adapt Ratio: {adaptation_ratio:.3f})')
-if conversion_successful and spike_times.size > 0 :
-    y_min, y_max = plt.ylim()
-    # Ensure y_marker is a finite number before plotting
-    y_marker = y_max * 0.95 if np.isfinite(y_max) else 0
-    plt.scatter(spike_times, np.full(spike_times.shape, y_marker),
-                color='red', marker='|', s=100, label='Spikes')
-
-plt.xlabel("Time (ms)")
-plt.ylabel("Membrane Potential (mV)")
-plt.title(f"Test: {cell_label} (I={iclamp.amp:.2f} nA for {iclamp.dur}ms)")
-plt.legend(loc='upper right')
-plt.grid(True)
-
-# Save the plot
-timestamp = time.strftime("%Y%m%d-%H%M%S")
-output_filename = f'test_{CELL_TO_TEST}_{timestamp}.png'
-plt.savefig(output_filename)
-print(f"--- Plot saved to {output_filename} ---")
\ No newline at end of file
+    return {"spike_count": int(spike_times.size), "first_isi": float(first_isi), "last_isi": float(last_isi),
+            "adaptation_ratio": float(adaptation_ratio)}
+
+
+def save_results(test, stats, path):
+    """Trace, spikes and run info in one .npz (plot with plot_results.py)."""
+    info = dict(stats, cell=test.params["cell"], cell_label=test.cell_label, iclamp_amp=test.iclamp.amp,
+                iclamp_delay=test.iclamp.delay, iclamp_dur=test.iclamp.dur, params=test.params)
+    np.savez(path, t=test.t_vec.as_numpy(), v_soma=test.v_soma_vec.as_numpy(),
+             spike_times=test.spike_times_vec.as_numpy(), info=json.dumps(info))
+    print(f"--- Results saved to {path} ---")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Single realistic cell under a long IClamp step.")
+    parser.add_argument("--headless", action="store_true", help="never import the NEURON gui or matplotlib")
+    parser.add_argument("--cell", choices=sorted(CELL_TYPES))
+    parser.add_argument("--sim-duration", type=float)
+    parser.add_argument("--nthread", type=int)
+    parser.add_argument("--reduce", action="store_true", default=None, help="simulate the reduced cell")
+    parser.add_argument("--rate-tables", action="store_true", default=None, help="tabulated Im/Kv3_1 rates")
+    parser.add_argument("--run-mode", choices=("fixed", "cvode", "local_dt"))
+    parser.add_argument("--iclamp-amp", type=float)
+    parser.add_argument("--checkpoint-dir")
+    parser.add_argument("--no-profile", action="store_true")
+    args = parser.parse_args(argv)
+
+    params = {name: value for name, value in vars(args).items()
+              if name in DEFAULT_PARAMS and value is not None}
+    if args.no_profile:
+        params["profile"] = False
+    if not args.headless:
+        from neuron import gui #interactive startup, as the script always had
+    params = dict(DEFAULT_PARAMS, **params)
+
+    prof = Profiler(enabled=params["profile"])
+    prof.meta.update(script="test_realistic_cell", cell=params["cell"], sim_duration=params["sim_duration"],
+                     run_mode=params["run_mode"], reduce=params["reduce"],
+                     rate_tables=params["rate_tables"])
+    test = build_cell(params, prof)
+    run_cell(test, prof)
+    stats = analyze(test)
+
+    # Save the results with unique timestamp as name
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    stem = f'test_{params["cell"]}_{timestamp}'
+    save_results(test, stats, stem + ".npz")
+    if prof.enabled:
+        prof.write(stem + "_profile")
+        print(prof.summary())
+
+    if not args.headless:
+        import plot_results
+        plot_results.plot_cell_trace(stem + ".npz")
+    return test
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +0,0 @@
-../Im.mod
\ No newline at end of file
@@ -1 +0,0 @@
-../Kv3.mod
\ No newline at end of file